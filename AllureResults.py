@@ -0,0 +1,133 @@
+import os
+import csv
+import json
+import heapq
+import tempfile
+from datetime import datetime
+
+
+DF_NEWLINE_CHAR = "///n///" # DF stands for dataframe
+# Columns of suites.csv file generated by allure
+ALLURE_CSV_HEADER = ["Status", "Start Time", "Stop Time", "Duration in ms", "Parent Suite", "Suite", "Sub Suite", "Test Class", "Test Method", "Name", "Description"]
+# Number of report rows sorted in memory at once, bigger reports are sorted in parts
+# saved in temporary files and merged while writing the report
+SORT_CHUNK_ROWS = 50000
+
+
+def normalize_report_text(text: str):
+    """
+    Change newline characters in the test docstring to a character that represents the newline in html
+    and remove indentation of the docstring lines
+    """
+    return text.replace(";\n", DF_NEWLINE_CHAR).replace("    ", "")
+
+
+def read_report_part(path: str):
+    with open(path, "r", newline="") as f:
+        for row in csv.reader(f):
+            yield row
+
+
+def write_sorted_report(header: list[str], rows, path_to_csv: str, test_no: int = None):
+    """
+    Reads rows of allure csv report once, normalizes docstrings, checks that every row is one test,
+    sorts rows by test name and writes them to path_to_csv. Only SORT_CHUNK_ROWS rows are kept in
+    memory, sorted parts of bigger reports are saved in temporary files and merged. If test_no is given
+    number of rows must be the same. Returns number of rows, file is not created if there are no rows
+    """
+    name_column = header.index("Name")
+    sort_key = lambda row: row[name_column]
+    rows_number = 0
+
+    with tempfile.TemporaryDirectory() as parts_dir:
+        parts = []
+        chunk = []
+        for row in rows:
+            # Fields are joined with a sign that cannot be in csv text, so the row is normalized at once
+            joined_row = normalize_report_text("\x00".join(row))
+            row = joined_row.split("\x00")
+            if "\n" in joined_row:
+                raise RuntimeError("An error occurred during checking csv file, possible lack of semicolon in test docstring. Check docstring of test " + row[name_column])
+            chunk.append(row)
+            rows_number += 1
+            if len(chunk) >= SORT_CHUNK_ROWS:
+                chunk.sort(key=sort_key)
+                part_path = os.path.join(parts_dir, str(len(parts)) + ".csv")
+                with open(part_path, "w", newline="") as f:
+                    csv.writer(f, quoting=csv.QUOTE_ALL).writerows(chunk)
+                parts.append(part_path)
+                chunk = []
+
+        if test_no is not None and rows_number != test_no:
+            raise RuntimeError("An error occurred during checking csv file, possible lack of semicolon in test docstring. Open generated csv file to check error")
+        if rows_number == 0:
+            return 0
+
+        chunk.sort(key=sort_key)
+        sorted_parts = [read_report_part(part_path) for part_path in parts] + [chunk]
+        with open(path_to_csv, "w", newline="") as f:
+            writer = csv.writer(f, lineterminator="\n")
+            writer.writerow(header)
+            writer.writerows(heapq.merge(*sorted_parts, key=sort_key))
+    return rows_number
+
+
+def format_allure_time(timestamp_ms: int):
+    """
+    Returns time given in milliseconds in the same format as allure writes it to csv file (Java Date.toString(),
+    e.g. Sat Jan 01 10:00:00 CET 2022). Like Java, zones without a short name (e.g. Asia/Dubai) are written
+    as offset GMT+04:00. Windows gives only long zone names (Central European Standard Time), so there
+    the offset is always written and time columns differ from allure only in the zone name
+    """
+    if timestamp_ms is None:
+        return ""
+    local_time = datetime.fromtimestamp(timestamp_ms / 1000).astimezone()
+    zone = local_time.strftime("%Z")
+    if not zone.isalpha():
+        offset = local_time.strftime("%z")
+        zone = f"GMT{offset[:3]}:{offset[3:5]}"
+    return local_time.strftime(f"%a %b %d %H:%M:%S {zone} %Y")
+
+
+def read_allure_result(path: str):
+    """
+    Reads one *-result.json file and returns history id of the test, stop time of the test and row
+    of allure suites.csv as list of strings. ValueError is raised if the file is not complete JSON
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        result = json.load(f)
+    labels = {label["name"]: label["value"] for label in result.get("labels", [])}
+    start, stop = result.get("start"), result.get("stop")
+    row = [
+        result.get("status", "unknown"),
+        format_allure_time(start),
+        format_allure_time(stop),
+        str(stop - start) if start is not None and stop is not None else "",
+        labels.get("parentSuite", ""),
+        labels.get("suite", ""),
+        labels.get("subSuite", ""),
+        labels.get("testClass", ""),
+        labels.get("testMethod", ""),
+        result.get("name", ""),
+        result.get("description", ""),
+    ]
+    return result.get("historyId", os.path.basename(path)), stop or 0, row
+
+
+def read_allure_results(results_path: str):
+    """
+    Reads *-result.json files from results_path one by one and yields rows of allure suites.csv
+    as lists of strings. If there are many results of one test (e.g. reruns), only the last one
+    is taken as allure does
+    """
+    last_results = {}
+    with os.scandir(results_path) as entries:
+        for entry in entries:
+            if not entry.name.endswith("-result.json"):
+                continue
+            history_id, stop, row = read_allure_result(entry.path)
+            if history_id not in last_results or stop >= last_results[history_id][0]:
+                last_results[history_id] = (stop, row)
+
+    for stop, row in last_results.values():
+        yield row
@@ -0,0 +1,172 @@
+import random
+import asyncio
+
+import requests
+from atlassian import Confluence
+
+from .Instrumentation import metrics
+
+
+# Number of requests sent at the same time by one client
+DEFAULT_CONCURRENCY = 4
+# Number of retries of the request which failed because of network or server error
+DEFAULT_RETRIES = 5
+# Delay in seconds before the first retry, every next delay is two times longer up to MAX_BACKOFF
+DEFAULT_BACKOFF = 1.0
+MAX_BACKOFF = 30.0
+# HTTP statuses after which the request is retried
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# HTTP status returned by Confluence if page version sent with update is not the next one
+CONFLICT_STATUS = 409
+# Number of child pages requested at once
+CHILD_PAGES_LIMIT = 200
+
+
+class PageVersionConflict(RuntimeError):
+    """
+    Raised when the page was changed by somebody else after it was downloaded
+    """
+
+
+def get_error_status(error: Exception):
+    """
+    Returns HTTP status of the response which caused the error, None if there was no response
+    """
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    return response.status_code
+
+
+def is_transient_error(error: Exception):
+    """
+    Returns True if the request can succeed when it is sent again
+    """
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    return isinstance(error, requests.exceptions.HTTPError) and get_error_status(error) in RETRY_STATUSES
+
+
+class AsyncConfluence:
+    """
+    asyncio client for Confluence. Requests are sent by given atlassian Confluence client in threads,
+    so its session and connections are reused and independent requests can be awaited together.
+    At most concurrency requests are sent at once, requests failed because of network or server
+    errors are retried with exponential backoff. Pages are updated with version number, so changes
+    made by somebody else after the page was downloaded are not overwritten
+    """
+    def __init__(self, confluence: Confluence, concurrency: int = DEFAULT_CONCURRENCY, retries: int = DEFAULT_RETRIES,
+                 backoff: float = DEFAULT_BACKOFF):
+        self.confluence = confluence
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        # Semaphore belongs to one event loop, so it is created again for every loop
+        self.__semaphores = {}
+        # Bytes of requests are counted only if metrics are enabled
+        session = getattr(confluence, "_session", None)
+        if session is not None:
+            metrics.install(session)
+
+    def __get_semaphore(self):
+        loop = asyncio.get_running_loop()
+        if loop not in self.__semaphores:
+            self.__semaphores = {loop: asyncio.Semaphore(self.concurrency)}
+        return self.__semaphores[loop]
+
+    async def __call_once(self, method, *args, **kwargs):
+        """
+        Calls method of the Confluence client in a thread
+        """
+        loop = asyncio.get_running_loop()
+
+        def run_call():
+            with metrics.call(method.__name__):
+                return method(*args, **kwargs)
+
+        async with self.__get_semaphore():
+            return await loop.run_in_executor(None, run_call)
+
+    async def __wait_before_retry(self, attempt: int, error: Exception):
+        # Random part of the delay keeps many clients from retrying at the same moment
+        delay = min(MAX_BACKOFF, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.0)
+        print(f"\nCONFLUENCE REQUEST FAILED ({error}), RETRY IN {delay:.1f} s")
+        await asyncio.sleep(delay)
+
+    async def __call(self, method, *args, **kwargs):
+        """
+        Calls method of the Confluence client in a thread and retries it after transient errors
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                return await self.__call_once(method, *args, **kwargs)
+            except Exception as e:
+                if attempt == self.retries or not is_transient_error(e):
+                    raise
+                error = e
+            await self.__wait_before_retry(attempt, error)
+
+    async def get_page_by_id(self, page_id: str, expand: str = None):
+        return await self.__call(self.confluence.get_page_by_id, page_id, expand=expand)
+
+    async def get_user_details_by_username(self, username: str, expand: str = None):
+        return await self.__call(self.confluence.get_user_details_by_username, username, expand=expand)
+
+    async def get_child_pages(self, page_id: str):
+        """
+        Returns list of all child pages of the page, every page is a dictionary with id and title.
+        Server can return less pages than CHILD_PAGES_LIMIT at once, so pages are requested
+        until the response has no link to the next pages or it is empty
+        """
+        child_pages = []
+        while True:
+            response = await self.__call(self.confluence.get, f"rest/api/content/{page_id}/child/page",
+                                         params={"start": len(child_pages), "limit": CHILD_PAGES_LIMIT})
+            results = (response or {}).get("results") or []
+            child_pages.extend(results)
+            links = (response or {}).get("_links")
+            if len(results) == 0 or (links is not None and "next" not in links):
+                return child_pages
+
+    async def create_page(self, space: str, title: str, body: str, parent_id: str):
+        """
+        Creates page with given parent page and returns its id. Creating is not simply sent again after
+        transient errors: the page could be created although its response was lost, then the next request
+        would fail because the title is taken. So before every retry the page is looked for by its title
+        among child pages of the parent and its id is returned if it exists
+        """
+        for attempt in range(self.retries + 1):
+            if attempt > 0:
+                for child_page in await self.get_child_pages(parent_id):
+                    if child_page["title"] == title:
+                        return child_page["id"]
+            try:
+                page = await self.__call_once(self.confluence.create_page, space, title, body, parent_id=parent_id)
+                return page["id"]
+            except Exception as e:
+                if attempt == self.retries or not is_transient_error(e):
+                    raise
+                error = e
+            await self.__wait_before_retry(attempt, error)
+
+    async def update_page(self, page_id: str, title: str, body: str, version: int, message: str = None):
+        """
+        Saves body of the page as the next version after given version and returns the new version number.
+        PageVersionConflict is raised if the page has a newer version than given one
+        """
+        data = {
+            "id": page_id,
+            "type": "page",
+            "title": title,
+            "body": {"storage": {"value": body, "representation": "storage"}},
+            "version": {"number": version + 1, "minorEdit": False}
+        }
+        if message is not None:
+            data["version"]["message"] = message
+        try:
+            await self.__call(self.confluence.put, f"rest/api/content/{page_id}", data=data)
+        except requests.exceptions.HTTPError as e:
+            if get_error_status(e) == CONFLICT_STATUS:
+                raise PageVersionConflict(f"Page {page_id} was changed after version {version} was downloaded")
+            raise
+        return version + 1
@@ -0,0 +1,467 @@
+import io
+import os
+import sys
+import csv
+import json
+import time
+import random
+import tempfile
+import platform
+import subprocess
+import tracemalloc
+from datetime import datetime
+from contextlib import redirect_stdout
+
+import pandas as pd
+
+from .ConfluenceDataloader import Dataloader, TABLE_HEADER, TABLE_CATEGORY_COLUMNS, TABLE_CHUNK_ROWS, DF_NEWLINE_CHAR, DF_SUCCESS_CHAR, \
+    DF_FAIL_CHAR, DF_STRONG_START_CHAR, DF_STRONG_END_CHAR, DF_DIV_DISPLAY_START_CHAR, DF_DIV_DISPLAY_END_CHAR, dataframe_to_html_translator, \
+    parse_docstring, search_div_requirement, replace_signs_html_to_dataframe, replace_signs_dataframe_to_html, html_to_dataframe_translator, \
+    SignTranslator
+from .AllureResults import ALLURE_CSV_HEADER, normalize_report_text, write_sorted_report
+from .PageParser import parse_storage_page
+from .ResultTable import ResultTable
+from .Instrumentation import metrics
+
+
+# Baselines of all cases are saved there by --save-baseline, the file belongs to the machine it was created on
+BASELINE_PATH = os.path.join("Test_data", "benchmarks", "baseline.json")
+# Every case is run that many times and the shortest time of every stage is kept
+DEFAULT_REPEATS = 3
+# Stage is flagged if it takes REGRESSION_FACTOR times longer than in the baseline and at least MIN_REGRESSION_SECONDS more,
+# small differences of fast stages are only noise
+REGRESSION_FACTOR = 1.3
+MIN_REGRESSION_SECONDS = 0.02
+MIN_REGRESSION_MEMORY = 2**20
+# Signs are replaced by chained str.replace only in cases with at most that many rows, it needs
+# one scan of the table for every requirement cell and takes minutes for bigger tables
+CHAINED_REPLACE_MAX_ROWS = 1000
+BENCHMARK_PAGE_ID = "1"
+BENCHMARK_LOGIN = "benchmark"
+BENCHMARK_TESTER = "Benchmark Tester"
+BENCHMARK_DATE = "01.01.2022"
+# rows - tests on the page, new_rows - tests in the csv report which are not on the page yet,
+# requirements - different requirement macros, previous_results - results in every "Previous Results" cell,
+# docstring_size - number of characters of test description
+BENCHMARK_CASES = {
+    "100 rows": {"rows": 100, "new_rows": 10, "requirements": 20, "previous_results": 3, "docstring_size": 200},
+    "1k rows": {"rows": 1000, "new_rows": 100, "requirements": 50, "previous_results": 3, "docstring_size": 200},
+    "10k rows": {"rows": 10000, "new_rows": 500, "requirements": 200, "previous_results": 3, "docstring_size": 200},
+    "20k rows": {"rows": 20000, "new_rows": 500, "requirements": 300, "previous_results": 3, "docstring_size": 200},
+    "long cells": {"rows": 1000, "new_rows": 0, "requirements": 500, "previous_results": 20, "docstring_size": 2000},
+    "50k rows": {"rows": 50000, "new_rows": 1000, "requirements": 500, "previous_results": 3, "docstring_size": 200},
+}
+# Time of starting the program is measured in new Python processes by running these commands
+STARTUP_CASE = "startup"
+STARTUP_COMMANDS = {
+    "python": "pass",
+    "import package": "import {package}",
+    "help": "from {package} import main; main(['--help'])",
+    "import load modules": "import {package}.Publisher",
+    "import report modules": "import {package}.CSVReport",
+}
+FILLER_WORDS = ["check", "that", "the", "device", "sends", "frame", "after", "reset", "and", "value", "is", "saved"]
+
+
+def create_test_name(number: int):
+    return f"tests/test_module_{number % 25:02d}.py::test_case_{number:06d}"
+
+
+def create_requirement(number: int, requirements: int):
+    """
+    Returns requirement key of the test, every fourth test has no requirement
+    """
+    if requirements == 0 or number % 4 == 3:
+        return None
+    return f"LWZ-{number % requirements:04d}"
+
+
+def create_description(number: int, docstring_size: int):
+    words = []
+    length = 0
+    rand = random.Random(number)
+    while length < docstring_size:
+        word = rand.choice(FILLER_WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return f"Test case {number} " + " ".join(words)
+
+
+def create_test_docstring(number: int, requirements: int, docstring_size: int):
+    """
+    Returns test docstring as it is saved in the csv report, sections are separated by newline sign
+    """
+    sections = []
+    requirement = create_requirement(number, requirements)
+    if requirement is not None:
+        sections += ["[REQUIREMENTS]", requirement]
+    sections += [
+        "[TEST NAME]", f"Test case {number}",
+        "[TEST DESCRIPTION]", create_description(number, docstring_size),
+        "[EXPECTED RESULT]", "Value is saved",
+        "[ACTUAL RESULT]", f"Value {number} is saved",
+        "[TEST SETUP]", f"Bench {number % 3}"
+    ]
+    if number % 5 == 0:
+        sections += ["[COMMENTS]", f"Comment {number}"]
+    return DF_NEWLINE_CHAR.join(sections) + DF_NEWLINE_CHAR
+
+
+def create_csv_report(rows: int, new_rows: int = 0, requirements: int = 50, docstring_size: int = 200, seed: int = 0):
+    """
+    Returns dataframe of allure csv report with results of all rows tests of the page
+    created by create_storage_page() and new_rows new tests
+    """
+    rand = random.Random(seed)
+    report = []
+    for number in range(rows + new_rows):
+        status = rand.choices(["passed", "failed", "skipped"], weights=[80, 15, 5])[0]
+        test_name = create_test_name(number)
+        module, _, method = test_name.partition("::")
+        report.append([status, "Sat Jan 01 10:00:00 CET 2022", "Sat Jan 01 10:00:01 CET 2022", rand.randint(1, 5000),
+                       "tests", module, "", "", method, test_name, create_test_docstring(number, requirements, docstring_size)])
+    return pd.DataFrame(report, columns=ALLURE_CSV_HEADER)
+
+
+def write_allure_csv(path: str, csv_df: pd.DataFrame):
+    """
+    Writes csv report as allure writes suites.csv, every field is quoted and docstring lines
+    end with semicolon and new line and are indented
+    """
+    description_column = ALLURE_CSV_HEADER.index("Description")
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f, quoting=csv.QUOTE_ALL, lineterminator="\n")
+        writer.writerow(ALLURE_CSV_HEADER)
+        for row in csv_df.itertuples(index=False):
+            row = list(row)
+            row[description_column] = row[description_column].replace(DF_NEWLINE_CHAR, ";\n    ")
+            writer.writerow(row)
+
+
+def post_process_csv(allure_csv_path: str, report_path: str):
+    """
+    Normalizes, checks and sorts suites.csv written by allure the same way as CreateReport does
+    """
+    with open(allure_csv_path, "r", newline="") as f:
+        reader = csv.reader(f)
+        header = [normalize_report_text(value) for value in next(reader)]
+        return write_sorted_report(header, reader, report_path)
+
+
+def post_process_csv_three_passes(allure_csv_path: str, report_path: str, test_no: int):
+    """
+    Post-processes suites.csv as it was done before write_sorted_report: the whole file is rewritten with
+    newlines replaced, read again to count its lines and then sorted with pandas, so both ways can be compared
+    """
+    with open(allure_csv_path, "r") as file_r:
+        data_report = file_r.read()
+    data_report = data_report.replace(";\n", DF_NEWLINE_CHAR)
+    data_report = data_report.replace("    ", "")
+    with open(report_path, "w") as file_w:
+        file_w.write(data_report)
+
+    with open(report_path, "r") as f:
+        for i, line in enumerate(f):
+            pass
+        if i != test_no:
+            raise RuntimeError("An error occurred during checking csv file, possible lack of semicolon in test docstring. Open generated csv file to check error")
+
+    csv_df = pd.read_csv(report_path)
+    csv_df = csv_df.sort_values(by=["Name"])
+    csv_df.to_csv(report_path, index=False)
+    return test_no
+
+
+def replace_signs_chained(text: str, translator: SignTranslator):
+    """
+    Replaces signs of the translator by calling str.replace for every sign, as it was done before
+    SignTranslator, so both ways can be compared
+    """
+    for div, replacement in translator.div_blocks.items():
+        text = text.replace(div, replacement)
+    for sign, replacement in translator.signs.items():
+        text = text.replace(sign, replacement)
+    return text
+
+
+def create_storage_page(rows: int, requirements: int = 50, previous_results: int = 3, docstring_size: int = 200, seed: int = 0):
+    """
+    Returns Confluence page body in storage format with test cases table of rows tests. The table
+    is written the same way as Dataloader writes it, so it is parsed as a page loaded earlier
+    """
+    rand = random.Random(seed)
+    table = ResultTable(TABLE_HEADER.values(), TABLE_CATEGORY_COLUMNS)
+    requirement_signs = []
+    for number in range(rows):
+        requirement = create_requirement(number, requirements)
+        if requirement is not None:
+            requirement_signs.append("///" + requirement + "///")
+        results = []
+        for _ in range(previous_results):
+            results.append(rand.choice(["Success", "Fail"]) + DF_NEWLINE_CHAR + f"Bench {number % 3}")
+        table.load_row([
+            "///" + requirement + "///" if requirement is not None else None,
+            DF_DIV_DISPLAY_START_CHAR + create_test_name(number) + DF_DIV_DISPLAY_END_CHAR + DF_STRONG_START_CHAR + f"Test case {number}" +
+            DF_STRONG_END_CHAR + DF_NEWLINE_CHAR + create_description(number, docstring_size),
+            "Value is saved",
+            f"Value {number} is saved",
+            DF_SUCCESS_CHAR if rand.random() < 0.8 else DF_FAIL_CHAR,
+            BENCHMARK_TESTER,
+            BENCHMARK_DATE,
+            f"Bench {number % 3}",
+            (2*DF_NEWLINE_CHAR).join(results) if results else DF_NEWLINE_CHAR,
+            f"Comment {number}" if number % 5 == 0 else None
+        ])
+
+    page_body = io.StringIO()
+    page_body.write("<p>Test report of the benchmark project</p>")
+    table.write_html(page_body, table.sorted_rows(TABLE_HEADER["Test Description"]), dataframe_to_html_translator([], requirement_signs), TABLE_CHUNK_ROWS)
+    page_body.write("<p>Results are loaded by report generator</p>")
+    return page_body.getvalue()
+
+
+class BenchmarkConfluence:
+    """
+    Replaces atlassian Confluence client with one page kept in memory, so only the work
+    of the report generator is measured
+    """
+    def __init__(self, body: str, page_id: str = BENCHMARK_PAGE_ID):
+        self.body = body
+        self.page_id = page_id
+        self.version = 1
+        self.message = None
+
+    def get_page_by_id(self, page_id: str, expand: str = None):
+        page = {"id": page_id, "title": "Benchmark", "version": {"number": self.version, "message": self.message}}
+        if expand is not None and "body" in expand:
+            page["body"] = {"storage": {"value": self.body}}
+        return page
+
+    def get_user_details_by_username(self, username: str, expand: str = None):
+        return {"displayName": BENCHMARK_TESTER}
+
+    def put(self, path: str, data: dict = None):
+        self.body = data["body"]["storage"]["value"]
+        self.version = data["version"]["number"]
+        self.message = data["version"].get("message")
+        return {"id": data["id"]}
+
+
+def run_load(page_body: str, csv_df: pd.DataFrame):
+    """
+    Loads csv report to the page with Dataloader as a fresh run would do it and returns
+    dictionary {stage: seconds} with all stages of the load and its total time
+    """
+    # Caches of the previous run are not used, every run starts in an empty directory
+    parse_docstring.cache_clear()
+    metrics.reset()
+    current_dir = os.getcwd()
+    # Messages of the loader are not printed between benchmark results
+    with tempfile.TemporaryDirectory() as run_dir, redirect_stdout(io.StringIO()):
+        os.chdir(run_dir)
+        try:
+            start = time.perf_counter()
+            Dataloader(
+                url="",
+                page_id=BENCHMARK_PAGE_ID,
+                page_title="Benchmark",
+                page_space_key="BENCH",
+                csv_folder_name="",
+                csv_file_name="",
+                confluence=BenchmarkConfluence(page_body),
+                login=BENCHMARK_LOGIN,
+                csv_data_frame=csv_df.copy()
+            ).load_data_to_confluence()
+            total = time.perf_counter() - start
+        finally:
+            os.chdir(current_dir)
+    stages = {}
+    for stage in metrics.stages:
+        stages[stage["name"]] = stages.get(stage["name"], 0.0) + stage["seconds"]
+    stages["total"] = total
+    return stages
+
+
+def measure(function, *args, **kwargs):
+    start = time.perf_counter()
+    function(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def run_case(case: dict, repeats: int = DEFAULT_REPEATS):
+    """
+    Runs one benchmark case and returns dictionary with the shortest time of every stage
+    and peak memory of the whole load
+    """
+    page_body = create_storage_page(case["rows"], case["requirements"], case["previous_results"], case["docstring_size"])
+    csv_df = create_csv_report(case["rows"], case["new_rows"], case["requirements"], case["docstring_size"])
+
+    stages = {}
+    for _ in range(repeats):
+        for name, seconds in run_load(page_body, csv_df).items():
+            stages[name] = min(seconds, stages.get(name, seconds))
+
+    # Sign replacing is measured on its own too, with requirement signs of all tests of the page
+    req_div_list = search_div_requirement(page_body)
+    requirements = (create_requirement(number, case["requirements"]) for number in range(case["rows"]))
+    df_requirements = {"///" + requirement + "///" for requirement in requirements if requirement is not None}
+    table_html = parse_storage_page(page_body).table_html()
+    dataframe_html = replace_signs_html_to_dataframe(table_html, req_div_list)
+    sign_functions = [
+        ("search_div_requirement", search_div_requirement, page_body),
+        ("replace_signs_html_to_dataframe", lambda text: replace_signs_html_to_dataframe(text, req_div_list), table_html),
+        ("replace_signs_dataframe_to_html", lambda text: replace_signs_dataframe_to_html(text, req_div_list, df_requirements), dataframe_html),
+    ]
+    # Signs are replaced by chained str.replace too, to compare with replacing them in one scan
+    if case["rows"] <= CHAINED_REPLACE_MAX_ROWS:
+        to_dataframe_translator = html_to_dataframe_translator(req_div_list)
+        to_html_translator = dataframe_to_html_translator(req_div_list, df_requirements)
+        sign_functions += [
+            ("replace_signs_html_to_dataframe (str.replace)", lambda text: replace_signs_chained(text, to_dataframe_translator), table_html),
+            ("replace_signs_dataframe_to_html (str.replace)", lambda text: replace_signs_chained(text, to_html_translator), dataframe_html),
+        ]
+    for name, function, argument in sign_functions:
+        stages[name] = min(measure(function, argument) for _ in range(repeats))
+
+    # Post-processing of suites.csv written by allure, allure itself is not run
+    with tempfile.TemporaryDirectory() as csv_dir:
+        allure_csv_path = os.path.join(csv_dir, "suites.csv")
+        write_allure_csv(allure_csv_path, csv_df)
+        stages["csv post-processing"] = min(
+            measure(post_process_csv, allure_csv_path, os.path.join(csv_dir, "report.csv")) for _ in range(repeats)
+        )
+        stages["csv post-processing (three passes)"] = min(
+            measure(post_process_csv_three_passes, allure_csv_path, os.path.join(csv_dir, "report.csv"), len(csv_df))
+            for _ in range(repeats)
+        )
+
+    # Memory is traced in a separate run, tracing makes the code slower
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    run_load(page_body, csv_df)
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    if not was_tracing:
+        tracemalloc.stop()
+    return {"stages": stages, "peak_memory": peak_memory}
+
+
+def run_startup_case(repeats: int = DEFAULT_REPEATS):
+    """
+    Runs every startup command in a new Python process and returns dictionary with
+    the shortest time of every command
+    """
+    package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    stages = {}
+    for name, command in STARTUP_COMMANDS.items():
+        code = f"import sys; sys.path.insert(0, {package_dir!r}); " + command.format(package=__package__)
+        stages[name] = min(measure(subprocess.run, [sys.executable, "-c", code], stdout=subprocess.DEVNULL, check=True) for _ in range(repeats))
+    return {"stages": stages}
+
+
+def read_baseline(path: str = BASELINE_PATH):
+    """
+    Returns saved results of benchmark cases or empty dictionary if there is no baseline
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["cases"]
+
+
+def write_baseline(results: dict, path: str = BASELINE_PATH):
+    """
+    Saves results of benchmark cases as the baseline, cases which were not run keep their old results
+    """
+    cases = read_baseline(path)
+    cases.update(results)
+    if os.path.dirname(path) and not os.path.exists(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    baseline = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "cases": cases
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(baseline, f, indent=4)
+
+
+def find_regressions(results: dict, baseline: dict):
+    """
+    Returns list of (case, stage, baseline value, new value) of stages which are slower than
+    in the baseline, peak memory is compared as stage "peak memory"
+    """
+    regressions = []
+    for case_name, result in results.items():
+        if case_name not in baseline:
+            continue
+        old_stages = baseline[case_name]["stages"]
+        for stage, seconds in result["stages"].items():
+            old_seconds = old_stages.get(stage)
+            if old_seconds is not None and seconds > old_seconds * REGRESSION_FACTOR and seconds - old_seconds > MIN_REGRESSION_SECONDS:
+                regressions.append((case_name, stage, old_seconds, seconds))
+        if "peak_memory" not in result:
+            continue
+        old_memory = baseline[case_name]["peak_memory"]
+        memory = result["peak_memory"]
+        if memory > old_memory * REGRESSION_FACTOR and memory - old_memory > MIN_REGRESSION_MEMORY:
+            regressions.append((case_name, "peak memory", old_memory, memory))
+    return regressions
+
+
+def print_case(case_name: str, result: dict, baseline: dict):
+    old_result = baseline.get(case_name)
+    print(f"\nBENCHMARK {case_name}:")
+    for stage, seconds in result["stages"].items():
+        line = f"{stage}: {seconds:.3f} s"
+        if old_result is not None and stage in old_result["stages"]:
+            line += f" (baseline {old_result['stages'][stage]:.3f} s)"
+        print(line)
+    if "peak_memory" not in result:
+        return
+    line = f"peak memory: {result['peak_memory'] / 2**20:.1f} MB"
+    if old_result is not None:
+        line += f" (baseline {old_result['peak_memory'] / 2**20:.1f} MB)"
+    print(line)
+
+
+def run_benchmarks(case_names: list[str] = None, repeats: int = DEFAULT_REPEATS, save_baseline: bool = False, baseline_path: str = BASELINE_PATH):
+    """
+    Runs given benchmark cases (all of them by default), compares them with the baseline and
+    returns list of regressions. With save_baseline results are saved as the new baseline
+    """
+    all_case_names = list(BENCHMARK_CASES.keys()) + [STARTUP_CASE]
+    if not case_names:
+        case_names = all_case_names
+    for case_name in case_names:
+        if case_name not in all_case_names:
+            raise ValueError(f"Unknown benchmark case {case_name}, it can be {', '.join(all_case_names)}")
+
+    metrics.enable(trace_memory=False)
+    baseline = read_baseline(baseline_path)
+    results = {}
+    for case_name in case_names:
+        if case_name == STARTUP_CASE:
+            results[case_name] = run_startup_case(repeats)
+        else:
+            results[case_name] = run_case(BENCHMARK_CASES[case_name], repeats)
+        print_case(case_name, results[case_name], baseline)
+
+    regressions = find_regressions(results, baseline)
+    if len(baseline) == 0:
+        print("\nTHERE IS NO BASELINE, RESULTS ARE NOT COMPARED")
+    elif len(regressions) == 0:
+        print("\nNO REGRESSIONS FOUND")
+    else:
+        print(f"\nREGRESSIONS FOUND: {len(regressions)}")
+        for case_name, stage, old_value, value in regressions:
+            if stage == "peak memory":
+                print(f"{case_name}, {stage}: {old_value / 2**20:.1f} MB -> {value / 2**20:.1f} MB")
+            else:
+                print(f"{case_name}, {stage}: {old_value:.3f} s -> {value:.3f} s")
+    if save_baseline:
+        write_baseline(results, baseline_path)
+        print(f"\nBASELINE SAVED TO {baseline_path}")
+    return regressions
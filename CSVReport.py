@@ -1,13 +1,51 @@
 import os
+import sys
+import csv
 import json
+import time
+import shutil
+import tempfile
+import subprocess
 from datetime import datetime
 
 import pytest
-import pandas as pd
 
+from .AllureResults import ALLURE_CSV_HEADER, normalize_report_text, write_sorted_report, read_allure_results
+from .ReportManifest import add_report_to_manifest
+from .Instrumentation import metrics
 
-DF_NEWLINE_CHAR = "///n///" # DF stands for dataframe
-CURRENT_PATH = os.getcwd() + "\\Test_data"
+
+CURRENT_PATH = os.path.join(os.getcwd(), "Test_data")
+# Script run by every worker process, pytest arguments are given as JSON list on stdin,
+# so the command line does not get too long when there are a lot of tests in a shard
+SHARD_SCRIPT = "import sys, json, pytest; sys.exit(pytest.main(json.load(sys.stdin)))"
+# Script collecting tests in a new process, so test modules (and their module level setup) are not imported
+# by report generation. Pytest arguments and path of the file for collected node ids are given as JSON on stdin
+COLLECT_SCRIPT = """
+import sys, json, pytest
+
+class NodeIdCollector:
+    def __init__(self):
+        self.node_ids = []
+
+    def pytest_collection_finish(self, session):
+        for item in session.items:
+            name = item.nodeid.partition("::")[2]
+            self.node_ids.append(str(item.fspath) + "::" + name if name else str(item.fspath))
+
+args, node_ids_path = json.load(sys.stdin)
+collector = NodeIdCollector()
+exit_code = pytest.main(args, plugins=[collector])
+with open(node_ids_path, "w") as f:
+    json.dump(collector.node_ids, f)
+sys.exit(exit_code)
+"""
+# Exit codes of pytest collection which mean all tests were collected (tests collected, no tests collected)
+COLLECT_EXIT_CODES = [0, 5]
+# Exit codes of pytest in a shard which mean all its tests were run (all passed, some failed)
+SHARD_EXIT_CODES = [0, 1]
+# Number of seconds between checking which shard processes are finished
+SHARD_POLL_INTERVAL = 0.05
 
 
 def delete_files_in_dir(dir_path: str):
@@ -17,19 +55,52 @@ def delete_files_in_dir(dir_path: str):
     if os.path.exists(dir_path):
         file_list = [f for f in os.listdir(dir_path)]
         for file in file_list:
-            os.remove(dir_path + "\\" + file)
+            os.remove(os.path.join(dir_path, file))
 
 
 def get_number_of_tests():
-        with open(CURRENT_PATH + "\\allure-report\\history\\history-trend.json") as f:
+        with open(os.path.join(CURRENT_PATH, "allure-report", "history", "history-trend.json")) as f:
             data = json.load(f)
         return data[0]['data']['total']
 
 
-def sort_csv(path: str):
-    csv_df = pd.read_csv(path)
-    csv_df = csv_df.sort_values(by=["Name"])
-    csv_df.to_csv(path, index=False)
+def split_into_shards(node_ids: list[str], shards_number: int):
+    """
+    Split node ids of tests into shards_number lists. Tests from one file are always put in the
+    same shard so fixtures of the module are not set up in many processes. Files with the most 
+    tests are given first to the shard with the least tests
+    """
+    files = {}
+    for node_id in node_ids:
+        files.setdefault(node_id.split("::")[0], []).append(node_id)
+
+    shards = [[] for i in range(shards_number)]
+    for file_node_ids in sorted(files.values(), key=len, reverse=True):
+        min(shards, key=len).extend(file_node_ids)
+    return [shard for shard in shards if len(shard) > 0]
+
+
+def collect_node_ids(test_conditions: list):
+    """
+    Collects tests selected by test_conditions in a new process and returns their node ids with absolute
+    paths to the test files. RuntimeError is raised when pytest could not collect all tests (e.g. a test
+    module has an error), so shards are never built from a part of the tests
+    """
+    with tempfile.TemporaryDirectory() as collect_dir:
+        node_ids_path = os.path.join(collect_dir, "node_ids.json")
+        process = subprocess.run([sys.executable, "-c", COLLECT_SCRIPT], text=True,
+                                 input=json.dumps([["--collect-only", "-q"] + test_conditions, node_ids_path]))
+        if process.returncode not in COLLECT_EXIT_CODES:
+            raise RuntimeError(f"Collecting tests failed with pytest exit code {process.returncode}, tests were not run")
+        with open(node_ids_path) as f:
+            return json.load(f)
+
+
+def find_failed_shards(exit_codes: list):
+    """
+    Returns numbers of shards which exit codes show that not all their tests were run
+    """
+    return [i for i, exit_code in enumerate(exit_codes) if exit_code not in SHARD_EXIT_CODES]
 
 
 class CreateReport:
@@ -38,10 +109,15 @@ class CreateReport:
     Report will be named "DD-MM-YYYY HH-MM-SS file_name.csv"
     """
 
-    def __init__(self, folder_name: str, file_name: str, test_conditions: list):
+    def __init__(self, folder_name: str, file_name: str, test_conditions: list, workers: int = 1, csv_generator: str = "allure"):
         self.folder_name = folder_name
         self.file_name = file_name
         self.test_conditions = test_conditions
+        self.workers = workers
+        # "allure" - csv is generated by allure command line tool, "python" - csv is built from allure_results
+        if csv_generator not in ["allure", "python"]:
+            raise ValueError(f"Unknown csv generator {csv_generator}, it can be allure or python")
+        self.csv_generator = csv_generator
 
     def __print_allure_report_file(self, path_to_csv: str):
         """
@@ -97,66 +173,130 @@ class CreateReport:
                 print(data_2d[i][j] + " " * num_of_spaces + " " * col_separate_spaces + "|", end=" " * col_separate_spaces)
             print()
 
-    def __check_csv_report(self, path_to_csv: str):
-        test_no = get_number_of_tests()
-        with open(path_to_csv, "r") as f:
-            for i, l in enumerate(f):
-                pass
-            if i != test_no:
-                raise RuntimeError("An error occurred during checking csv file, possible lack of semicolon in test docstring. Open generated csv file to check error")
-    
-    def __rewrite_generated_report(self, path_to_csv: str):
+    def __write_report_from_allure(self, path_to_csv: str, test_no: int):
         """
-        Copy files from allure-report to TEST_FOLDER_NAME and change name to DD-MM-YYYY HH-MM-SS TEST_FILE_NAME,
-        also change newline characters in the test docstring to a character that represents the newline in html
+        Copy report from allure-report to TEST_FOLDER_NAME named DD-MM-YYYY HH-MM-SS TEST_FILE_NAME,
+        the report is read once and normalized, checked and sorted by test name on the way
         """
-        with open(CURRENT_PATH + "\\allure-report\\data\\suites.csv", "r") as file_r:
-            data_report = file_r.read()
+        if not os.path.exists(os.path.join(CURRENT_PATH, self.folder_name)):
+            os.mkdir(os.path.join(CURRENT_PATH, self.folder_name))
 
-        data_report = data_report.replace(";\n", DF_NEWLINE_CHAR)
-        data_report = data_report.replace("    ", "")
-        
-        if not os.path.exists(CURRENT_PATH + "\\" + self.folder_name):
-                os.mkdir(CURRENT_PATH + "\\" + self.folder_name)
-                
-        with open(path_to_csv, "w") as file_w:
-            file_w.write(data_report)
+        with open(os.path.join(CURRENT_PATH, "allure-report", "data", "suites.csv"), "r") as file_r:
+            reader = csv.reader(file_r)
+            header = [normalize_report_text(value) for value in next(reader)]
+            write_sorted_report(header, reader, path_to_csv, test_no)
+
+    def __write_report_from_results(self, path_to_csv: str):
+        """
+        Builds csv report straight from JSON files in allure_results without running allure,
+        rows are the same as in the report copied from allure-report. Returns number of tests,
+        if there are no tests the file is not created
+        """
+        if not os.path.exists(os.path.join(CURRENT_PATH, self.folder_name)):
+            os.mkdir(os.path.join(CURRENT_PATH, self.folder_name))
+
+        rows = read_allure_results(os.path.join(CURRENT_PATH, "allure_results"))
+        return write_sorted_report(ALLURE_CSV_HEADER, rows, path_to_csv)
+
+    def __run_tests_parallel(self):
+        """
+        Collects tests selected by test conditions, splits them into shards and runs every shard
+        in its own process with its own allure results directory. When all shards are finished
+        their results are merged into allure_results directory
+        """
+        shards = split_into_shards(collect_node_ids(self.test_conditions), self.workers)
+        # Options (e.g. -m MARK) are given to every shard, selected tests are given by node ids
+        options = [condition for condition in self.test_conditions if condition.startswith("-")]
+
+        shards_path = os.path.join(CURRENT_PATH, "allure_shards")
+        if os.path.exists(shards_path):
+            shutil.rmtree(shards_path)
+
+        start = time.perf_counter()
+        processes = []
+        for i, shard in enumerate(shards):
+            shard_path = os.path.join(shards_path, "shard_" + str(i))
+            os.makedirs(shard_path)
+            args = ["--alluredir=" + shard_path, "-s"] + options + shard
+            process = subprocess.Popen([sys.executable, "-c", SHARD_SCRIPT], stdin=subprocess.PIPE, text=True)
+            process.stdin.write(json.dumps(args))
+            process.stdin.close()
+            processes.append((process, time.perf_counter()))
+
+        # All processes are polled, so time of a shard is not extended by waiting for shards started before it
+        shard_times = [None] * len(processes)
+        while None in shard_times:
+            for i, (process, process_start) in enumerate(processes):
+                if shard_times[i] is None and process.poll() is not None:
+                    shard_times[i] = time.perf_counter() - process_start
+            if None in shard_times:
+                time.sleep(SHARD_POLL_INTERVAL)
+        total_time = time.perf_counter() - start
+
+        # Allure result files have unique names, so shards can be merged by copying files
+        os.makedirs(os.path.join(CURRENT_PATH, "allure_results"), exist_ok=True)
+        for i in range(len(shards)):
+            shard_path = os.path.join(shards_path, "shard_" + str(i))
+            for file in os.listdir(shard_path):
+                shutil.move(os.path.join(shard_path, file), os.path.join(CURRENT_PATH, "allure_results", file))
+        shutil.rmtree(shards_path)
+
+        print("\nSHARD RUNNING TIMES:")
+        for i in range(len(shards)):
+            print(f"shard {i}: {len(shards[i])} tests, {shard_times[i]:.2f} s, exit code {processes[i][0].returncode}")
+        if total_time > 0:
+            print(f"TOTAL: {total_time:.2f} s, speedup {sum(shard_times) / total_time:.2f}x compared to running shards one by one")
+
+        failed_shards = find_failed_shards([process.returncode for process, _ in processes])
+        if len(failed_shards) > 0:
+            raise RuntimeError(f"Shards {', '.join(map(str, failed_shards))} did not finish running their tests, the report would miss their results")
 
     def generate_report(self):
         """
-        Generates report to directory named folder_name. Generated file name is "DD-MM-YYYY HH-MM-SS file_name.csv"
+        Generates report to directory named folder_name. Generated file name is "DD-MM-YYYY HH-MM-SS file_name.csv".
+        Generated report is saved in the manifest of the directory as the latest report named file_name
         """
         if not os.path.exists(CURRENT_PATH):
             os.mkdir(CURRENT_PATH)
 
         # Delete JSON files from last run
-        delete_files_in_dir(CURRENT_PATH + "\\allure_results")
+        delete_files_in_dir(os.path.join(CURRENT_PATH, "allure_results"))
 
         # Run tests and create results as JSON files in directory allure_results
-        self.test_conditions.insert(0, "-s")
-        self.test_conditions.insert(0, "--alluredir=" + CURRENT_PATH + "\\allure_results")
-        pytest.main(self.test_conditions)
-
-        # Generate report from JSON files which contains needed .csv file
-        os.system("allure generate " + CURRENT_PATH + "\\allure_results" + " --clean -o " + CURRENT_PATH + "\\allure-report")
+        with metrics.stage("pytest"):
+            if self.workers > 1:
+                self.__run_tests_parallel()
+            else:
+                self.test_conditions.insert(0, "-s")
+                self.test_conditions.insert(0, "--alluredir=" + os.path.join(CURRENT_PATH, "allure_results"))
+                pytest.main(self.test_conditions)
 
         # Get the current date and time needed to rename report file
         now = datetime.now()
         # Change date and time to string
         date_time = now.strftime("%Y-%m-%d %H-%M-%S")
         
-        path_to_csv = CURRENT_PATH + "\\" + self.folder_name + "\\" + date_time + " " + self.file_name + ".csv"
+        path_to_csv = os.path.join(CURRENT_PATH, self.folder_name, date_time + " " + self.file_name + ".csv")
+
+        if self.csv_generator == "python":
+            # Build csv report from JSON files without generating allure report
+            with metrics.stage("csv report") as stage:
+                test_no = self.__write_report_from_results(path_to_csv)
+                stage["rows"] = test_no
+            if test_no > 0:
+                add_report_to_manifest(os.path.join(CURRENT_PATH, self.folder_name), self.file_name, path_to_csv, now.strftime("%Y-%m-%d %H:%M:%S"), test_no)
+            return
+
+        # Generate report from JSON files which contains needed .csv file
+        with metrics.stage("allure generate"):
+            os.system("allure generate " + os.path.join(CURRENT_PATH, "allure_results") + " --clean -o " + os.path.join(CURRENT_PATH, "allure-report"))
         
         test_no = get_number_of_tests()
         if test_no > 0:
-            # Rewrite report to TEST_FOLDER_NAME
-            self.__rewrite_generated_report(path_to_csv)
-            
-            # Check if rewrited csv report is ok
-            self.__check_csv_report(path_to_csv)
-            
-            # Sort data in generated report by test name
-            sort_csv(path_to_csv)
+            # Rewrite report to TEST_FOLDER_NAME, check it and sort data by test name
+            with metrics.stage("csv report", rows=test_no):
+                self.__write_report_from_allure(path_to_csv, test_no)
+            add_report_to_manifest(os.path.join(CURRENT_PATH, self.folder_name), self.file_name, path_to_csv, now.strftime("%Y-%m-%d %H:%M:%S"), test_no)
 
             # Print generated report file in terminal
             # self.__print_allure_report_file(path_to_csv)
@@ -1,9 +1,32 @@
+import io
 import os
-import msvcrt
+import re
+import json
+import time
+import hashlib
+import uuid
+import asyncio
+import getpass
+import tempfile
 from datetime import datetime
+from functools import lru_cache
 
 import pandas as pd
 from atlassian import Confluence
+from atlassian.errors import ApiError
+
+# msvcrt is available only on Windows, on other systems password is read by getpass
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+from .PageParser import StoragePage, parse_storage_page
+from .ResultTable import ResultTable, read_table_html
+from .HistoryStore import HistoryStore
+from .ReportManifest import get_latest_report
+from .AsyncConfluence import AsyncConfluence, PageVersionConflict
+from .Instrumentation import metrics
 
 
 # Html code of requirements is replaced by ///div0///, ///div1/// and so on, depends on the number of requirements in the table
@@ -19,7 +42,6 @@ DF_EM_END_CHAR = "///eem///"
 DF_DIV_DISPLAY_START_CHAR = "///sdd///"
 DF_DIV_DISPLAY_END_CHAR = "///edd///"
 DF_TAB_CHAR = "///tab///"
-DF_REQUIREMENTS = []
 HTML_REQUIREMENTS = """<div class="content-wrapper"><p><ac:structured-macro ac:name="requirement" ac:schema-version="1" ac:macro-id="53ae0f9b-4084-4e31-88c3-aba88e1eec3b"><ac:parameter ac:name="spaceKey">LWZ</ac:parameter><ac:parameter ac:name="freetext">Link</ac:parameter><ac:parameter ac:name="type">LINK</ac:parameter><ac:parameter ac:name="key">%s</ac:parameter></ac:structured-macro></p></div>"""
 HTML_FAIL_CHAR = """
     <div class="content-wrapper">
@@ -29,7 +51,25 @@ HTML_SUCCESS_CHAR = """
     <div class="content-wrapper">
     <p><ac:structured-macro ac:name="ry-test-result" ac:schema-version="1" ac:macro-id="7a735669-c8e8-4dad-99d6-3b9f37233d0a"><ac:parameter ac:name="status">(/) Success</ac:parameter></ac:structured-macro></p></div>
     """
+# Number of table rows converted to html code at once when the whole table is written
+TABLE_CHUNK_ROWS = 1000
+# Bodies of downloaded pages are cached there as <site>/<page_id>.json together with the page version,
+# every Confluence site has its own directory, because page ids are unique only on one site
+PAGE_CACHE_DIR = os.path.join("Test_data", "page_cache")
+# Display names of testers are cached there, a name is asked for again after TESTER_NAME_CACHE_TTL seconds
+TESTER_NAME_CACHE = os.path.join("Test_data", "tester_names.json")
+TESTER_NAME_CACHE_TTL = 24 * 60 * 60
+# Number of times the page is downloaded and merged again if somebody else changed it during loading
+MAX_CONFLICT_RETRIES = 3
+# Credentials are taken from these environment variables if they are set
+LOGIN_ENV = "CONFLUENCE_LOGIN"
+PASSWORD_ENV = "CONFLUENCE_PASSWORD"
 DOCSTRING_HEADERS = ["[REQUIREMENTS]", "[TEST NAME]", "[TEST DESCRIPTION]", "[EXPECTED RESULT]", "[ACTUAL RESULT]", "[TEST SETUP]", "[COMMENTS]"]
+DOCSTRING_HEADERS_PATTERN = re.compile("|".join(re.escape(header) for header in DOCSTRING_HEADERS))
+# Number of parsed test docstrings kept in memory, parsing is skipped for the same docstring
+DOCSTRING_CACHE_SIZE = 20000
+# Columns of the csv report with few different values, they are read as categories
+CSV_CATEGORY_COLUMNS = ["Status", "Parent Suite", "Suite", "Sub Suite", "Test Class"]
 TABLE_HEADER = {
     "Requirements": "Requirements",
     "Test Description": "Test Description",
@@ -42,6 +82,8 @@ TABLE_HEADER = {
     "Previous Results": "Previous Results",
     "Comments": "Comments"
 }
+# Columns of the test cases table with few different values, every value is kept in memory only once
+TABLE_CATEGORY_COLUMNS = [TABLE_HEADER[key] for key in ["Requirements", "Result", "Tester", "Date", "Test Setup"]]
 
 
 def get_date():
@@ -54,27 +96,108 @@ def get_date():
     return string_date
 
 
-def search_test_name_html(html_data_frame: pd.DataFrame, test_name_to_sign_result: str):
+def get_iso_date():
+    """
+    Method returns date YYYY-MM-DD as a string, dates in this format are used in the history store
+    """
+    return datetime.now().strftime("%Y-%m-%d")
+
+
+def limit_previous_results(previous_results: str, limit: int):
     """
-    Search for hidden test name in dataframe generated from html table
-    To know characters description see signs_to_replace() method
+    Keeps only limit newest results in "Previous Results" cell. Returns the new cell value and list of
+    removed results as (status, test setup) tuples. Results in the cell are separated by empty line
     """
-    for i in range(len(html_data_frame)):
-        test_name = html_data_frame.loc[i, TABLE_HEADER["Test Description"]]
-        div_end = test_name.find(DF_DIV_DISPLAY_END_CHAR)
-        if test_name[:div_end] == DF_DIV_DISPLAY_START_CHAR + test_name_to_sign_result:
-            return i
-    return -1
+    results = previous_results.split(2*DF_NEWLINE_CHAR)
+    if len(results) <= limit:
+        return previous_results, []
+
+    removed_results = [tuple(result.partition(DF_NEWLINE_CHAR)[::2]) for result in results[limit:]]
+    if limit == 0:
+        return DF_NEWLINE_CHAR, removed_results
+    return (2*DF_NEWLINE_CHAR).join(results[:limit]), removed_results
 
 
-def search_test_name_csv(csv_data_frame: pd.DataFrame, test_name_search: str):
+@lru_cache(maxsize=DOCSTRING_CACHE_SIZE)
+def parse_docstring(csv_desc: str):
     """
-    Search for the test name in the csv report file and return its row number
+    Returns dictionary {header: text} with every DOCSTRING_HEADERS section of the test docstring,
+    sections which are not in the docstring are empty. Positions of all headers are found in one scan.
+    Parsed docstrings are cached, so returned dictionary must not be changed
     """
-    for i in range(len(csv_data_frame)):
-        test_name = csv_data_frame.loc[i, "Name"]
-        if test_name == test_name_search:
-            return i
+    docstring = {key: "" for key in DOCSTRING_HEADERS}
+    headers_position = [-1] * len(DOCSTRING_HEADERS)
+    for match in DOCSTRING_HEADERS_PATTERN.finditer(csv_desc):
+        n = DOCSTRING_HEADERS.index(match.group())
+        if headers_position[n] == -1:
+            headers_position[n] = match.start()
+
+    newline_char_len = len(DF_NEWLINE_CHAR)
+    headers_len = [len(DOCSTRING_HEADERS[n]) + newline_char_len for n in range(len(DOCSTRING_HEADERS))]  
+
+    if -1 in headers_position[1:6]:
+        raise ValueError("One or more of the mandatory headers cannot be found in the test docstring")
+
+    for n in range(len(headers_position)-2):
+        if headers_position[n] > headers_position[n+1]:
+            raise ValueError("Wrong order of the headers in the test docstring")            
+
+    for n, val in enumerate(DOCSTRING_HEADERS):
+        if headers_position[n] == -1:
+            continue
+        else:
+            if val == "[TEST SETUP]":
+                if headers_position[n+1] == -1:
+                    docstring[val] = csv_desc[headers_position[n] + headers_len[n]:-newline_char_len]
+                else:
+                    docstring[val] = csv_desc[headers_position[n] + headers_len[n]:headers_position[n+1]]
+            elif val == "[COMMENTS]":
+                docstring[val] = csv_desc[headers_position[n] + headers_len[n]:]
+            else:
+                docstring[val] = csv_desc[headers_position[n] + headers_len[n]:headers_position[n+1]]
+        if docstring[val] == '':
+            raise ValueError(f"{val} cell cannot be empty")
+
+    return docstring
+
+
+def hidden_test_name(test_description):
+    """
+    Returns test name from hidden div at the beginning of the test description cell
+    or None if the cell does not start with hidden div
+    """
+    if not isinstance(test_description, str) or not test_description.startswith(DF_DIV_DISPLAY_START_CHAR):
+        return None
+    div_end = test_description.find(DF_DIV_DISPLAY_END_CHAR)
+    if div_end == -1:
+        return None
+    return test_description[len(DF_DIV_DISPLAY_START_CHAR):div_end]
+
+
+def index_test_names_html(table: ResultTable):
+    """
+    Build dictionary {hidden test name: row position} from test cases table read from html.
+    Test name is taken from hidden div at the beginning of the test description cell.
+    If test name appears more than once, the first row is kept
+    """
+    name_index = {}
+    descriptions = table.column_values(TABLE_HEADER["Test Description"])
+    for i, test_description in enumerate(descriptions):
+        test_name = hidden_test_name(test_description)
+        if test_name is not None:
+            name_index.setdefault(test_name, i)
+    return name_index
+
+
+def index_test_names_csv(csv_data_frame: pd.DataFrame):
+    """
+    Build dictionary {test name: row position} from the csv report dataframe.
+    If test name appears more than once, the first row is kept
+    """
+    name_index = {}
+    for i, test_name in enumerate(csv_data_frame["Name"].tolist()):
+        name_index.setdefault(test_name, i)
+    return name_index
 
 
 def search_div_requirement(conf_page_body: str):
@@ -83,15 +206,7 @@ def search_div_requirement(conf_page_body: str):
     that starts with <div and ends with </div> statement and contains "requirement" 
     keyword and return a list of these strings
     """
-    div_start = 0
-    div_end = 0
-    req_div_list = []
-    for i in range(conf_page_body.count('<div')):
-        div_start = conf_page_body.find('<div', div_start + 4)
-        div_end = conf_page_body.find('</div>', div_end + 6)
-        if "requirement" in conf_page_body[div_start:(div_end + 6)]:
-            req_div_list.append(conf_page_body[div_start:(div_end + 6)])
-    return req_div_list
+    return parse_storage_page(conf_page_body).req_div_list
 
 
 def search_content_outside_table(conf_page_body: str):
@@ -100,29 +215,93 @@ def search_content_outside_table(conf_page_body: str):
     10 headers (because this is table with test cases), replace it with TEST_CASES_TABLE_CHAR
     and return html code with replaced table that later will be modified
     """
-    table_start = 0
-    for i in range(conf_page_body.count('<table')):
-        table_start = conf_page_body.find('<table', table_start + 6)
+    return parse_storage_page(conf_page_body).content_outside_table(DF_TABLE_CHAR)
 
-    if table_start != -1:
-        tr_start = conf_page_body.find('<tr', table_start)
-        tr_end = conf_page_body.find('</tr>', table_start)
-        td_count = conf_page_body.count('<th', tr_start, tr_end)
-        if td_count < 10:
-            return conf_page_body
 
-        table_end = conf_page_body.find('</table>', table_start)
-        content = conf_page_body.replace(conf_page_body[table_start:table_end + 8], DF_TABLE_CHAR)
-        return content
-    return conf_page_body
+def build_sign_pattern(signs: list[str]):
+    """
+    Build regular expression matching any of given signs, the longest sign is preferred.
+    Signs are put into prefix tree, so common prefixes like "///div" are compared only once
+    """
+    tree = {}
+    for sign in signs:
+        node = tree
+        for char in sign:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def node_to_regex(node: dict):
+        branches = [re.escape(char) + node_to_regex(child) for char, child in node.items() if char != '']
+        if len(branches) == 0:
+            return ''
+        if len(branches) == 1 and '' not in node:
+            return branches[0]
+        regex = '(?:' + '|'.join(branches) + ')'
+        return regex + '?' if '' in node else regex
+
+    return re.compile(node_to_regex(tree))
+
+
+class SignTranslator:
+    """
+    Replaces all signs in given text in one scan instead of calling str.replace for every sign.
+    signs - dictionary {sign: replacement}, longer signs are preferred when they start at the same place
+    div_blocks - dictionary {div: replacement} for whole divs, div block starts with "<div"
+    and ends with the first "</div>" after it (e.g. requirement divs)
+    hidden_div - pair (opening sign, replacement of the first "</div>" after the opening sign)
+    """
+    def __init__(self, signs: dict, div_blocks: dict = None, hidden_div: tuple = None):
+        self.signs = signs
+        self.div_blocks = div_blocks if div_blocks is not None else {}
+        self.hidden_div = hidden_div
+
+        tokens = list(signs.keys())
+        if self.div_blocks:
+            tokens.append('<div')
+        if self.hidden_div is not None:
+            tokens.append('</div>')
+        self.pattern = build_sign_pattern(tokens) if tokens else None
+
+    def translate(self, text: str):
+        if self.pattern is None:
+            return text
+
+        chunks = []
+        position = 0
+        hidden_div_open = False
+        match = self.pattern.search(text, position)
+        while match is not None:
+            token = match.group()
+            chunks.append(text[position:match.start()])
+            position = match.end()
+
+            if token == '<div':
+                # Div is replaced only if the whole div up to the first </div> is a known block
+                div_end = text.find('</div>', match.start())
+                block = text[match.start():div_end + 6] if div_end != -1 else None
+                if block in self.div_blocks:
+                    chunks.append(self.div_blocks[block])
+                    position = div_end + 6
+                else:
+                    chunks.append(token)
+            elif token == '</div>' and token not in self.signs:
+                chunks.append(self.hidden_div[1] if hidden_div_open else token)
+                hidden_div_open = False
+            else:
+                if self.hidden_div is not None and token == self.hidden_div[0]:
+                    hidden_div_open = True
+                chunks.append(self.signs[token])
+            match = self.pattern.search(text, position)
 
+        chunks.append(text[position:])
+        return ''.join(chunks)
 
-def replace_signs_html_to_dataframe(conf_page_body: str, req_div_list: list[str]):
+
+def html_to_dataframe_translator(req_div_list: list[str]):
     """
-    Replace certain characters in the html code before converting to dataframe
-    to avoid losing them
+    Returns SignTranslator which replaces certain characters in the html code before 
+    converting to dataframe to avoid losing them
     """
-    
     signs_to_replace = {
         '<br />': DF_NEWLINE_CHAR,
         '<strong>': DF_STRONG_START_CHAR,
@@ -131,29 +310,27 @@ def replace_signs_html_to_dataframe(conf_page_body: str, req_div_list: list[str]
         '</em>': DF_EM_END_CHAR,
         '<div style="display: none;">': DF_DIV_DISPLAY_START_CHAR,
     }
+    req_div_to_replace = {req_div_list[i]: f"///div{i}///" for i in range(len(req_div_list))}
 
-    div_display_search_index = 0
-    for i in range(conf_page_body.count('<div style="display: none;">')):
-        div_display_start = conf_page_body.find('<div style="display: none;">', div_display_search_index)
-        div_display_end_start = conf_page_body.find('</div>', div_display_start)
-        div_display_search_index = div_display_start + len('<div style="display: none;">')
-        conf_page_body = conf_page_body[:div_display_end_start] + DF_DIV_DISPLAY_END_CHAR + conf_page_body[div_display_end_start + 6:]
-
-    if len(req_div_list) > 0:
-        for i in range(len(req_div_list)):
-            signs_to_replace[req_div_list[i]] = f"///div{i}///"
-
-    for key in signs_to_replace.keys():
-        conf_page_body = conf_page_body.replace(key, signs_to_replace[key])
-
-    return conf_page_body
+    return SignTranslator(
+        signs=signs_to_replace,
+        div_blocks=req_div_to_replace,
+        hidden_div=('<div style="display: none;">', DF_DIV_DISPLAY_END_CHAR)
+    )
 
 
-def replace_signs_dataframe_to_html(df_data: str, req_div_list: list[str]):
+def dataframe_to_html_translator(req_div_list: list[str], df_requirements: list[str]):
     """
-    Replace back characters to html code after converting dataframe to html
+    Returns SignTranslator which replaces back characters to html code after converting 
+    dataframe to html
     """
-    signs_to_replace = {
+    signs_to_replace = {}
+    for req in df_requirements:
+        r = req[3:-3]
+        r = r.replace(DF_NEWLINE_CHAR, "")
+        signs_to_replace[req] = HTML_REQUIREMENTS % r
+
+    signs_to_replace.update({
         DF_FAIL_CHAR: HTML_FAIL_CHAR,
         DF_SUCCESS_CHAR: HTML_SUCCESS_CHAR,
         'NaN': '',
@@ -165,28 +342,263 @@ def replace_signs_dataframe_to_html(df_data: str, req_div_list: list[str]):
         DF_DIV_DISPLAY_START_CHAR: '<div style="display: none;">',
         DF_DIV_DISPLAY_END_CHAR: '</div>',
         DF_TAB_CHAR: '&nbsp;&nbsp;&nbsp;&nbsp;'
-    }
-    
-    if DF_REQUIREMENTS != []:
-        for req in DF_REQUIREMENTS:
-            r = req[3:-3]
-            r = r.replace(DF_NEWLINE_CHAR, "")
-            df_data = df_data.replace(req, HTML_REQUIREMENTS % r)
-    
-    if len(req_div_list) > 0:
-        for i in range(len(req_div_list)):
-            signs_to_replace[f"///div{i}///"] = req_div_list[i]
+    })
+
+    for i in range(len(req_div_list)):
+        signs_to_replace[f"///div{i}///"] = req_div_list[i]
+
+    return SignTranslator(signs=signs_to_replace)
+
+
+def dataframe_to_text_translator():
+    """
+    Returns SignTranslator which replaces characters of dataframe cells with plain text,
+    used for values saved outside of the page (e.g. test setup in the history store)
+    """
+    return SignTranslator(signs={
+        DF_NEWLINE_CHAR: '\n',
+        DF_STRONG_START_CHAR: '',
+        DF_STRONG_END_CHAR: '',
+        DF_EM_START_CHAR: '',
+        DF_EM_END_CHAR: '',
+        DF_TAB_CHAR: '    '
+    })
+
+
+def replace_signs_html_to_dataframe(conf_page_body: str, req_div_list: list[str]):
+    """
+    Replace certain characters in the html code before converting to dataframe
+    to avoid losing them
+    """
+    return html_to_dataframe_translator(req_div_list).translate(conf_page_body)
+
+
+def replace_signs_dataframe_to_html(df_data: str, req_div_list: list[str], df_requirements: list[str] = None):
+    """
+    Replace back characters to html code after converting dataframe to html, df_requirements
+    are requirement signs ///KEY/// added to the table from test docstrings
+    """
+    df_requirements = df_requirements if df_requirements is not None else []
+    return dataframe_to_html_translator(req_div_list, df_requirements).translate(df_data)
+
+
+def read_test_table(table_html: str):
+    """
+    Returns ResultTable with the test cases table from html code with replaced signs. Simple tables
+    are read straight from html code, other tables are read by pandas.read_html
+    """
+    table = read_table_html(table_html, TABLE_CATEGORY_COLUMNS)
+    if table is not None:
+        return table
+
+    df = pd.read_html(table_html)[0]
+    table = ResultTable([str(column) for column in df.columns], TABLE_CATEGORY_COLUMNS)
+    for row in df.itertuples(index=False):
+        table.load_row([None if pd.isna(value) else value for value in row])
+    return table
+
+
+def get_page_cache_path(url: str, page_id: str):
+    """
+    Returns path of the cache file of the page with given id on Confluence site with given url
+    """
+    site = re.sub(r'[^A-Za-z0-9]+', '_', url).strip('_')[:40]
+    site = site + "_" + hashlib.sha1(url.encode("utf-8")).hexdigest()[:8]
+    return os.path.join(PAGE_CACHE_DIR, site, page_id + ".json")
+
 
-    for key in signs_to_replace.keys():
-        df_data = df_data.replace(key, signs_to_replace[key])
+def read_page_cache(url: str, page_id: str, version: int):
+    """
+    Return cached body of the page with given id on given site if it was cached for given page version,
+    otherwise return None
+    """
+    path = get_page_cache_path(url, page_id)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+    except ValueError:
+        return None
+    if cache.get("version") != version:
+        return None
+    return cache.get("body")
+
+
+def write_page_cache(url: str, page_id: str, version: int, body: str):
+    """
+    Save body of the page with given id and version on given site in the page cache
+    """
+    path = get_page_cache_path(url, page_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Cache is written to temporary file first so interrupted run cannot leave broken cache
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"url": url, "page_id": page_id, "version": version, "body": body}, f)
+    os.replace(path + ".tmp", path)
+
+
+def read_tester_name_cache(login: str):
+    """
+    Return cached display name of the user if it was cached less than TESTER_NAME_CACHE_TTL seconds ago,
+    otherwise return None
+    """
+    if not os.path.exists(TESTER_NAME_CACHE):
+        return None
+    try:
+        with open(TESTER_NAME_CACHE, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+    except ValueError:
+        return None
+    tester = cache.get(login)
+    if tester is None or time.time() - tester["time"] > TESTER_NAME_CACHE_TTL:
+        return None
+    return tester["name"]
+
+
+def write_tester_name_cache(login: str, name: str):
+    """
+    Save display name of the user in the tester name cache
+    """
+    cache = {}
+    if os.path.exists(TESTER_NAME_CACHE):
+        try:
+            with open(TESTER_NAME_CACHE, "r", encoding="utf-8") as f:
+                cache = json.load(f)
+        except ValueError:
+            cache = {}
+    cache[login] = {"name": name, "time": time.time()}
+
+    cache_dir = os.path.dirname(TESTER_NAME_CACHE)
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir, exist_ok=True)
+    # Every writer uses its own temporary file, because pages loaded at once can write the cache at the same time
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(cache, f)
+    os.replace(tmp_path, TESTER_NAME_CACHE)
+
+
+def get_credentials(login: str = None, password: str = None, headless: bool = False):
+    """
+    Returns Confluence login and password. Values not given are taken from CONFLUENCE_LOGIN and
+    CONFLUENCE_PASSWORD environment variables, then asked for in the terminal. In headless mode
+    nothing is asked for and RuntimeError is raised if credentials are missing
+    """
+    login = login or os.environ.get(LOGIN_ENV)
+    password = password or os.environ.get(PASSWORD_ENV)
+    if login and password:
+        return login, password
+    if headless:
+        raise RuntimeError(f"Confluence credentials are missing, set {LOGIN_ENV} and {PASSWORD_ENV} environment variables or [headless] section of the configuration file")
+
+    print("\nCONFLUENCE CREDENTIALS")
+    if not login:
+        login = input("User name: ")
+    else:
+        print(f"User name: {login}")
+    if not password:
+        password = get_pass()
+    return login, password
+
+
+def get_key():
+    """
+    Returns one key pressed in the terminal, on systems without msvcrt the line typed is read
+    """
+    if msvcrt is None:
+        return input()[:1]
+    choice = msvcrt.getch().decode("utf-8")
+    print()
+    return choice
+
+
+async def fetch_page(client: AsyncConfluence, url: str, page_id: str, page_cache=None):
+    """
+    Returns body and version of the page with given id on Confluence site with given url. Only page version
+    is requested first, the body is downloaded only if it is not in the page cache for this version. page_cache
+    is an optional cache in memory with get((url, page_id)) and page_cache[(url, page_id)] = (version, body),
+    it is checked before the page cache on the disk, e.g. by the sync daemon which loads the same pages many times
+    """
+    try:
+        page = await client.get_page_by_id(page_id, expand="version")
+    except ApiError:
+        raise RuntimeError("Page not found")
+    if not page:
+        raise RuntimeError("Page not found")
+
+    version = page['version']['number']
+    if page_cache is not None:
+        cached_page = page_cache.get((url, page_id))
+        if cached_page is not None and cached_page[0] == version:
+            return cached_page[1], version
+
+    body = read_page_cache(url, page_id, version)
+    if body is None:
+        page = await client.get_page_by_id(page_id, expand="body.storage,version")
+        version = page['version']['number']
+        body = page['body']['storage']['value']
+        write_page_cache(url, page_id, version, body)
+    if page_cache is not None:
+        page_cache[(url, page_id)] = (version, body)
+    return body, version
+
+
+async def update_page(client: AsyncConfluence, url: str, page_id: str, page_title: str, body: str, version: int, page_cache=None):
+    """
+    Saves body as the next version of the page after given version and returns the new version.
+    If the update was saved but its response was lost, the retried update gets version conflict,
+    so the page version is checked for the message of this update before PageVersionConflict is raised.
+    Saved body is put in the page caches under the new version, so the next run does not download it
+    """
+    message = "Test report " + uuid.uuid4().hex
+    try:
+        with metrics.stage("update page"):
+            new_version = await client.update_page(page_id, page_title, body, version, message)
+    except PageVersionConflict:
+        page = await client.get_page_by_id(page_id, expand="version")
+        if page['version']['number'] != version + 1 or page['version'].get('message') != message:
+            raise
+        new_version = version + 1
+    write_page_cache(url, page_id, new_version, body)
+    if page_cache is not None:
+        page_cache[(url, page_id)] = (new_version, body)
+    return new_version
+
+
+def read_latest_report(csv_dir: str, csv_file_name: str):
+    """
+    Returns file name and dataframe of the latest csv report named csv_file_name in csv_dir.
+    The latest report is taken from the manifest, the directory is listed only if there is no manifest
+    """
+    latest_report = get_latest_report(csv_dir, csv_file_name)
+    if latest_report is not None:
+        csv_file = latest_report["file"]
+    else:
+        listing = os.listdir(path=csv_dir)
+        # Report names start with date and time, so the last sorted name is the newest report
+        csv_files = sorted(item for item in listing if item.endswith(csv_file_name + '.csv'))
+        if len(csv_files) == 0:
+            raise RuntimeError("CSV File does not exist")
+        csv_file = csv_files[-1]
+    return csv_file, read_csv_report(os.path.join(csv_dir, csv_file))
 
-    return df_data
+
+def read_csv_report(csv_path: str):
+    """
+    Returns dataframe of the csv report with given path, columns with few different values are read as categories
+    """
+    with metrics.stage("read csv") as stage:
+        csv_df = pd.read_csv(csv_path, dtype={column: "category" for column in CSV_CATEGORY_COLUMNS})
+        stage["rows"] = len(csv_df)
+    return csv_df
 
 
 def get_pass():
     """
     Control echo in the terminal to safely enter the password
     """
+    if msvcrt is None:
+        return getpass.getpass("Password: ")
     print("Password: ", end="", flush=True)
     password = ''
     while True:
@@ -203,9 +615,21 @@ def get_pass():
 
 class Dataloader:
     """
-    To load data from last created csv report to Confluence use load_data_to_confluence() method
+    To load data from last created csv report to Confluence use load_data_to_confluence() method.
+    Already authenticated Confluence client can be given by confluence and login parameters,
+    then credentials are not asked for. Otherwise login and password are taken from parameters or
+    environment, missing ones are asked for unless headless is True. If previous_results_limit is given,
+    only that many newest results are kept in "Previous Results" column. If history_store is given, every loaded result
+    is saved in it, together with results removed from "Previous Results" column. If csv_data_frame
+    is given, its results are loaded instead of the last created csv report. Results of tests named in
+    loaded_tests were already loaded in this run, so they are replaced and not moved to "Previous Results".
+    Tests loaded to the page are added to loaded_tests when loading succeeds, so the same set can be given
+    to the next loader of this page. page_cache is given to fetch_page(), so pages loaded many times in one process are kept in memory
     """
-    def __init__(self, url: str, page_id: str, page_title: str, page_space_key: str, csv_folder_name: str, csv_file_name: str, description_only: bool = False):
+    def __init__(self, url: str, page_id: str, page_title: str, page_space_key: str, csv_folder_name: str, csv_file_name: str, description_only: bool = False,
+                 confluence: Confluence = None, login: str = None, previous_results_limit: int = None, history_store: HistoryStore = None,
+                 password: str = None, headless: bool = False, csv_data_frame: pd.DataFrame = None, loaded_tests: set = None,
+                 page_cache=None):
         self.url = url
         self.page_id = page_id
         self.page_title = page_title
@@ -213,20 +637,33 @@ class Dataloader:
         self.csv_dir = os.path.join("Test_data", csv_folder_name)
         self.csv_file_name = csv_file_name
         self.description_only = description_only
+        self.previous_results_limit = previous_results_limit
+        self.history_store = history_store
+        self.loaded_tests = loaded_tests if loaded_tests is not None else set()
+        self.page_cache = page_cache
         self.__tester_name = ''
+        self.__history_results = []
+        # Requirement signs ///KEY/// added to the table by the last merge, they are replaced back by requirement macros
+        self.__requirements = set()
+        # Tests merged into the table by the last merge, they are added to loaded_tests when the page is saved
+        self.__merged_tests = set()
         
-        listing = os.listdir(path=self.csv_dir)
-        csv_files = [item for item in listing if item.endswith(self.csv_file_name + '.csv')]
-        try:
-            self.csv_df = pd.read_csv(os.path.join(self.csv_dir, csv_files[-1]))
-        except IndexError:
-            raise RuntimeError("CSV File does not exist")
+        # Body of the page after the last load_data_to_confluence()
+        self.page_body = None
         
-        print(f"\nUPLOADING THE FILE:\n{self.csv_dir}\{csv_files[-1]}")
-        print(f"ON THE PAGE TITLED:\n{self.page_title}")
-        print("\nCONFLUENCE CREDENTIALS")
-        self.__login = input("User name: ")
-        password = get_pass()
+        if csv_data_frame is not None:
+            self.csv_df = csv_data_frame
+            print(f"\nUPLOADING {len(csv_data_frame)} TESTS ON THE PAGE TITLED:\n{self.page_title}")
+        else:
+            csv_file, self.csv_df = read_latest_report(self.csv_dir, self.csv_file_name)
+            print(f"\nUPLOADING THE FILE:\n{os.path.join(self.csv_dir, csv_file)}")
+            print(f"ON THE PAGE TITLED:\n{self.page_title}")
+        if confluence is not None:
+            self.__login = login
+            self.__confluence = confluence
+            return
+
+        self.__login, password = get_credentials(login, password, headless)
 
         self.__confluence = Confluence(
             url=self.url,
@@ -234,15 +671,20 @@ class Dataloader:
             password=password,
         )
 
-    def __get_tester_name(self):
+    async def __get_tester_name(self, client: AsyncConfluence):
         """
-        Get tester name and surname
+        Get tester name and surname, the name is asked for only if it is not in the tester name cache
         """
-        self.__tester_name = self.__confluence.get_user_details_by_username(self.__login, expand=None)['displayName']
+        tester_name = read_tester_name_cache(self.__login)
+        if tester_name is None:
+            tester_name = (await client.get_user_details_by_username(self.__login, expand=None))['displayName']
+            write_tester_name_cache(self.__login, tester_name)
+        self.__tester_name = tester_name
     
     def __create_table_header(self, content: str):
         """
-        Creates table header on given Confluence page
+        Returns given page content with empty table with header added at the end. The table is not
+        sent to Confluence, it is saved on the page together with merged results
         """
         table = """<table border="1" class="dataframe">
         <thead>
@@ -253,18 +695,12 @@ class Dataloader:
         
         table = table + "</tr></thead>\n<tbody></tbody>\n</table>"
         
-        self.__confluence.update_page(
-            page_id=self.page_id,
-            title=self.page_title,
-            body=content + table
-        )
-        
-        return content + DF_TABLE_CHAR
+        return content + table
 
-    def __update_table_data(self, html_data_frame: pd.DataFrame, csv_data_frame: pd.DataFrame):
+    def __update_table_data(self, table: ResultTable, csv_data_frame: pd.DataFrame, div_req_list: list[str]):
         """
-        Method updates html dataframe with results from csv dataframe and creates temporary 
-        file with converted dataframe to html code
+        Method updates test cases table read from the page with results from csv dataframe,
+        the table keeps changed rows and new rows
         """
         
         csv_status_to_html = {
@@ -275,160 +711,229 @@ class Dataloader:
             DF_SUCCESS_CHAR: "Success",
             DF_FAIL_CHAR: "Fail"
         }
-        
-        self.__get_tester_name()
 
         csv_name_list = [test_name for test_name in csv_data_frame.Name]
         # csv_name_list.sort()
+        csv_status_list = csv_data_frame["Status"].tolist()
+        csv_desc_list = csv_data_frame["Description"].tolist()
+
+        # Indexes are built once per sync instead of searching whole dataframe for every test
+        csv_name_index = index_test_names_csv(csv_data_frame)
+        html_name_index = index_test_names_html(table)
+        # Requirement macros of the page are read as ///divN///, requirement with the same macro gets the same value,
+        # so the row does not change if its requirement did not change
+        requirement_divs = {div_req_list[i]: f"///div{i}///" for i in range(len(div_req_list))}
+
+        # Results of tests which are not in the store yet are moved there from the page when the limit is reached
+        stored_test_names = set()
+        if self.history_store is not None:
+            stored_test_names = self.history_store.get_test_names(self.page_id)
+        iso_date = get_iso_date()
+        self.__history_results = []
+        self.__requirements = set()
+        self.__merged_tests = set()
 
         for i in range(len(csv_name_list)): 
-            csv_row = search_test_name_csv(csv_data_frame, csv_name_list[i])
+            csv_row = csv_name_index[csv_name_list[i]]
 
-            csv_status = csv_data_frame.loc[csv_row, "Status"]
+            csv_status = csv_status_list[csv_row]
             # If status is not "passed" or "failed" then skip updating table
             if csv_status not in csv_status_to_html.keys():
                 continue
+            self.__merged_tests.add(csv_name_list[i])
             
             # Reading elements from the test docstring
-            csv_desc = csv_data_frame.loc[csv_row, "Description"]
-            docstring = {key: "" for key in DOCSTRING_HEADERS}
-            headers_position = [csv_desc.find(DOCSTRING_HEADERS[n]) for n in range(len(DOCSTRING_HEADERS))]
-  
-            newline_char_len = len(DF_NEWLINE_CHAR)
-            headers_len = [len(DOCSTRING_HEADERS[n]) + newline_char_len for n in range(len(DOCSTRING_HEADERS))]  
+            csv_desc = csv_desc_list[csv_row]
+            docstring = parse_docstring(csv_desc)
 
-            if -1 in headers_position[1:6]:
-                raise ValueError("One or more of the mandatory headers cannot be found in the test docstring")
-        
-            for n in range(len(headers_position)-2):
-                if headers_position[n] > headers_position[n+1]:
-                    raise ValueError("Wrong order of the headers in the test docstring")            
-            
-            for n, val in enumerate(DOCSTRING_HEADERS):
-                if headers_position[n] == -1:
-                    continue
-                else:
-                    if val == "[TEST SETUP]":
-                        if headers_position[n+1] == -1:
-                            docstring[val] = csv_desc[headers_position[n] + headers_len[n]:-newline_char_len]
-                        else:
-                            docstring[val] = csv_desc[headers_position[n] + headers_len[n]:headers_position[n+1]]
-                    elif val == "[COMMENTS]":
-                        docstring[val] = csv_desc[headers_position[n] + headers_len[n]:]
-                    else:
-                        docstring[val] = csv_desc[headers_position[n] + headers_len[n]:headers_position[n+1]]
-                if docstring[val] == '':
-                    raise ValueError(f"{val} cell cannot be empty")
-
-            test_name_row = search_test_name_html(html_data_frame, csv_name_list[i])
-
-            if test_name_row != -1 and not self.description_only:
-                last_result = html_data_frame.loc[test_name_row, TABLE_HEADER["Result"]]
-                last_test_setup = html_data_frame.loc[test_name_row, TABLE_HEADER["Test Setup"]]
+            test_name_row = html_name_index.get(csv_name_list[i], -1)
+
+            newline_char_len = len(DF_NEWLINE_CHAR)
+            if test_name_row != -1 and not self.description_only and csv_name_list[i] not in self.loaded_tests:
+                last_result = table.get(test_name_row, TABLE_HEADER["Result"])
+                last_test_setup = table.get(test_name_row, TABLE_HEADER["Test Setup"])
                 if last_test_setup[-newline_char_len:] == DF_NEWLINE_CHAR:
                     last_test_setup = last_test_setup[:-newline_char_len]
 
-                if html_data_frame.loc[test_name_row, TABLE_HEADER["Previous Results"]] == DF_NEWLINE_CHAR:
-                    html_data_frame.loc[test_name_row, TABLE_HEADER["Previous Results"]] = \
-                        last_result_change[last_result] + DF_NEWLINE_CHAR + last_test_setup
+                previous_results = table.get(test_name_row, TABLE_HEADER["Previous Results"])
+                if previous_results == DF_NEWLINE_CHAR:
+                    previous_results = last_result_change[last_result] + DF_NEWLINE_CHAR + last_test_setup
                 else:
-                    html_data_frame.loc[test_name_row, TABLE_HEADER["Previous Results"]] = \
-                        last_result_change[last_result] + DF_NEWLINE_CHAR + last_test_setup \
-                        + 2*DF_NEWLINE_CHAR + html_data_frame.loc[test_name_row, TABLE_HEADER["Previous Results"]]
-                # html_data_frame.loc[test_name_row, "Previous Results"] = newline_char
+                    previous_results = last_result_change[last_result] + DF_NEWLINE_CHAR + last_test_setup \
+                        + 2*DF_NEWLINE_CHAR + previous_results
+                if self.previous_results_limit is not None:
+                    previous_results, removed_results = limit_previous_results(previous_results, self.previous_results_limit)
+                    if csv_name_list[i] not in stored_test_names:
+                        # Removed results are the oldest ones, so they are saved from the oldest
+                        for status, test_setup in reversed(removed_results):
+                            self.__history_results.append((csv_name_list[i], self.page_id, None, status, test_setup, None))
+                table.set(test_name_row, TABLE_HEADER["Previous Results"], previous_results)
 
             if test_name_row == -1:
-                test_name_row = len(html_data_frame)
-                html_data_frame.loc[test_name_row, TABLE_HEADER["Test Description"]] = DF_DIV_DISPLAY_START_CHAR + csv_name_list[i] + DF_DIV_DISPLAY_END_CHAR + \
-                                                                                       DF_STRONG_START_CHAR + docstring['[TEST NAME]'] + DF_STRONG_END_CHAR + \
-                                                                                       DF_NEWLINE_CHAR + docstring['[TEST DESCRIPTION]']
-                html_data_frame.loc[test_name_row, TABLE_HEADER["Previous Results"]] = DF_NEWLINE_CHAR
+                test_name_row = table.add_row()
+                html_name_index[csv_name_list[i]] = test_name_row
+                table.set(test_name_row, TABLE_HEADER["Test Description"], DF_DIV_DISPLAY_START_CHAR + csv_name_list[i] + DF_DIV_DISPLAY_END_CHAR + \
+                                                                           DF_STRONG_START_CHAR + docstring['[TEST NAME]'] + DF_STRONG_END_CHAR + \
+                                                                           DF_NEWLINE_CHAR + docstring['[TEST DESCRIPTION]'])
+                table.set(test_name_row, TABLE_HEADER["Previous Results"], DF_NEWLINE_CHAR)
             else:
-                div_index = html_data_frame.loc[test_name_row, TABLE_HEADER["Test Description"]].find(DF_DIV_DISPLAY_END_CHAR)
-                store_html_test_name = html_data_frame.loc[test_name_row, TABLE_HEADER["Test Description"]][:div_index + len(DF_DIV_DISPLAY_END_CHAR)]
-                html_data_frame.loc[test_name_row, TABLE_HEADER["Test Description"]] = store_html_test_name + \
-                                                                                       DF_STRONG_START_CHAR + docstring['[TEST NAME]'] + DF_STRONG_END_CHAR + \
-                                                                                       DF_NEWLINE_CHAR + docstring['[TEST DESCRIPTION]']
-
-            # html_data_frame.loc[test_name_row, TABLE_HEADER["Test Description"]] = DOCSTRING_CSV['[TEST DESCRIPTION]']
-            html_data_frame.loc[test_name_row, TABLE_HEADER["Expected Result"]] = docstring['[EXPECTED RESULT]']
-            html_data_frame.loc[test_name_row, TABLE_HEADER["Actual Result"]] = docstring['[ACTUAL RESULT]']
+                test_description = table.get(test_name_row, TABLE_HEADER["Test Description"])
+                div_index = test_description.find(DF_DIV_DISPLAY_END_CHAR)
+                store_html_test_name = test_description[:div_index + len(DF_DIV_DISPLAY_END_CHAR)]
+                table.set(test_name_row, TABLE_HEADER["Test Description"], store_html_test_name + \
+                                                                           DF_STRONG_START_CHAR + docstring['[TEST NAME]'] + DF_STRONG_END_CHAR + \
+                                                                           DF_NEWLINE_CHAR + docstring['[TEST DESCRIPTION]'])
+
+            table.set(test_name_row, TABLE_HEADER["Expected Result"], docstring['[EXPECTED RESULT]'])
+            table.set(test_name_row, TABLE_HEADER["Actual Result"], docstring['[ACTUAL RESULT]'])
             if not self.description_only:
-                html_data_frame.loc[test_name_row, TABLE_HEADER["Result"]] = csv_status_to_html[csv_status]
-            html_data_frame.loc[test_name_row, TABLE_HEADER["Date"]] = get_date()
-            html_data_frame.loc[test_name_row, TABLE_HEADER["Tester"]] = self.__tester_name
-            html_data_frame.loc[test_name_row, TABLE_HEADER["Test Setup"]] = docstring['[TEST SETUP]']
-            if headers_position[-1] != -1:
-                html_data_frame.loc[test_name_row, TABLE_HEADER["Comments"]] = docstring['[COMMENTS]']
-            if headers_position[0] != -1:
-                html_data_frame.loc[test_name_row, TABLE_HEADER["Requirements"]] = "///" + docstring['[REQUIREMENTS]'] + "///"
-                DF_REQUIREMENTS.append("///" + docstring['[REQUIREMENTS]'] + "///")
-            
-        html_data_frame = html_data_frame.sort_values(by="Test Description")
-        html_data_frame.to_html('temp_html.html', index=False)
+                table.set(test_name_row, TABLE_HEADER["Result"], csv_status_to_html[csv_status])
+                self.__history_results.append((csv_name_list[i], self.page_id, iso_date, last_result_change[csv_status_to_html[csv_status]],
+                                               docstring['[TEST SETUP]'], self.__tester_name))
+            table.set(test_name_row, TABLE_HEADER["Date"], get_date())
+            table.set(test_name_row, TABLE_HEADER["Tester"], self.__tester_name)
+            table.set(test_name_row, TABLE_HEADER["Test Setup"], docstring['[TEST SETUP]'])
+            # Optional sections are empty only if their header is not in the docstring
+            if docstring['[COMMENTS]'] != '':
+                table.set(test_name_row, TABLE_HEADER["Comments"], docstring['[COMMENTS]'])
+            if docstring['[REQUIREMENTS]'] != '':
+                requirement = "///" + docstring['[REQUIREMENTS]'] + "///"
+                requirement_div = requirement_divs.get(HTML_REQUIREMENTS % docstring['[REQUIREMENTS]'].replace(DF_NEWLINE_CHAR, ""))
+                if requirement_div is not None:
+                    requirement = requirement_div
+                else:
+                    self.__requirements.add(requirement)
+                table.set(test_name_row, TABLE_HEADER["Requirements"], requirement)
 
-    def __send_updated_data_to_confluence(self, cont_outside_table: str, div_req_list: list[str]):
+    def __splice_changed_rows(self, page: StoragePage, table: ResultTable, div_req_list: list[str]):
+        """
+        Method converts to html code only changed and new rows and puts them in place of old rows
+        in the page body, rows which did not change are copied from the page body. Rows are placed
+        in the same order as sort by "Test Description" would give. Returns None if rows of the page
+        cannot be matched with rows of the table, then the whole table has to be converted
+        """
+        data_rows = page.rows[1:]
+        if len(data_rows) == 0 or len(data_rows) != table.existing_rows:
+            return None
+        descriptions = table.column_values(TABLE_HEADER["Test Description"])
+        for i in range(table.existing_rows):
+            if hidden_test_name(descriptions[i]) != page.row_names[i + 1]:
+                return None
+
+        order = table.sorted_rows(TABLE_HEADER["Test Description"])
+        if [row for row in order if row < table.existing_rows] != list(range(table.existing_rows)):
+            return None
+
+        translator = dataframe_to_html_translator(div_req_list, self.__requirements)
+        rendered_rows = {row: translator.translate(table.row_html(row)) for row in order
+                         if row >= table.existing_rows or row in table.changed_rows}
+
+        table_rows = [rendered_rows[row] if row in rendered_rows else page.row_html(row + 1) for row in order]
+        # Rows are separated the same way as in the table written by to_html
+        return page.body[:data_rows[0][0]] + "\n    ".join(table_rows) + page.body[data_rows[-1][1]:]
+
+    async def __send_updated_data_to_confluence(self, client: AsyncConfluence, version: int, cont_outside_table: str, table: ResultTable,
+                                                div_req_list: list[str]):
         """
-        Method reads data converted from dataframe from html file, merges this code with content 
-        outside table saved earlier and updates given Confluence page with merged code
+        Method converts table sorted by "Test Description" to html code, merges this code with content outside
+        table saved earlier and updates given Confluence page with merged code. Table is written
+        straight into the page body in memory in chunks of TABLE_CHUNK_ROWS rows
         """
-        with open('temp_html.html', 'r') as f:
-            data_html = f.read()
-        os.remove('temp_html.html')
+        with metrics.stage("render table", rows=table.rows):
+            translator = dataframe_to_html_translator(div_req_list, self.__requirements)
 
-        data_html = replace_signs_dataframe_to_html(data_html, div_req_list)
-        if DF_TABLE_CHAR in cont_outside_table:
-            data_to_confluence = cont_outside_table.replace(DF_TABLE_CHAR, data_html)
-        else:
-            data_to_confluence = cont_outside_table + data_html
+            content_before_table, _, content_after_table = cont_outside_table.partition(DF_TABLE_CHAR)
+            data_to_confluence = io.StringIO()
+            data_to_confluence.write(content_before_table)
+            table.write_html(data_to_confluence, table.sorted_rows(TABLE_HEADER["Test Description"]), translator, TABLE_CHUNK_ROWS)
+            data_to_confluence.write(content_after_table)
 
-        self.__confluence.update_page(
-            page_id=self.page_id,
-            title=self.page_title,
-            body=data_to_confluence
-        )
+            self.page_body = data_to_confluence.getvalue()
+        await update_page(client, self.url, self.page_id, self.page_title, self.page_body, version, self.page_cache)
+
+    def __save_history(self):
+        """
+        Saves results loaded to the page in the history store, test setup is saved as plain text
+        without the trailing new line, the same for results of this run and results removed from the page
+        """
+        if self.history_store is None or len(self.__history_results) == 0:
+            return
+        translator = dataframe_to_text_translator()
+        self.history_store.add_results([
+            (test_name, page_id, run_date, status, translator.translate(test_setup).strip(), tester)
+            for test_name, page_id, run_date, status, test_setup, tester in self.__history_results
+        ])
+        self.__history_results = []
 
     def get_page_body(self):
         """
         Method returns page body of given Confluence page
         """
-        space_content = self.__confluence.get_space_content(
-            space_key=self.page_space_key,
-            expand="body.storage.content",
-        )
-        for i in range(len(space_content['page']['results'])):
-            pages_id = space_content['page']['results'][i]['body']['storage']['content']['id']
-            if pages_id == self.page_id:
-                return space_content['page']['results'][i]['body']['storage']['value']
-        raise RuntimeError("Page not found")
+        return asyncio.run(fetch_page(AsyncConfluence(self.__confluence), self.url, self.page_id, self.page_cache))[0]
 
     def load_data_to_confluence(self):
         """
-        This method do all the job to export data from last created csv report to the Confluence page
+        This method do all the job to export data from last created csv report to the Confluence page.
+        If somebody else changed the page during loading, the page is downloaded and merged again
         """
-        confluence_page_body = self.get_page_body()
-        div_requirement_list = search_div_requirement(confluence_page_body)
-        content_outside_table = search_content_outside_table(confluence_page_body)
-        confluence_page_body = replace_signs_html_to_dataframe(confluence_page_body, div_requirement_list)
+        asyncio.run(self.load_data_async(AsyncConfluence(self.__confluence)))
 
-        try:
-            dfs = pd.read_html(confluence_page_body)
-            df = dfs[-1]
-            if df.shape[1] < 10:
-                content_outside_table = self.__create_table_header(content_outside_table)
-                confluence_page_body = self.get_page_body()
-                confluence_page_body = replace_signs_html_to_dataframe(confluence_page_body, div_requirement_list)
-                dfs = pd.read_html(confluence_page_body)
-        except ValueError:
-            content_outside_table = self.__create_table_header(content_outside_table)
-            confluence_page_body = self.get_page_body()
-            confluence_page_body = replace_signs_html_to_dataframe(confluence_page_body, div_requirement_list)
-            dfs = pd.read_html(confluence_page_body)
-
-        df = dfs[-1]
-        if df.shape[1] < 10:
+    async def load_data_async(self, client: AsyncConfluence):
+        """
+        Coroutine of load_data_to_confluence(), many pages can be loaded at once with one client
+        """
+        for attempt in range(MAX_CONFLICT_RETRIES + 1):
+            try:
+                await self.__sync_page(client)
+                self.loaded_tests.update(self.__merged_tests)
+                return
+            except PageVersionConflict:
+                if attempt == MAX_CONFLICT_RETRIES:
+                    raise RuntimeError("The page was changed by somebody else during every loading attempt")
+                print("\nTHE PAGE WAS CHANGED DURING LOADING, LOADING AGAIN")
+
+    async def __sync_page(self, client: AsyncConfluence):
+        """
+        Downloads the page, merges it with the csv report and saves it as the next page version
+        """
+        # User details are requested at the same time as the page
+        with metrics.stage("fetch page"):
+            (confluence_page_body, version), _ = await asyncio.gather(fetch_page(client, self.url, self.page_id, self.page_cache), self.__get_tester_name(client))
+        self.page_body = confluence_page_body
+        # Page body is scanned once, only the table with test cases is converted to dataframe
+        with metrics.stage("parse page") as stage:
+            page = parse_storage_page(confluence_page_body)
+            stage["rows"] = max(0, len(page.rows) - 1)
+        div_requirement_list = page.req_div_list
+        content_outside_table = page.content_outside_table(DF_TABLE_CHAR)
+        # Translator is built once per sync and used for every fetched page body
+        html_translator = html_to_dataframe_translator(div_requirement_list)
+
+        # New page gets empty table in memory, it is sent with the first update
+        if not page.has_test_table():
+            page = parse_storage_page(self.__create_table_header(content_outside_table))
+            content_outside_table = content_outside_table + DF_TABLE_CHAR
+            if not page.has_test_table():
+                raise RuntimeError("Cannot find table header on Confluence site")
+
+        with metrics.stage("read table") as stage:
+            table = read_test_table(html_translator.translate(page.table_html()))
+            stage["rows"] = table.rows
+        if len(table.column_names) < 10:
             raise RuntimeError("Cannot find table header on Confluence site")
-        df_html = pd.DataFrame(df)
 
-        self.__update_table_data(df_html, self.csv_df)
-        self.__send_updated_data_to_confluence(content_outside_table, div_requirement_list)
+        with metrics.stage("merge", rows=len(self.csv_df)):
+            self.__update_table_data(table, self.csv_df, div_requirement_list)
+        if not table.has_changes():
+            print("\nNO CHANGES IN THE TABLE, THE PAGE IS NOT UPDATED")
+            return
+
+        # Only changed rows are converted to html if rows of the page match the table
+        with metrics.stage("render changed rows", rows=len(table.changed_rows) + table.rows - table.existing_rows):
+            data_to_confluence = self.__splice_changed_rows(page, table, div_requirement_list)
+        if data_to_confluence is None:
+            await self.__send_updated_data_to_confluence(client, version, content_outside_table, table, div_requirement_list)
+        else:
+            self.page_body = data_to_confluence
+            await update_page(client, self.url, self.page_id, self.page_title, data_to_confluence, version, self.page_cache)
+        self.__save_history()
@@ -0,0 +1,110 @@
+import sqlite3
+from configparser import ConfigParser
+
+
+# Results moved from "Previous Results" cell of the page have no date. Table and index names differ
+# from the ones of ReportWarehouse, so both stores can use the same SQLite file
+CREATE_RESULTS_TABLE = """
+CREATE TABLE IF NOT EXISTS page_results (
+    id INTEGER PRIMARY KEY,
+    test_name TEXT NOT NULL,
+    page_id TEXT NOT NULL,
+    run_date TEXT,
+    status TEXT NOT NULL,
+    test_setup TEXT,
+    tester TEXT
+)
+"""
+CREATE_RESULTS_INDEX = "CREATE INDEX IF NOT EXISTS page_results_test_date ON page_results (test_name, run_date)"
+# Stores created before page_results kept results in table "results", it is renamed when the store is opened
+RENAME_OLD_RESULTS_TABLE = """
+DROP INDEX IF EXISTS results_test_date;
+ALTER TABLE results RENAME TO page_results;
+"""
+
+
+class HistoryStore:
+    """
+    Append only SQLite store of all test results loaded to Confluence. Every result is saved with
+    test name, page id, date (YYYY-MM-DD), status, test setup and tester. A new connection is opened
+    for every operation, so one store can be used by many threads
+    """
+    def __init__(self, path: str):
+        self.path = path
+        with self.__connect() as connection:
+            tables = {name for name, in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            if "results" in tables and "page_results" not in tables:
+                columns = {column[1] for column in connection.execute("PRAGMA table_info(results)")}
+                if "page_id" in columns:
+                    connection.executescript(RENAME_OLD_RESULTS_TABLE)
+            connection.execute(CREATE_RESULTS_TABLE)
+            connection.execute(CREATE_RESULTS_INDEX)
+
+    def __connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def add_results(self, results: list[tuple]):
+        """
+        Saves results given as tuples (test_name, page_id, run_date, status, test_setup, tester)
+        """
+        with self.__connect() as connection:
+            connection.executemany(
+                "INSERT INTO page_results (test_name, page_id, run_date, status, test_setup, tester) VALUES (?, ?, ?, ?, ?, ?)",
+                results
+            )
+
+    def get_test_names(self, page_id: str):
+        """
+        Returns set of names of tests which have any result saved for given page
+        """
+        with self.__connect() as connection:
+            rows = connection.execute("SELECT DISTINCT test_name FROM page_results WHERE page_id = ?", (page_id,)).fetchall()
+        return {row[0] for row in rows}
+
+    def get_test_history(self, test_name: str, page_id: str = None, since: str = None):
+        """
+        Returns results of given test as list of tuples (run_date, status, test_setup, tester, page_id),
+        the newest first. Results can be limited to one page and to dates since given YYYY-MM-DD date
+        """
+        query = "SELECT run_date, status, test_setup, tester, page_id FROM page_results WHERE test_name = ?"
+        params = [test_name]
+        if page_id is not None:
+            query += " AND page_id = ?"
+            params.append(page_id)
+        if since is not None:
+            query += " AND run_date >= ?"
+            params.append(since)
+        query += " ORDER BY run_date IS NULL, run_date DESC, id DESC"
+        with self.__connect() as connection:
+            return connection.execute(query, params).fetchall()
+
+    def get_trend(self, page_id: str = None, since: str = None):
+        """
+        Returns number of results of every status for every date as list of tuples
+        (run_date, status, count) sorted by date. Results without date are not counted
+        """
+        query = "SELECT run_date, status, COUNT(*) FROM page_results WHERE run_date IS NOT NULL"
+        params = []
+        if page_id is not None:
+            query += " AND page_id = ?"
+            params.append(page_id)
+        if since is not None:
+            query += " AND run_date >= ?"
+            params.append(since)
+        query += " GROUP BY run_date, status ORDER BY run_date, status"
+        with self.__connect() as connection:
+            return connection.execute(query, params).fetchall()
+
+
+def read_history_config(test_config: ConfigParser):
+    """
+    Returns limit of results in "Previous Results" column and HistoryStore from [history] section
+    of the ini file. Both are None if they are not given
+    """
+    previous_results_limit = None
+    history_store = None
+    if test_config.has_option("history", "previous_results"):
+        previous_results_limit = max(0, test_config.getint("history", "previous_results"))
+    if test_config.has_option("history", "database"):
+        history_store = HistoryStore(test_config["history"]["database"])
+    return previous_results_limit, history_store
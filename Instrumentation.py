@@ -0,0 +1,174 @@
+import os
+import json
+import time
+import threading
+import tracemalloc
+from datetime import datetime
+from contextlib import contextmanager
+
+
+# Metrics of every run are saved there as <date> <time>.json
+METRICS_DIR = os.path.join("Test_data", "metrics")
+
+
+class Metrics:
+    """
+    Collects wall time, peak memory and number of rows of pipeline stages and number of requests,
+    bytes sent and received and time of every Confluence call. Nothing is collected until enable()
+    is called, then memory allocated by Python is traced. Peak memory of a stage is the highest
+    traced memory while the stage was running, stages running at the same time share peaks
+    """
+    def __init__(self):
+        self.enabled = False
+        self.started = None
+        self.stages = []
+        self.calls = []
+        self.__lock = threading.Lock()
+        self.__active_stages = []
+        # Confluence call running in the current thread, response hook adds bytes to it
+        self.__local = threading.local()
+
+    def enable(self, trace_memory: bool = True):
+        """
+        Starts collecting metrics. Tracing memory makes Python code slower, so it can be turned off
+        when only times are compared, then peak memory of every stage is 0
+        """
+        self.enabled = True
+        self.started = datetime.now()
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def reset(self):
+        """
+        Removes all collected stages and calls, metrics collected from now on are saved as a new report
+        """
+        with self.__lock:
+            self.stages = []
+            self.calls = []
+            if self.enabled:
+                self.started = datetime.now()
+
+    def __update_peaks(self):
+        """
+        Gives peak memory since the last update to all running stages, must be called with the lock
+        """
+        if not tracemalloc.is_tracing():
+            return
+        peak = tracemalloc.get_traced_memory()[1]
+        for stage in self.__active_stages:
+            stage["peak_memory"] = max(stage["peak_memory"], peak)
+        tracemalloc.reset_peak()
+
+    @contextmanager
+    def stage(self, name: str, rows: int = None):
+        """
+        Measures the code run in with block as stage with given name. Yields dictionary of the stage,
+        number of rows can be set in it as stage["rows"] when it is known at the end of the stage
+        """
+        if not self.enabled:
+            yield {}
+            return
+        stage = {"name": name, "thread": threading.current_thread().name, "rows": rows, "peak_memory": 0}
+        with self.__lock:
+            self.__update_peaks()
+            self.__active_stages.append(stage)
+        start = time.perf_counter()
+        try:
+            yield stage
+        finally:
+            stage["seconds"] = time.perf_counter() - start
+            with self.__lock:
+                self.__update_peaks()
+                self.__active_stages.remove(stage)
+                self.stages.append(stage)
+
+    @contextmanager
+    def call(self, name: str):
+        """
+        Measures Confluence call with given name run in with block. Requests sent by sessions
+        with installed response hook are counted to this call
+        """
+        if not self.enabled:
+            yield {}
+            return
+        call = {"name": name, "requests": 0, "sent": 0, "received": 0}
+        self.__local.call = call
+        start = time.perf_counter()
+        try:
+            yield call
+        finally:
+            call["seconds"] = time.perf_counter() - start
+            self.__local.call = None
+            with self.__lock:
+                self.calls.append(call)
+
+    def __response_hook(self, response, *args, **kwargs):
+        call = getattr(self.__local, "call", None)
+        if call is None:
+            return
+        body = response.request.body
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        call["requests"] += 1
+        call["sent"] += len(body) if body else 0
+        call["received"] += len(response.content)
+
+    def install(self, session):
+        """
+        Adds response hook which counts bytes of every request to requests session
+        """
+        if self.enabled and self.__response_hook not in session.hooks["response"]:
+            session.hooks["response"].append(self.__response_hook)
+
+    def summary(self):
+        """
+        Returns totals of stages and calls with the same name as dictionary
+        """
+        stages = {}
+        for stage in self.stages:
+            total = stages.setdefault(stage["name"], {"count": 0, "seconds": 0.0, "peak_memory": 0, "rows": 0})
+            total["count"] += 1
+            total["seconds"] += stage["seconds"]
+            total["peak_memory"] = max(total["peak_memory"], stage["peak_memory"])
+            total["rows"] += stage["rows"] or 0
+        calls = {}
+        for call in self.calls:
+            total = calls.setdefault(call["name"], {"count": 0, "seconds": 0.0, "requests": 0, "sent": 0, "received": 0})
+            total["count"] += 1
+            for key in ["seconds", "requests", "sent", "received"]:
+                total[key] += call[key]
+        return {"stages": stages, "calls": calls}
+
+    def write_report(self, path: str = None):
+        """
+        Saves all collected metrics as JSON file and returns its path. By default the file is saved
+        in METRICS_DIR and named by the time when metrics were enabled
+        """
+        if path is None:
+            if not os.path.exists(METRICS_DIR):
+                os.makedirs(METRICS_DIR)
+            path = os.path.join(METRICS_DIR, self.started.strftime("%Y-%m-%d %H-%M-%S") + ".json")
+        with self.__lock:
+            report = {
+                "started": self.started.isoformat(timespec="seconds"),
+                "finished": datetime.now().isoformat(timespec="seconds"),
+                "summary": self.summary(),
+                "stages": self.stages,
+                "calls": self.calls
+            }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4)
+        return path
+
+    def print_summary(self):
+        summary = self.summary()
+        print("\nSTAGE TIMES:")
+        for name, total in summary["stages"].items():
+            print(f"{name}: {total['seconds']:.2f} s, peak memory {total['peak_memory'] / 2**20:.1f} MB, {total['rows']} rows")
+        print("CONFLUENCE CALLS:")
+        for name, total in summary["calls"].items():
+            print(f"{name}: {total['count']} calls, {total['seconds']:.2f} s, sent {total['sent']} B, received {total['received']} B")
+
+
+# Metrics of the whole run, shared by CreateReport, Dataloader and Confluence clients
+metrics = Metrics()
@@ -0,0 +1,158 @@
+import re
+
+
+# Tags which are needed to find the test cases table, requirement macros and hidden test names
+TAG_PATTERN = re.compile(r'<(/?)(table|tr|th|td|div)\b[^>]*>')
+HIDDEN_DIV = '<div style="display: none;">'
+# Table with test cases has at least that many headers in the first row
+TEST_TABLE_HEADERS = 10
+
+
+class StoragePage:
+    """
+    Structure of Confluence page body found by parse_storage_page(). All positions are
+    indexes in the page body, the test cases table is the last top level table on the page
+    if its first row has at least TEST_TABLE_HEADERS headers
+    """
+    def __init__(self, body: str):
+        self.body = body
+        self.table_start = -1
+        self.table_end = -1
+        self.header_count = 0
+        # (start, end) of every <tr> of the test cases table, header row included
+        self.rows = []
+        # Hidden test name of every row in self.rows, None if row has no hidden test name
+        self.row_names = []
+        self.req_div_list = []
+
+    def has_test_table(self):
+        return self.table_start != -1 and self.header_count >= TEST_TABLE_HEADERS
+
+    def table_html(self):
+        """
+        Returns html code of the test cases table
+        """
+        if not self.has_test_table():
+            return ''
+        return self.body[self.table_start:self.table_end]
+
+    def content_outside_table(self, table_char: str):
+        """
+        Returns page body with the test cases table replaced by table_char,
+        if there is no test cases table, the page body is returned
+        """
+        if not self.has_test_table():
+            return self.body
+        return self.body[:self.table_start] + table_char + self.body[self.table_end:]
+
+    def row_html(self, row: int):
+        start, end = self.rows[row]
+        return self.body[start:end]
+
+
+def parse_storage_page(body: str):
+    """
+    Walks once through Confluence page body in storage format and returns StoragePage with
+    position of the test cases table and its rows, hidden test names of the rows and list
+    of requirement divs. Requirement div starts with "<div" and ends with the first "</div>"
+    after it, the same way as SignTranslator finds div blocks
+    """
+    page = StoragePage(body)
+
+    table_depth = 0
+    table_start = -1
+    rows = []
+    row_names = []
+    header_count = 0
+    row_start = -1
+    row_name = None
+    first_row = True
+
+    open_divs = []
+    hidden_div_end = -1
+
+    for match in TAG_PATTERN.finditer(body):
+        closing, tag = match.group(1), match.group(2)
+        start, end = match.span()
+
+        if tag == 'div':
+            if not closing:
+                open_divs.append(start)
+                if body.startswith(HIDDEN_DIV, start):
+                    hidden_div_end = end
+                continue
+            # The first </div> closes every div opened before it
+            for div_start in open_divs:
+                div = body[div_start:end]
+                if "requirement" in div:
+                    page.req_div_list.append(div)
+            open_divs = []
+            if hidden_div_end != -1:
+                if table_depth == 1 and row_start != -1 and row_name is None:
+                    row_name = body[hidden_div_end:start]
+                hidden_div_end = -1
+
+        elif tag == 'table':
+            if not closing:
+                if table_depth == 0:
+                    table_start = start
+                    rows = []
+                    row_names = []
+                    header_count = 0
+                    first_row = True
+                table_depth += 1
+            elif table_depth > 0:
+                table_depth -= 1
+                if table_depth == 0:
+                    page.table_start = table_start
+                    page.table_end = end
+                    page.header_count = header_count
+                    page.rows = rows
+                    page.row_names = row_names
+
+        elif table_depth == 1:
+            if tag == 'tr':
+                if not closing:
+                    row_start = start
+                    row_name = None
+                elif row_start != -1:
+                    rows.append((row_start, end))
+                    row_names.append(row_name)
+                    row_start = -1
+                    first_row = False
+            elif tag == 'th' and not closing and first_row:
+                header_count += 1
+
+    return page
+
+
+def find_table(body: str, first_header: str):
+    """
+    Returns (start, end) of the last top level table on the page which first header is first_header,
+    (-1, -1) if there is no such table
+    """
+    found = (-1, -1)
+    table_depth = 0
+    table_start = -1
+    header_start = -1
+    first_header_found = None
+
+    for match in TAG_PATTERN.finditer(body):
+        closing, tag = match.group(1), match.group(2)
+        start, end = match.span()
+        if tag == 'table':
+            if not closing:
+                if table_depth == 0:
+                    table_start = start
+                    first_header_found = None
+                table_depth += 1
+            elif table_depth > 0:
+                table_depth -= 1
+                if table_depth == 0 and first_header_found == first_header:
+                    found = (table_start, end)
+        elif tag == 'th' and table_depth == 1 and first_header_found is None:
+            if not closing:
+                header_start = end
+            elif header_start != -1:
+                first_header_found = body[header_start:start].strip()
+    return found
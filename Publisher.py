@@ -0,0 +1,177 @@
+import time
+from configparser import ConfigParser
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+from atlassian import Confluence
+
+from .AsyncConfluence import DEFAULT_CONCURRENCY
+from .ConfluenceDataloader import Dataloader, get_credentials
+from .HistoryStore import HistoryStore
+from .ShardedLoader import ShardedLoader, DEFAULT_SHARD_ROWS
+
+
+# Number of pages loaded at the same time if it is not given in [publish] section
+DEFAULT_WORKERS = 4
+PAGE_KEYS = ["url", "page_id", "page_title", "page_space_key"]
+
+
+def read_page_configs(test_config: ConfigParser):
+    """
+    Returns list of dictionaries with url, page_id, page_title and page_space_key of every page
+    section in the ini file. Page sections are [page] and [page.NAME], e.g. [page.power_supply]
+    """
+    pages = []
+    for section in test_config.sections():
+        if section != "page" and not section.startswith("page."):
+            continue
+        try:
+            pages.append({key: test_config[section][key] for key in PAGE_KEYS})
+        except KeyError as e:
+            raise RuntimeError(f"Missing {e} in [{section}] section of the configuration file")
+    return pages
+
+
+def read_publish_workers(test_config: ConfigParser):
+    """
+    Returns number of workers from [publish] section of the ini file
+    """
+    if not test_config.has_option("publish", "workers"):
+        return DEFAULT_WORKERS
+    return max(1, test_config.getint("publish", "workers"))
+
+
+class Publisher:
+    """
+    To load last created csv report to many Confluence pages at once use publish() method.
+    Credentials are asked for only once (never if headless is True) and all pages share one
+    authenticated session with connection pool. If shard_by is given, tests are loaded to child pages
+    of every page by ShardedLoader. Pages are fetched, merged and updated by at most workers threads at once.
+    Tests loaded to every page are remembered, so results loaded by the next publish() replace them and
+    are not moved to "Previous Results" again, e.g. when batches of results are loaded while tests are running
+    """
+    def __init__(self, pages: list[dict], csv_folder_name: str, csv_file_name: str, description_only: bool = False,
+                 workers: int = DEFAULT_WORKERS, login: str = None, password: str = None, previous_results_limit: int = None,
+                 history_store: HistoryStore = None, headless: bool = False, shard_by: str = None, shard_rows: int = DEFAULT_SHARD_ROWS):
+        self.pages = pages
+        self.csv_folder_name = csv_folder_name
+        self.csv_file_name = csv_file_name
+        self.description_only = description_only
+        self.workers = workers
+        self.previous_results_limit = previous_results_limit
+        self.history_store = history_store
+        self.shard_by = shard_by
+        self.shard_rows = shard_rows
+        # Results loaded instead of the last created csv report, see publish()
+        self.__csv_data_frame = None
+        # Tests loaded to every page {(url, page id): set of test names}, a page gets tests only if it was loaded without errors
+        self.__loaded_tests = {}
+        self.__clients = {}
+
+        login, password = get_credentials(login, password, headless)
+        self.__login = login
+        self.__password = password
+
+        # Every worker sends up to DEFAULT_CONCURRENCY requests at once, pool keeps connection for each of them
+        self.__session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers * DEFAULT_CONCURRENCY)
+        self.__session.mount("http://", adapter)
+        self.__session.mount("https://", adapter)
+
+    def get_client(self, url: str):
+        """
+        Returns Confluence client for given url, clients of all urls use the same session
+        """
+        if url not in self.__clients:
+            self.__clients[url] = Confluence(
+                url=url,
+                username=self.__login,
+                password=self.__password,
+                session=self.__session
+            )
+        return self.__clients[url]
+
+    def __publish_page(self, page: dict):
+        """
+        Loads report to one page and returns time of loading in seconds
+        """
+        start = time.perf_counter()
+        if self.shard_by is not None:
+            loader = ShardedLoader(
+                url=page["url"],
+                page_id=page["page_id"],
+                page_title=page["page_title"],
+                page_space_key=page["page_space_key"],
+                csv_folder_name=self.csv_folder_name,
+                csv_file_name=self.csv_file_name,
+                description_only=self.description_only,
+                shard_by=self.shard_by,
+                shard_rows=self.shard_rows,
+                confluence=self.get_client(page["url"]),
+                login=self.__login,
+                previous_results_limit=self.previous_results_limit,
+                history_store=self.history_store,
+                csv_data_frame=self.__csv_data_frame,
+                loaded_tests=self.__loaded_tests[(page["url"], page["page_id"])]
+            )
+            loader.load_data_to_confluence()
+            return time.perf_counter() - start
+
+        d = Dataloader(
+            url=page["url"],
+            page_id=page["page_id"],
+            page_title=page["page_title"],
+            page_space_key=page["page_space_key"],
+            csv_folder_name=self.csv_folder_name,
+            csv_file_name=self.csv_file_name,
+            description_only=self.description_only,
+            confluence=self.get_client(page["url"]),
+            login=self.__login,
+            previous_results_limit=self.previous_results_limit,
+            history_store=self.history_store,
+            csv_data_frame=self.__csv_data_frame,
+            loaded_tests=self.__loaded_tests[(page["url"], page["page_id"])]
+        )
+        d.load_data_to_confluence()
+        return time.perf_counter() - start
+
+    def publish(self, csv_data_frame=None):
+        """
+        Loads report to all pages and prints loading time of every page. Returns dictionary
+        {page title: time in seconds}, if loading of any page failed RuntimeError is raised
+        after all other pages are loaded. csv_data_frame is given to every Dataloader, e.g. to load
+        batches of results while tests are running. If loading of a page failed, the same results can be
+        published again, pages which were loaded replace them and do not add them to "Previous Results"
+        """
+        self.__csv_data_frame = csv_data_frame
+        # Clients and sets of loaded tests are created before starting threads, so every url has only one client
+        for page in self.pages:
+            self.get_client(page["url"])
+            self.__loaded_tests.setdefault((page["url"], page["page_id"]), set())
+
+        timings = {}
+        errors = {}
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(self.__publish_page, page): page for page in self.pages}
+            for future in as_completed(futures):
+                title = futures[future]["page_title"]
+                try:
+                    timings[title] = future.result()
+                except Exception as e:
+                    errors[title] = e
+        total = time.perf_counter() - start
+
+        print("\nPAGE LOADING TIMES:")
+        for page in self.pages:
+            title = page["page_title"]
+            if title in timings:
+                print(f"{title}: {timings[title]:.2f} s")
+            else:
+                print(f"{title}: FAILED ({errors[title]})")
+        print(f"TOTAL: {total:.2f} s")
+
+        if errors:
+            raise RuntimeError(f"Loading report failed for pages: {', '.join(errors.keys())}")
+        return timings
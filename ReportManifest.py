@@ -0,0 +1,114 @@
+import os
+import csv
+import json
+import hashlib
+
+from .ReportWarehouse import split_report_file_name
+
+
+# Manifest is kept in every report directory next to csv reports
+MANIFEST_FILE_NAME = "manifest.json"
+# Size of file parts read at once while computing checksum of the report
+CHECKSUM_CHUNK_SIZE = 1024 * 1024
+
+
+def get_report_checksum(path: str):
+    """
+    Returns SHA-256 checksum of the file as hex string
+    """
+    checksum = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHECKSUM_CHUNK_SIZE), b""):
+            checksum.update(chunk)
+    return checksum.hexdigest()
+
+
+def count_report_rows(path: str):
+    """
+    Returns number of tests in csv report, header is not counted
+    """
+    with open(path, "r", newline="") as f:
+        return max(0, sum(1 for _ in csv.reader(f)) - 1)
+
+
+def create_report_entry(path: str, timestamp: str, rows: int = None):
+    """
+    Returns manifest entry of csv report with file name, timestamp (YYYY-MM-DD HH:MM:SS),
+    number of rows and checksum. Rows are counted if they are not given
+    """
+    return {
+        "file": os.path.basename(path),
+        "timestamp": timestamp,
+        "rows": count_report_rows(path) if rows is None else rows,
+        "sha256": get_report_checksum(path)
+    }
+
+
+def read_manifest(folder_path: str):
+    """
+    Returns manifest of the report directory as dictionary {report name: entry of the latest report},
+    empty dictionary if there is no manifest or it cannot be read
+    """
+    path = os.path.join(folder_path, MANIFEST_FILE_NAME)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)["reports"]
+    except (ValueError, KeyError):
+        return {}
+
+
+def write_manifest(folder_path: str, manifest: dict):
+    """
+    Saves manifest in the report directory
+    """
+    path = os.path.join(folder_path, MANIFEST_FILE_NAME)
+    # Manifest is written to temporary file first so interrupted run cannot leave broken manifest
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"reports": manifest}, f, indent=4)
+    os.replace(path + ".tmp", path)
+
+
+def add_report_to_manifest(folder_path: str, report_name: str, path_to_csv: str, timestamp: str, rows: int = None):
+    """
+    Saves new report as the latest report with given name, unless the manifest already has a newer one
+    """
+    manifest = read_manifest(folder_path)
+    latest = manifest.get(report_name)
+    if latest is not None and latest["timestamp"] > timestamp:
+        return
+    manifest[report_name] = create_report_entry(path_to_csv, timestamp, rows)
+    write_manifest(folder_path, manifest)
+
+
+def get_latest_report(folder_path: str, report_name: str):
+    """
+    Returns manifest entry of the latest report with given name, None if the manifest has no such
+    report or its file does not exist anymore
+    """
+    latest = read_manifest(folder_path).get(report_name)
+    if latest is None or not os.path.exists(os.path.join(folder_path, latest["file"])):
+        return None
+    return latest
+
+
+def rebuild_manifest(folder_path: str):
+    """
+    Creates manifest again from all csv reports in the report directory and returns it. The latest report
+    is chosen by date and time in its file name, or by time of the last modification if there is no date
+    """
+    manifest = {}
+    with os.scandir(folder_path) as entries:
+        for entry in entries:
+            if not entry.is_file() or not entry.name.endswith(".csv"):
+                continue
+            report_name, report_date, report_time = split_report_file_name(entry.name, entry.stat().st_mtime)
+            timestamp = report_date + " " + report_time
+            latest = manifest.get(report_name)
+            if latest is None or (latest[0], latest[1]) < (timestamp, entry.name):
+                manifest[report_name] = (timestamp, entry.name, entry.path)
+
+    manifest = {report_name: create_report_entry(path, timestamp) for report_name, (timestamp, _, path) in manifest.items()}
+    write_manifest(folder_path, manifest)
+    return manifest
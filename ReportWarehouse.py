@@ -0,0 +1,239 @@
+import os
+import csv
+import sqlite3
+from datetime import datetime
+
+
+# SQLite file with results of all ingested csv reports
+WAREHOUSE_PATH = os.path.join("Test_data", "reports.db")
+# Csv report name starts with date and time of its generation, see CreateReport.generate_report()
+REPORT_DATE_FORMAT = "%Y-%m-%d %H-%M-%S"
+REPORT_DATE_LEN = len("YYYY-MM-DD HH-MM-SS")
+# Date and report name are kept in every result row and indexed, so queries for one test,
+# one report name or range of dates read only their part of the table. Table and index names differ
+# from the ones of HistoryStore, so both stores can use the same SQLite file
+CREATE_TABLES = """
+CREATE TABLE IF NOT EXISTS reports (
+    id INTEGER PRIMARY KEY,
+    folder_name TEXT NOT NULL,
+    file_name TEXT NOT NULL,
+    report_name TEXT NOT NULL,
+    report_date TEXT NOT NULL,
+    report_time TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    row_count INTEGER NOT NULL,
+    UNIQUE (folder_name, file_name)
+);
+CREATE TABLE IF NOT EXISTS report_results (
+    report_id INTEGER NOT NULL REFERENCES reports (id),
+    report_name TEXT NOT NULL,
+    report_date TEXT NOT NULL,
+    report_time TEXT NOT NULL,
+    test_name TEXT NOT NULL,
+    status TEXT NOT NULL,
+    duration_ms INTEGER
+);
+CREATE INDEX IF NOT EXISTS report_results_test_date ON report_results (test_name, report_date);
+CREATE INDEX IF NOT EXISTS report_results_report_date ON report_results (report_name, report_date);
+CREATE INDEX IF NOT EXISTS report_results_report_id ON report_results (report_id);
+"""
+# Warehouses created before report_results kept results in table "results", it is renamed when the warehouse is opened
+RENAME_OLD_RESULTS_TABLE = """
+DROP INDEX IF EXISTS results_test_date;
+DROP INDEX IF EXISTS results_report_date;
+DROP INDEX IF EXISTS results_report_id;
+ALTER TABLE results RENAME TO report_results;
+"""
+# Status changes of one test are counted between its results in one report (e.g. nightly) ordered by report date,
+# the same test run by different reports is counted separately
+FLAKY_TESTS_QUERY = """
+SELECT report_name, test_name, COUNT(*) AS runs, SUM(status = 'failed') AS failures, SUM(changed) AS changes FROM (
+    SELECT report_name, test_name, status,
+        CASE WHEN LAG(status) OVER (PARTITION BY report_name, test_name ORDER BY report_date, report_time, report_id) != status THEN 1 ELSE 0 END AS changed
+    FROM report_results WHERE status IN ('passed', 'failed'){conditions}
+)
+GROUP BY report_name, test_name HAVING failures > 0 AND failures < runs
+ORDER BY changes DESC, failures DESC, report_name, test_name
+LIMIT ?
+"""
+
+
+def split_report_file_name(file_name: str, mtime: float):
+    """
+    Returns report name, date (YYYY-MM-DD) and time (HH:MM:SS) of csv report with given file name.
+    If file name does not start with date and time, date and time of the last file modification are returned
+    """
+    try:
+        report_datetime = datetime.strptime(file_name[:REPORT_DATE_LEN], REPORT_DATE_FORMAT)
+        report_name = file_name[REPORT_DATE_LEN:-len(".csv")].strip()
+    except ValueError:
+        report_datetime = datetime.fromtimestamp(mtime)
+        report_name = file_name[:-len(".csv")]
+    return report_name, report_datetime.strftime("%Y-%m-%d"), report_datetime.strftime("%H:%M:%S")
+
+
+def read_report_results(path: str):
+    """
+    Yields (test name, status, duration in ms) of every test in csv report. Duration can be written
+    as float (e.g. 1304.0), it is rounded down to whole milliseconds
+    """
+    with open(path, "r", newline="") as f:
+        for row in csv.DictReader(f):
+            duration = row.get("Duration in ms")
+            yield row["Name"], row["Status"], int(float(duration)) if duration else None
+
+
+class ReportWarehouse:
+    """
+    SQLite store with results of all csv reports generated by CreateReport. Use ingest_folder()
+    to load new reports, files which were already loaded and did not change are skipped.
+    Results can be queried by get_test_history(), get_failing_since() and get_flaky_tests()
+    """
+    def __init__(self, path: str = WAREHOUSE_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with self.__connect() as connection:
+            tables = {name for name, in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            if "results" in tables and "report_results" not in tables:
+                columns = {column[1] for column in connection.execute("PRAGMA table_info(results)")}
+                if "report_id" in columns:
+                    connection.executescript(RENAME_OLD_RESULTS_TABLE)
+            connection.executescript(CREATE_TABLES)
+
+    def __connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def ingest_folder(self, folder_name: str):
+        """
+        Loads all csv reports from Test_data/folder_name which are not in the warehouse yet
+        or changed since they were loaded. Reports which cannot be read are skipped, so they are
+        tried again by the next ingest. Returns number of loaded reports
+        """
+        folder_path = os.path.join("Test_data", folder_name)
+        with self.__connect() as connection:
+            ingested = {
+                file_name: (report_id, size, mtime)
+                for report_id, file_name, size, mtime in connection.execute(
+                    "SELECT id, file_name, size, mtime FROM reports WHERE folder_name = ?", (folder_name,)
+                )
+            }
+
+        loaded = 0
+        with os.scandir(folder_path) as entries:
+            for entry in entries:
+                if not entry.is_file() or not entry.name.endswith(".csv"):
+                    continue
+                stat = entry.stat()
+                report = ingested.get(entry.name)
+                if report is not None and report[1:] == (stat.st_size, stat.st_mtime):
+                    continue
+                try:
+                    self.__ingest_report(folder_name, entry.path, entry.name, stat, report[0] if report else None)
+                except KeyError as e:
+                    print(f"\nREPORT {entry.path} SKIPPED, MISSING COLUMN {e}")
+                    continue
+                except (ValueError, csv.Error, OSError) as e:
+                    print(f"\nREPORT {entry.path} SKIPPED ({e})")
+                    continue
+                loaded += 1
+        return loaded
+
+    def __ingest_report(self, folder_name: str, path: str, file_name: str, stat: os.stat_result, old_report_id: int = None):
+        """
+        Loads one csv report in one transaction, so interrupted ingest never leaves half of the report
+        """
+        report_name, report_date, report_time = split_report_file_name(file_name, stat.st_mtime)
+        with self.__connect() as connection:
+            if old_report_id is not None:
+                connection.execute("DELETE FROM report_results WHERE report_id = ?", (old_report_id,))
+                connection.execute("DELETE FROM reports WHERE id = ?", (old_report_id,))
+            cursor = connection.execute(
+                "INSERT INTO reports (folder_name, file_name, report_name, report_date, report_time, size, mtime, row_count) VALUES (?, ?, ?, ?, ?, ?, ?, 0)",
+                (folder_name, file_name, report_name, report_date, report_time, stat.st_size, stat.st_mtime)
+            )
+            report_id = cursor.lastrowid
+            cursor = connection.executemany(
+                "INSERT INTO report_results (report_id, report_name, report_date, report_time, test_name, status, duration_ms) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                ((report_id, report_name, report_date, report_time, name, status, duration) for name, status, duration in read_report_results(path))
+            )
+            connection.execute("UPDATE reports SET row_count = ? WHERE id = ?", (cursor.rowcount, report_id))
+
+    def get_test_history(self, test_name: str, report_name: str = None, since: str = None):
+        """
+        Returns results of given test as list of tuples (report_date, report_time, report_name, status, duration_ms),
+        the oldest first. Results can be limited to one report name and to dates since given YYYY-MM-DD date
+        """
+        query = "SELECT report_date, report_time, report_name, status, duration_ms FROM report_results WHERE test_name = ?"
+        params = [test_name]
+        if report_name is not None:
+            query += " AND report_name = ?"
+            params.append(report_name)
+        if since is not None:
+            query += " AND report_date >= ?"
+            params.append(since)
+        query += " ORDER BY report_date, report_time, report_id"
+        with self.__connect() as connection:
+            return connection.execute(query, params).fetchall()
+
+    def get_failing_since(self, test_name: str, report_name: str = None):
+        """
+        Returns (report_date, report_time) of the first failure after the last pass of given test,
+        None if the last result of the test is not a failure
+        """
+        failing_since = None
+        for report_date, report_time, _, status, _ in self.get_test_history(test_name, report_name):
+            if status == "failed":
+                if failing_since is None:
+                    failing_since = (report_date, report_time)
+            elif status == "passed":
+                failing_since = None
+        return failing_since
+
+    def get_flaky_tests(self, report_name: str = None, since: str = None, limit: int = 20):
+        """
+        Returns tests which both passed and failed in one report as list of tuples (report_name, test_name, runs,
+        failures, status changes), tests which changed status most times first
+        """
+        conditions = ""
+        params = []
+        if report_name is not None:
+            conditions += " AND report_name = ?"
+            params.append(report_name)
+        if since is not None:
+            conditions += " AND report_date >= ?"
+            params.append(since)
+        params.append(limit)
+        with self.__connect() as connection:
+            return connection.execute(FLAKY_TESTS_QUERY.format(conditions=conditions), params).fetchall()
+
+
+def print_test_history(warehouse: ReportWarehouse, test_name: str, since: str = None):
+    """
+    Prints all results of given test and date since which the test is failing
+    """
+    print(f"\nHISTORY OF THE TEST:\n{test_name}")
+    history = warehouse.get_test_history(test_name, since=since)
+    if len(history) == 0:
+        print("NO RESULTS FOUND")
+        return
+    for report_date, report_time, report_name, status, duration in history:
+        print(f"{report_date} {report_time} {report_name}: {status} ({duration} ms)")
+    failing_since = warehouse.get_failing_since(test_name)
+    if failing_since is not None:
+        print(f"FAILING SINCE: {failing_since[0]} {failing_since[1]}")
+
+
+def print_flaky_tests(warehouse: ReportWarehouse, since: str = None, limit: int = 20):
+    """
+    Prints the flakiest tests with number of their runs, failures and status changes
+    """
+    print("\nTHE FLAKIEST TESTS:")
+    flaky_tests = warehouse.get_flaky_tests(since=since, limit=limit)
+    if len(flaky_tests) == 0:
+        print("NO FLAKY TESTS FOUND")
+        return
+    for report_name, test_name, runs, failures, changes in flaky_tests:
+        print(f"{report_name} {test_name}: {runs} runs, {failures} failures, {changes} status changes")
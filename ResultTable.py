@@ -0,0 +1,209 @@
+import re
+import html
+from array import array
+
+
+# Tags which split the table into rows and cells, all other tags are removed from the cell text
+CELL_TAG_PATTERN = re.compile(r'<(/?)(table|tr|th|td)\b[^>]*>')
+TAG_PATTERN = re.compile(r'<[^>]*>')
+# Whitespace in the cell text is replaced the same way as pandas.read_html replaces it
+WHITESPACE_PATTERN = re.compile(r'[\r\n]+|\s{2,}')
+# Characters are escaped in the cell the same way as DataFrame.to_html escapes them, "&" is escaped first
+CELL_ESCAPES = [("\t", "\\t"), ("\r", "\\r"), ("\n", "\\n"), ("&", "&amp;"), ("<", "&lt;"), (">", "&gt;")]
+# Empty cells are written as this text, the same as NaN values of dataframe
+MISSING_VALUE = "NaN"
+TABLE_START = '<table border="1" class="dataframe">\n  <thead>\n    <tr style="text-align: right;">\n'
+TABLE_BODY_START = '    </tr>\n  </thead>\n  <tbody>\n'
+TABLE_END = '  </tbody>\n</table>'
+
+
+def escape_cell(value):
+    """
+    Returns html code of the cell value, None is written as MISSING_VALUE
+    """
+    if value is None:
+        return MISSING_VALUE
+    text = str(value)
+    for char, escaped_char in CELL_ESCAPES:
+        if char in text:
+            text = text.replace(char, escaped_char)
+    return text.strip()
+
+
+def cell_text(cell_html: str):
+    """
+    Returns text of the cell without tags, None if the cell is empty
+    """
+    text = TAG_PATTERN.sub("", cell_html) if "<" in cell_html else cell_html
+    if "&" in text:
+        text = html.unescape(text)
+    text = WHITESPACE_PATTERN.sub(" ", text.strip())
+    return text if text != "" else None
+
+
+class CategoryColumn:
+    """
+    Column of the table kept as array of codes of its values, every different value
+    is kept in memory only once. Used for columns with few different values
+    """
+    __slots__ = ("codes", "categories", "category_codes")
+
+    def __init__(self):
+        self.codes = array("I")
+        self.categories = []
+        self.category_codes = {}
+
+    def __get_code(self, value):
+        code = self.category_codes.get(value)
+        if code is None:
+            code = len(self.categories)
+            self.categories.append(value)
+            self.category_codes[value] = code
+        return code
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, row: int):
+        return self.categories[self.codes[row]]
+
+    def __setitem__(self, row: int, value):
+        self.codes[row] = self.__get_code(value)
+
+    def __iter__(self):
+        categories = self.categories
+        return (categories[code] for code in self.codes)
+
+    def append(self, value):
+        self.codes.append(self.__get_code(value))
+
+
+class ResultTable:
+    """
+    Test cases table of the page kept by columns, columns named in category_columns are kept as
+    CategoryColumn. Empty cells are None. Rows read from the page are added by load_row(), then rows
+    changed by set() and rows added by add_row() are tracked, so only they have to be written again.
+    Html code is written the same way as DataFrame.to_html(index=False) writes it
+    """
+    def __init__(self, column_names: list[str], category_columns: list[str] = None):
+        category_columns = category_columns if category_columns is not None else []
+        self.column_names = list(column_names)
+        self.columns = {name: CategoryColumn() if name in category_columns else [] for name in self.column_names}
+        self.existing_rows = 0
+        self.rows = 0
+        # Existing rows in which at least one cell got different value
+        self.changed_rows = set()
+
+    def load_row(self, values: list):
+        """
+        Adds row read from the page, it is not a change of the table
+        """
+        for column, value in zip(self.columns.values(), values):
+            column.append(value)
+        self.existing_rows += 1
+        self.rows += 1
+
+    def get(self, row: int, column: str):
+        return self.columns[column][row]
+
+    def set(self, row: int, column: str, value):
+        values = self.columns[column]
+        if row < self.existing_rows and values[row] != value:
+            self.changed_rows.add(row)
+        values[row] = value
+
+    def add_row(self):
+        """
+        Add empty row at the end of the table and return its position
+        """
+        for values in self.columns.values():
+            values.append(None)
+        self.rows += 1
+        return self.rows - 1
+
+    def has_changes(self):
+        return len(self.changed_rows) > 0 or self.rows > self.existing_rows
+
+    def column_values(self, column: str):
+        return list(self.columns[column])
+
+    def sorted_rows(self, column: str):
+        """
+        Returns positions of rows sorted by given column, rows with empty cell are the last ones
+        """
+        values = self.column_values(column)
+        filled_rows = sorted((row for row in range(self.rows) if values[row] is not None), key=values.__getitem__)
+        return filled_rows + [row for row in range(self.rows) if values[row] is None]
+
+    def row_html(self, row: int):
+        """
+        Returns html code of the row from <tr> to </tr>
+        """
+        cells = "".join("      <td>" + escape_cell(values[row]) + "</td>\n" for values in self.columns.values())
+        return "<tr>\n" + cells + "    </tr>"
+
+    def write_html(self, out, rows: list[int], translator, chunk_rows: int):
+        """
+        Writes html code of the table with given rows in given order into out. Rows are translated
+        by translator in chunks of chunk_rows rows, so html code of the whole table is never kept as one string
+        """
+        out.write(TABLE_START)
+        for name in self.column_names:
+            out.write("      <th>" + escape_cell(name) + "</th>\n")
+        out.write(TABLE_BODY_START)
+        for chunk_start in range(0, len(rows), chunk_rows):
+            chunk = "".join("    " + self.row_html(row) + "\n" for row in rows[chunk_start:chunk_start + chunk_rows])
+            out.write(translator.translate(chunk))
+        out.write(TABLE_END)
+
+
+def read_table_html(table_html: str, category_columns: list[str] = None):
+    """
+    Returns ResultTable with text of every cell of the table, the first row is the header. Text of cells
+    is the same as pandas.read_html gives, but numbers are not converted and kept as text. Returns None if
+    the table cannot be read that simply (cells spanning more rows or columns, comments, more header rows
+    or rows with different number of cells), then the table has to be read by pandas.read_html
+    """
+    if "<!" in table_html or "colspan" in table_html or "rowspan" in table_html:
+        return None
+
+    table = None
+    cells = None
+    only_headers = True
+    cell_start = -1
+    table_depth = 0
+    for match in CELL_TAG_PATTERN.finditer(table_html):
+        closing, tag = match.groups()
+        if tag == 'table':
+            table_depth += -1 if closing else 1
+            continue
+        if table_depth != 1:
+            continue
+        if tag == 'tr':
+            if not closing and cells is None:
+                cells = []
+                only_headers = True
+            elif closing and cells is not None and cell_start == -1:
+                if table is None:
+                    # The first row is the header
+                    if len(cells) == 0 or not only_headers or None in cells or len(set(cells)) != len(cells):
+                        return None
+                    table = ResultTable(cells, category_columns)
+                elif len(cells) != len(table.column_names) or (only_headers and table.rows == 0):
+                    return None
+                else:
+                    table.load_row(cells)
+                cells = None
+            else:
+                return None
+        elif cells is None:
+            return None
+        elif not closing and cell_start == -1:
+            cell_start = match.end()
+            only_headers = only_headers and tag == 'th'
+        elif closing and cell_start != -1:
+            cells.append(cell_text(table_html[cell_start:match.start()]))
+            cell_start = -1
+        else:
+            return None
+    return table
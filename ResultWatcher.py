@@ -0,0 +1,127 @@
+import os
+import threading
+from configparser import ConfigParser
+
+import pandas as pd
+
+from .CSVReport import CURRENT_PATH
+from .AllureResults import ALLURE_CSV_HEADER, read_allure_result, normalize_report_text
+from .Instrumentation import metrics
+
+
+# Number of seconds between loading batches of new results if it is not given in [watch] section
+DEFAULT_WATCH_INTERVAL = 60
+
+
+def read_watch_interval(test_config: ConfigParser):
+    """
+    Returns number of seconds between batches from [watch] section of the ini file
+    """
+    if not test_config.has_option("watch", "interval"):
+        return DEFAULT_WATCH_INTERVAL
+    return max(1.0, test_config.getfloat("watch", "interval"))
+
+
+class ResultWatcher:
+    """
+    Watches allure result files of running tests and loads new results to Confluence in batches,
+    one batch every interval seconds. Use start() before tests are run and stop() when they are
+    finished, stop() loads all remaining results as the last batch. publish is called with dataframe
+    of new results with the same columns as csv report. Results of tests loaded earlier in this run have
+    to be replaced instead of moved to "Previous Results", Publisher.publish() remembers tests loaded to
+    every page for that. If loading of a batch fails, its results are loaded with the next batch, if the
+    last batch fails stop() raises RuntimeError and results which were not loaded are kept in the watcher
+    """
+    def __init__(self, publish, interval: float = DEFAULT_WATCH_INTERVAL, results_paths: list[str] = None):
+        self.publish = publish
+        self.interval = interval
+        # Results of parallel shards are watched too, they are moved to allure_results when shards finish
+        if results_paths is None:
+            results_paths = [os.path.join(CURRENT_PATH, "allure_results"), os.path.join(CURRENT_PATH, "allure_shards")]
+        self.results_paths = results_paths
+        self.batches = 0
+        # Result files have unique names, so a file moved to another directory is not read again
+        self.__read_files = set()
+        self.__new_results = {}
+        self.__stop_event = threading.Event()
+        self.__thread = None
+
+    def __find_result_files(self):
+        for results_path in self.results_paths:
+            if not os.path.exists(results_path):
+                continue
+            for dir_path, _, file_names in os.walk(results_path):
+                for file_name in file_names:
+                    if file_name.endswith("-result.json") and file_name not in self.__read_files:
+                        yield file_name, os.path.join(dir_path, file_name)
+
+    def __read_new_results(self):
+        """
+        Reads result files which were not read yet, only the last result of every test is kept
+        """
+        for file_name, path in self.__find_result_files():
+            try:
+                history_id, stop, row = read_allure_result(path)
+            except (ValueError, OSError):
+                # File is still written or was moved, it is read again with the next batch
+                continue
+            self.__read_files.add(file_name)
+            if history_id not in self.__new_results or stop >= self.__new_results[history_id][0]:
+                self.__new_results[history_id] = (stop, row)
+
+    def pending_tests(self):
+        """
+        Returns names of tests with results which were read but not loaded yet
+        """
+        return sorted(row[ALLURE_CSV_HEADER.index("Name")] for _, row in self.__new_results.values())
+
+    def load_batch(self, raise_errors: bool = False):
+        """
+        Loads results which appeared since the last batch, returns number of loaded results.
+        If loading fails, results are kept for the next batch and the error is raised if raise_errors is True
+        """
+        self.__read_new_results()
+        if len(self.__new_results) == 0:
+            return 0
+
+        rows = [[normalize_report_text(value) for value in row] for _, row in self.__new_results.values()]
+        batch = pd.DataFrame(rows, columns=ALLURE_CSV_HEADER).sort_values(by="Name").reset_index(drop=True)
+        self.batches += 1
+        print(f"\nLOADING {len(batch)} NEW RESULTS TO CONFLUENCE (BATCH {self.batches})")
+        try:
+            with metrics.stage("watch batch", rows=len(batch)):
+                self.publish(batch)
+        except Exception as e:
+            if raise_errors:
+                raise RuntimeError(f"Loading batch {self.batches} with {len(batch)} results failed ({e})") from e
+            print(f"\nLOADING BATCH {self.batches} FAILED ({e}), RESULTS WILL BE LOADED WITH THE NEXT BATCH")
+            return 0
+        self.__new_results = {}
+        return len(batch)
+
+    def __watch(self):
+        while not self.__stop_event.wait(self.interval):
+            self.load_batch()
+
+    def start(self):
+        """
+        Starts watching in a background thread. Result files which already exist are from
+        the previous run, so they are never loaded
+        """
+        self.__read_files.update(file_name for file_name, _ in self.__find_result_files())
+        self.__stop_event.clear()
+        self.__thread = threading.Thread(target=self.__watch, daemon=True)
+        self.__thread.start()
+
+    def stop(self, load_remaining: bool = True):
+        """
+        Stops watching and loads all remaining results as the last batch. RuntimeError is raised if the last
+        batch cannot be loaded, then its results are returned by pending_tests(). If load_remaining is False
+        remaining results are not loaded, e.g. when the whole report is loaded after the tests
+        """
+        self.__stop_event.set()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+        if load_remaining:
+            self.load_batch(raise_errors=True)
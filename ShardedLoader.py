@@ -0,0 +1,231 @@
+import os
+import html
+import asyncio
+from configparser import ConfigParser
+
+import pandas as pd
+from atlassian import Confluence
+
+from .AsyncConfluence import AsyncConfluence, PageVersionConflict
+from .ConfluenceDataloader import Dataloader, get_credentials, read_latest_report, fetch_page, update_page, \
+    MAX_CONFLICT_RETRIES, DF_SUCCESS_CHAR, DF_FAIL_CHAR
+from .HistoryStore import HistoryStore
+from .PageParser import parse_storage_page, find_table
+
+
+# suite - tests of every suite are loaded to separate child page, rows - child pages have at most shard_rows tests
+SHARD_MODES = ["suite", "rows"]
+DEFAULT_SHARD_ROWS = 1000
+# Child page is titled "<page title> - <shard name>", shards split by rows are named "Part 1", "Part 2" and so on
+SHARD_TITLE_SEPARATOR = " - "
+PART_NAME = "Part "
+# Tests without suite in the csv report are loaded to this shard
+NO_SUITE_NAME = "Other"
+SUMMARY_HEADER = ["Test Page", "Tests", "Passed", "Failed"]
+
+
+def read_shard_config(test_config: ConfigParser):
+    """
+    Returns shard mode and number of tests on one child page from [shards] section of the ini file,
+    shard mode is None if tests are not split
+    """
+    if not test_config.has_option("shards", "by"):
+        return None, DEFAULT_SHARD_ROWS
+    shard_by = test_config["shards"]["by"]
+    if shard_by not in SHARD_MODES:
+        raise ValueError(f"Unknown shard mode {shard_by}, it can be {' or '.join(SHARD_MODES)}")
+    if not test_config.has_option("shards", "rows"):
+        return shard_by, DEFAULT_SHARD_ROWS
+    return shard_by, max(1, test_config.getint("shards", "rows"))
+
+
+def count_page_results(body: str):
+    """
+    Returns number of tests, passed tests and failed tests in the test cases table of the page
+    """
+    page = parse_storage_page(body)
+    if not page.has_test_table():
+        return 0, 0, 0
+    passed = 0
+    failed = 0
+    for row in range(1, len(page.rows)):
+        row_html = page.row_html(row)
+        if DF_SUCCESS_CHAR in row_html:
+            passed += 1
+        elif DF_FAIL_CHAR in row_html:
+            failed += 1
+    return len(page.rows) - 1, passed, failed
+
+
+def create_summary_table(summary: list[tuple]):
+    """
+    Returns html code of summary table with link to every child page and its numbers of tests,
+    summary is a list of tuples (page title, tests, passed, failed)
+    """
+    table = "<table><tbody>\n<tr>" + "".join("<th>" + header + "</th>" for header in SUMMARY_HEADER) + "</tr>\n"
+    for title, tests, passed, failed in summary:
+        link = '<ac:link><ri:page ri:content-title="' + html.escape(title) + '" /></ac:link>'
+        table += f"<tr><td>{link}</td><td>{tests}</td><td>{passed}</td><td>{failed}</td></tr>\n"
+    return table + "</tbody></table>"
+
+
+class ShardedLoader:
+    """
+    To load last created csv report split into child pages of the page use load_data_to_confluence() method.
+    Tests are split by suite or into parts of at most shard_rows tests, every child page has its own test
+    cases table loaded by Dataloader and the page gets summary table of all child pages. Test stays on the
+    child page it is already on, so child pages are created only for new tests. Child pages are loaded at
+    the same time and only child pages with changed rows are updated. csv_data_frame, loaded_tests
+    and page_cache are used as in Dataloader
+    """
+    def __init__(self, url: str, page_id: str, page_title: str, page_space_key: str, csv_folder_name: str, csv_file_name: str, description_only: bool = False,
+                 shard_by: str = "suite", shard_rows: int = DEFAULT_SHARD_ROWS, confluence: Confluence = None, login: str = None, password: str = None,
+                 headless: bool = False, previous_results_limit: int = None, history_store: HistoryStore = None, csv_data_frame: pd.DataFrame = None,
+                 loaded_tests: set = None, page_cache=None):
+        if shard_by not in SHARD_MODES:
+            raise ValueError(f"Unknown shard mode {shard_by}, it can be {' or '.join(SHARD_MODES)}")
+        self.url = url
+        self.page_id = page_id
+        self.page_title = page_title
+        self.page_space_key = page_space_key
+        self.csv_folder_name = csv_folder_name
+        self.csv_file_name = csv_file_name
+        self.description_only = description_only
+        self.shard_by = shard_by
+        self.shard_rows = shard_rows
+        self.previous_results_limit = previous_results_limit
+        self.history_store = history_store
+        self.loaded_tests = loaded_tests if loaded_tests is not None else set()
+        self.page_cache = page_cache
+
+        if csv_data_frame is not None:
+            self.csv_df = csv_data_frame
+            print(f"\nUPLOADING {len(csv_data_frame)} TESTS ON CHILD PAGES OF THE PAGE TITLED:\n{self.page_title}")
+        else:
+            csv_dir = os.path.join("Test_data", csv_folder_name)
+            csv_file, self.csv_df = read_latest_report(csv_dir, csv_file_name)
+            print(f"\nUPLOADING THE FILE:\n{os.path.join(csv_dir, csv_file)}")
+            print(f"ON CHILD PAGES OF THE PAGE TITLED:\n{self.page_title}")
+        if confluence is None:
+            login, password = get_credentials(login, password, headless)
+            confluence = Confluence(
+                url=self.url,
+                username=login,
+                password=password,
+            )
+        self.__login = login
+        self.__confluence = confluence
+
+    def __get_shard_title(self, shard_name: str):
+        return self.page_title + SHARD_TITLE_SEPARATOR + shard_name
+
+    def __assign_shards(self, shard_tests: dict):
+        """
+        Returns title of the child page of every test in csv report. shard_tests is a dictionary
+        {child page title: set of test names on the page}
+        """
+        test_shards = {name: title for title, names in shard_tests.items() for name in names}
+        shard_sizes = {title: len(names) for title, names in shard_tests.items()}
+
+        # New tests are added to the last part until it is full
+        part = 1
+        for title in shard_tests.keys():
+            shard_name = title[len(self.__get_shard_title("")):]
+            if shard_name.startswith(PART_NAME) and shard_name[len(PART_NAME):].isdigit():
+                part = max(part, int(shard_name[len(PART_NAME):]))
+
+        names = self.csv_df["Name"].tolist()
+        suites = self.csv_df["Suite"].tolist() if "Suite" in self.csv_df.columns else [NO_SUITE_NAME] * len(names)
+        shard_titles = []
+        for name, suite in zip(names, suites):
+            title = test_shards.get(name)
+            if title is None:
+                if self.shard_by == "suite":
+                    title = self.__get_shard_title(suite if isinstance(suite, str) and suite != "" else NO_SUITE_NAME)
+                else:
+                    if shard_sizes.get(self.__get_shard_title(PART_NAME + str(part)), 0) >= self.shard_rows:
+                        part += 1
+                    title = self.__get_shard_title(PART_NAME + str(part))
+                test_shards[name] = title
+                shard_sizes[title] = shard_sizes.get(title, 0) + 1
+            shard_titles.append(title)
+        return shard_titles
+
+    async def __update_summary(self, client: AsyncConfluence, summary: list[tuple]):
+        """
+        Puts summary table in place of the previous one or at the end of the page, if the table
+        did not change the page is not updated
+        """
+        table = create_summary_table(summary)
+        for attempt in range(MAX_CONFLICT_RETRIES + 1):
+            body, version = await fetch_page(client, self.url, self.page_id, self.page_cache)
+            start, end = find_table(body, SUMMARY_HEADER[0])
+            new_body = body[:start] + table + body[end:] if start != -1 else body + table
+            if new_body == body:
+                print("\nNO CHANGES IN THE SUMMARY TABLE, THE PAGE IS NOT UPDATED")
+                return
+            try:
+                await update_page(client, self.url, self.page_id, self.page_title, new_body, version, self.page_cache)
+                return
+            except PageVersionConflict:
+                if attempt == MAX_CONFLICT_RETRIES:
+                    raise RuntimeError("The page was changed by somebody else during every loading attempt")
+
+    async def __load_data_async(self):
+        client = AsyncConfluence(self.__confluence)
+        prefix = self.__get_shard_title("")
+        child_pages = {page["title"]: page["id"] for page in await client.get_child_pages(self.page_id) if page["title"].startswith(prefix)}
+        fetched_pages = await asyncio.gather(*(fetch_page(client, self.url, page_id, self.page_cache) for page_id in child_pages.values()))
+        page_bodies = {title: body for title, (body, _) in zip(child_pages.keys(), fetched_pages)}
+
+        # Hidden test names show which tests are already on every child page
+        shard_tests = {title: {name for name in parse_storage_page(body).row_names if name is not None} for title, body in page_bodies.items()}
+        shard_titles = self.__assign_shards(shard_tests)
+
+        new_titles = sorted(set(shard_titles) - set(child_pages.keys()))
+        for title in new_titles:
+            print(f"\nCREATING THE PAGE TITLED:\n{title}")
+        new_ids = await asyncio.gather(*(client.create_page(self.page_space_key, title, "", self.page_id) for title in new_titles))
+        child_pages.update(zip(new_titles, new_ids))
+        page_bodies.update((title, "") for title in new_titles)
+
+        loaders = []
+        for title, shard_df in self.csv_df.groupby(pd.Series(shard_titles, index=self.csv_df.index), sort=True):
+            loaders.append(Dataloader(
+                url=self.url,
+                page_id=child_pages[title],
+                page_title=title,
+                page_space_key=self.page_space_key,
+                csv_folder_name=self.csv_folder_name,
+                csv_file_name=self.csv_file_name,
+                description_only=self.description_only,
+                confluence=self.__confluence,
+                login=self.__login,
+                previous_results_limit=self.previous_results_limit,
+                history_store=self.history_store,
+                csv_data_frame=shard_df.reset_index(drop=True),
+                loaded_tests=self.loaded_tests,
+                page_cache=self.page_cache
+            ))
+        results = await asyncio.gather(*(loader.load_data_async(client) for loader in loaders), return_exceptions=True)
+
+        errors = {}
+        for loader, result in zip(loaders, results):
+            if isinstance(result, Exception):
+                errors[loader.page_title] = result
+            elif loader.page_body is not None:
+                page_bodies[loader.page_title] = loader.page_body
+
+        summary = [(title, *count_page_results(page_bodies[title])) for title in sorted(child_pages.keys())]
+        await self.__update_summary(client, summary)
+
+        if errors:
+            for title, error in errors.items():
+                print(f"{title}: FAILED ({error})")
+            raise RuntimeError(f"Loading report failed for pages: {', '.join(errors.keys())}")
+
+    def load_data_to_confluence(self):
+        """
+        Loads tests from last created csv report to child pages and updates summary table of the page
+        """
+        asyncio.run(self.__load_data_async())
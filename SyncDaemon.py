@@ -0,0 +1,357 @@
+import os
+import json
+import time
+import socket
+import threading
+from datetime import datetime
+from collections import OrderedDict
+from configparser import ConfigParser
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from atlassian import Confluence
+
+from .ConfluenceDataloader import Dataloader, get_credentials, read_csv_report, read_latest_report
+from .Publisher import read_page_configs
+from .AsyncConfluence import DEFAULT_CONCURRENCY
+from .HistoryStore import read_history_config
+from .ShardedLoader import ShardedLoader, read_shard_config
+from .Instrumentation import metrics
+from .SyncQueue import SPOOL_DIR, RUNNING_DIR, DONE_DIR, FAILED_DIR
+
+
+# Number of sync jobs run at the same time if it is not given by --jobs
+DEFAULT_DAEMON_JOBS = 2
+# Number of seconds between looking for new jobs in the spool directory
+DEFAULT_POLL_INTERVAL = 1.0
+# Number of page bodies kept in memory, the least recently used page is removed first
+PAGE_CACHE_SIZE = 50
+# Access right needed to read exit code of a process on Windows and exit code of a process which is running
+PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+STILL_ACTIVE = 259
+ERROR_ACCESS_DENIED = 5
+
+
+def is_process_running(pid: int):
+    """
+    Returns True if process with given pid is running on this computer. On Windows os.kill() would
+    terminate the process, so there the exit code of the process is read instead
+    """
+    if os.name == "nt":
+        import ctypes
+        kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            # Processes of other users cannot be opened, but they are running
+            return ctypes.get_last_error() == ERROR_ACCESS_DENIED
+        try:
+            exit_code = ctypes.c_ulong()
+            kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))
+            return exit_code.value == STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def get_owner_name(host: str = None, pid: int = None):
+    """
+    Returns name of the directory in "running" with jobs of the daemon run by process pid on host
+    """
+    return f"{host or socket.gethostname()}-{pid or os.getpid()}"
+
+
+class PageBodyCache:
+    """
+    Bodies of the last max_pages downloaded pages kept in memory as {(url, page id): (version, body)},
+    it can be shared by loaders running in different threads
+    """
+    def __init__(self, max_pages: int = PAGE_CACHE_SIZE):
+        self.max_pages = max_pages
+        self.__pages = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, key: tuple):
+        with self.__lock:
+            page = self.__pages.get(key)
+            if page is not None:
+                self.__pages.move_to_end(key)
+            return page
+
+    def __setitem__(self, key: tuple, page: tuple):
+        with self.__lock:
+            self.__pages[key] = page
+            self.__pages.move_to_end(key)
+            while len(self.__pages) > self.max_pages:
+                self.__pages.popitem(last=False)
+
+    def __len__(self):
+        return len(self.__pages)
+
+
+class SyncDaemon:
+    """
+    Long-running process which loads csv reports to Confluence for sync jobs queued by submit_job().
+    Use run() to process jobs until stop() is called or Ctrl+C is pressed. Confluence clients are
+    created once for every url and login, every client has its own session with connection pool,
+    because the client keeps credentials in its session. Page bodies are kept in memory by PageBodyCache.
+    At most jobs jobs run at once, jobs loading the same page wait for each other. Every job reads its
+    configuration file again and gets new loaders, so nothing of one job is kept for the next one.
+    Running jobs are kept in "running/HOST-PID" directory of the daemon which runs them, so many daemons
+    can take jobs from one spool directory. Credentials are taken as with --headless
+    """
+    def __init__(self, config_dir: str, jobs: int = DEFAULT_DAEMON_JOBS, spool_dir: str = SPOOL_DIR,
+                 poll_interval: float = DEFAULT_POLL_INTERVAL):
+        self.config_dir = config_dir
+        self.jobs = max(1, jobs)
+        self.spool_dir = spool_dir
+        self.poll_interval = poll_interval
+        self.page_cache = PageBodyCache()
+        self.finished_jobs = 0
+        self.failed_jobs = 0
+        self.__clients = {}
+        self.__lock = threading.Lock()
+        self.__page_locks = {}
+        self.__stop_event = threading.Event()
+        self.__wake_event = threading.Event()
+        self.__running_dir = os.path.join(self.spool_dir, RUNNING_DIR, get_owner_name())
+
+        for directory in [RUNNING_DIR, DONE_DIR, FAILED_DIR]:
+            os.makedirs(os.path.join(self.spool_dir, directory), exist_ok=True)
+
+    def get_client(self, url: str, login: str, password: str):
+        """
+        Returns Confluence client for given url and login. Client sets credentials of its login
+        in the session, so clients never share a session
+        """
+        with self.__lock:
+            if (url, login) not in self.__clients:
+                session = requests.Session()
+                # Every job sends up to DEFAULT_CONCURRENCY requests at once through the session
+                adapter = HTTPAdapter(pool_connections=self.jobs, pool_maxsize=self.jobs * DEFAULT_CONCURRENCY)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self.__clients[(url, login)] = Confluence(
+                    url=url,
+                    username=login,
+                    password=password,
+                    session=session
+                )
+            return self.__clients[(url, login)]
+
+    def __get_page_lock(self, url: str, page_id: str):
+        with self.__lock:
+            return self.__page_locks.setdefault((url, page_id), threading.Lock())
+
+    def __queued_jobs(self):
+        """
+        Returns paths of queued job files from the oldest one
+        """
+        file_names = sorted(name for name in os.listdir(self.spool_dir) if name.endswith(".json"))
+        return [os.path.join(self.spool_dir, name) for name in file_names]
+
+    def __claim_job(self, path: str):
+        """
+        Moves job file to "running" directory of this daemon and returns the job, None if the file
+        was taken by another daemon or it is not a valid job
+        """
+        running_path = os.path.join(self.__running_dir, os.path.basename(path))
+        try:
+            os.replace(path, running_path)
+        except OSError:
+            return None
+        try:
+            with open(running_path, "r", encoding="utf-8") as f:
+                job = json.load(f)
+            if not isinstance(job, dict) or "config" not in job:
+                raise ValueError("Missing config of the job")
+        except ValueError as e:
+            job = {"id": os.path.basename(path)[:-len(".json")]}
+            self.__finish_job(job, running_path, str(e), 0.0)
+            return None
+        job["id"] = os.path.basename(path)[:-len(".json")]
+        return job, running_path
+
+    def __finish_job(self, job: dict, running_path: str, error: str, seconds: float):
+        """
+        Saves result of the job and moves it from "running" to "done" or "failed" directory
+        """
+        job["finished"] = datetime.now().isoformat(timespec="seconds")
+        job["seconds"] = round(seconds, 3)
+        job["error"] = error
+        result_dir = DONE_DIR if error is None else FAILED_DIR
+        path = os.path.join(self.spool_dir, result_dir, job["id"] + ".json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(job, f, indent=4)
+        os.remove(running_path)
+
+    def __recover_jobs(self):
+        """
+        Queues again jobs which were running when their daemon was stopped. Jobs of daemons which are
+        still running on this computer are left to them, jobs of daemons on other computers too, because
+        their processes cannot be checked. Jobs lying straight in "running" are from daemons which did not
+        keep jobs in their own directory, they are queued again too
+        """
+        running_dir = os.path.join(self.spool_dir, RUNNING_DIR)
+        host = socket.gethostname()
+        for file_name in os.listdir(running_dir):
+            path = os.path.join(running_dir, file_name)
+            if file_name.endswith(".json"):
+                os.replace(path, os.path.join(self.spool_dir, file_name))
+                continue
+            owner_host, _, owner_pid = file_name.rpartition("-")
+            if not os.path.isdir(path) or owner_host != host or not owner_pid.isdigit():
+                continue
+            if int(owner_pid) != os.getpid() and is_process_running(int(owner_pid)):
+                continue
+            for job_file_name in os.listdir(path):
+                if job_file_name.endswith(".json"):
+                    print(f"\nJOB {job_file_name[:-len('.json')]} OF STOPPED DAEMON {file_name} QUEUED AGAIN")
+                    os.replace(os.path.join(path, job_file_name), os.path.join(self.spool_dir, job_file_name))
+            try:
+                os.rmdir(path)
+            except OSError:
+                pass
+
+    def run_job(self, job: dict):
+        """
+        Loads csv report of the job to all pages of its configuration
+        """
+        config_path = os.path.join(self.config_dir, job["config"] + ".ini")
+        test_config = ConfigParser()
+        if not test_config.read(config_path):
+            raise RuntimeError(f"Configuration file {config_path} does not exist")
+        csv_folder_name = test_config['file']['folder_name']
+        csv_file_name = test_config['file']['file_name']
+        previous_results_limit, history_store = read_history_config(test_config)
+        shard_by, shard_rows = read_shard_config(test_config)
+        login = None
+        password = None
+        if test_config.has_section('headless'):
+            login = test_config['headless'].get('login') or None
+            password = test_config['headless'].get('password') or None
+        login, password = get_credentials(login, password, headless=True)
+
+        # Report is read once and loaded to every page of the configuration
+        if job.get("csv"):
+            csv_df = read_csv_report(job["csv"])
+        else:
+            _, csv_df = read_latest_report(os.path.join("Test_data", csv_folder_name), csv_file_name)
+
+        description_only = job.get("description_only", False)
+        for page in read_page_configs(test_config):
+            confluence = self.get_client(page["url"], login, password)
+            with self.__get_page_lock(page["url"], page["page_id"]):
+                if shard_by is not None:
+                    loader = ShardedLoader(
+                        url=page["url"],
+                        page_id=page["page_id"],
+                        page_title=page["page_title"],
+                        page_space_key=page["page_space_key"],
+                        csv_folder_name=csv_folder_name,
+                        csv_file_name=csv_file_name,
+                        description_only=description_only,
+                        shard_by=shard_by,
+                        shard_rows=shard_rows,
+                        confluence=confluence,
+                        login=login,
+                        previous_results_limit=previous_results_limit,
+                        history_store=history_store,
+                        csv_data_frame=csv_df,
+                        page_cache=self.page_cache
+                    )
+                else:
+                    loader = Dataloader(
+                        url=page["url"],
+                        page_id=page["page_id"],
+                        page_title=page["page_title"],
+                        page_space_key=page["page_space_key"],
+                        csv_folder_name=csv_folder_name,
+                        csv_file_name=csv_file_name,
+                        description_only=description_only,
+                        confluence=confluence,
+                        login=login,
+                        previous_results_limit=previous_results_limit,
+                        history_store=history_store,
+                        csv_data_frame=csv_df,
+                        page_cache=self.page_cache
+                    )
+                loader.load_data_to_confluence()
+
+    def __run_queued_job(self, job: dict, running_path: str):
+        print(f"\nSTARTING JOB {job['id']} ({job['config']})")
+        start = time.perf_counter()
+        error = None
+        try:
+            with metrics.stage("sync job"):
+                self.run_job(job)
+        except Exception as e:
+            error = str(e)
+        seconds = time.perf_counter() - start
+        self.__finish_job(job, running_path, error, seconds)
+        with self.__lock:
+            if error is None:
+                self.finished_jobs += 1
+            else:
+                self.failed_jobs += 1
+        if error is None:
+            print(f"\nJOB {job['id']} FINISHED IN {seconds:.2f} s")
+        else:
+            print(f"\nJOB {job['id']} FAILED ({error})")
+
+    def __save_metrics(self):
+        """
+        Saves and removes collected metrics, called when no job is running so memory of metrics does not grow
+        """
+        if metrics.enabled and (metrics.stages or metrics.calls):
+            print(f"\nMETRICS SAVED TO {metrics.write_report()}")
+            metrics.reset()
+
+    def run(self):
+        """
+        Runs queued jobs until stop() is called or Ctrl+C is pressed, jobs which are running then are finished.
+        Jobs stay in the spool directory until a worker is free, so only running jobs are kept in memory
+        """
+        self.__recover_jobs()
+        os.makedirs(self.__running_dir, exist_ok=True)
+        self.__stop_event.clear()
+        print(f"\nSYNC DAEMON STARTED, JOBS ARE TAKEN FROM {self.spool_dir} (AT MOST {self.jobs} AT ONCE)")
+        running = set()
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            try:
+                while not self.__stop_event.is_set():
+                    running = {future for future in running if not future.done()}
+                    if len(running) == 0:
+                        self.__save_metrics()
+                    for path in self.__queued_jobs()[:self.jobs - len(running)]:
+                        claimed_job = self.__claim_job(path)
+                        if claimed_job is None:
+                            continue
+                        future = executor.submit(self.__run_queued_job, *claimed_job)
+                        future.add_done_callback(lambda _: self.__wake_event.set())
+                        running.add(future)
+                    self.__wake_event.wait(self.poll_interval)
+                    self.__wake_event.clear()
+            except KeyboardInterrupt:
+                print(f"\nSTOPPING SYNC DAEMON, WAITING FOR {len(running)} RUNNING JOBS")
+        self.__save_metrics()
+        # Directory of running jobs is removed only when it is empty, jobs which were not finished are queued again
+        # by the next daemon started after this one
+        try:
+            os.rmdir(self.__running_dir)
+        except OSError:
+            pass
+        print(f"\nSYNC DAEMON STOPPED, {self.finished_jobs} JOBS FINISHED, {self.failed_jobs} JOBS FAILED")
+
+    def stop(self):
+        """
+        Stops run() after running jobs are finished, it can be called from another thread
+        """
+        self.__stop_event.set()
+        self.__wake_event.set()
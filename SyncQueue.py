@@ -0,0 +1,41 @@
+import os
+import json
+import uuid
+from datetime import datetime
+
+
+# Sync jobs are queued there as JSON files by submit_job(), the daemon moves them to "running"
+# and then to "done" or "failed" directory together with the result of the job
+SPOOL_DIR = os.path.join("Test_data", "spool")
+RUNNING_DIR = "running"
+DONE_DIR = "done"
+FAILED_DIR = "failed"
+
+
+def create_job_id():
+    """
+    Returns id of a new job, ids start with date and time, so sorted ids are in the order of submitting
+    """
+    return datetime.now().strftime("%Y%m%d-%H%M%S-%f") + "-" + uuid.uuid4().hex[:8]
+
+
+def submit_job(config_name: str, csv_path: str = None, description_only: bool = False, spool_dir: str = SPOOL_DIR):
+    """
+    Queues sync job for the daemon and returns its id. The job loads the csv report with given path
+    (the last created report of the configuration if it is not given) to all pages of the configuration
+    """
+    if not os.path.exists(spool_dir):
+        os.makedirs(spool_dir, exist_ok=True)
+    job = {
+        "id": create_job_id(),
+        "config": config_name,
+        "csv": os.path.abspath(csv_path) if csv_path else None,
+        "description_only": description_only,
+        "submitted": datetime.now().isoformat(timespec="seconds")
+    }
+    path = os.path.join(spool_dir, job["id"] + ".json")
+    # Job is written to temporary file first, so the daemon never reads half written job
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(job, f, indent=4)
+    os.replace(path + ".tmp", path)
+    return job["id"]
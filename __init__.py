@@ -8,7 +8,8 @@ To run this properly you need to add parameter -c or --config with name of confi
 Program run:
 1. Launching the tests by pytest with conditions specified in test_config.ini in [test] section
 2. Generating csv report by allure to directory specified in test_config.ini in [file] section
-3. Updating the Confluence page specified in test_config.ini in [page] section with the last generated report
+3. Updating the Confluence page specified in test_config.ini in [page] section with the last generated report,
+   if there are also [page.NAME] sections all pages are updated at the same time
 
 Steps 1 and 2 can be omitted by typing -l or --load and only Confluence page update with last
 generated report in directory specify in test_config.ini can be done
@@ -17,6 +18,50 @@ generated report in directory specify in test_config.ini can be done
 There is also an option to load tests description without loading results by typing -d or --description
 (example) python -m report_generation -c test_config -d /works also with -l
 
+All generated reports can be loaded to local SQLite warehouse (Test_data\\reports.db) by typing -i or --ingest,
+reports already loaded are skipped. Then history of one test and the flakiest tests can be printed
+(example) python -m report_generation -c test_config -i
+(example) python -m report_generation --history "test_name" --since 2022-01-01
+(example) python -m report_generation --flaky
+
+The latest report is found by manifest.json file in the report directory, it is updated with every generated
+report. If reports were copied or removed by hand, the manifest can be created again by typing --rebuild-manifest
+(example) python -m report_generation -c test_config --rebuild-manifest
+
+Results can be loaded to Confluence while tests are still running by typing -w or --watch. New results
+are loaded in batches every interval seconds given in [watch] section, results of tests which finished
+after the last batch are loaded with the whole report when all tests are finished
+(example) python -m report_generation -c test_config -w
+
+To run without any questions in the terminal, e.g. on CI server, type --headless. Then credentials are taken
+from CONFLUENCE_LOGIN and CONFLUENCE_PASSWORD environment variables or from [headless] section of the ini file
+and the report is loaded to Confluence without asking (unless load= n is set in [headless] section)
+(example) python -m report_generation -c test_config --headless
+
+To find out where a run spends its time type --metrics. Wall time, peak memory and number of rows of every
+stage and requests, bytes and time of every Confluence call are printed at the end and saved as JSON file
+in Test_data\\metrics. With --profile the whole run is also profiled by cProfile and saved to given file
+(example) python -m report_generation -c test_config --metrics --profile run.prof
+
+Speed of loading to Confluence can be measured by typing --benchmark. Every stage of loading is timed on generated
+pages and csv reports against a Confluence client kept in memory, so the configuration file is not needed.
+Case "startup" measures time of importing the modules needed by every mode in new Python processes.
+Results are compared with the baseline saved earlier by --save-baseline and slower stages are reported
+(example) python -m report_generation --benchmark --save-baseline
+(example) python -m report_generation --benchmark "1k rows" startup
+
+To avoid starting a new process for every load, e.g. on a CI server loading many reports, run the sync daemon
+by typing --daemon. It keeps Confluence clients and downloaded pages between jobs and runs at most --jobs jobs
+at once. Jobs are queued in Test_data\\spool by typing --submit with the configuration name and optionally
+the path of the csv report (the last created report by default), results of jobs are saved in Test_data\\spool\\done
+and Test_data\\spool\\failed. The daemon takes credentials as with --headless
+(example) python -m report_generation --daemon --jobs 4
+(example) python -m report_generation -c test_config --submit Test_data\\reports\\report.csv
+
+Importing the package does not run anything, so its modules can be used as a library. The program is run
+by main() function, which imports only modules needed by the chosen mode
+(example) from report_generation import main; main(["-c", "test_config", "-l"])
+
 To check what parameters are available type -h or --help.
 """
 
@@ -58,12 +103,41 @@ To check what parameters are available type -h or --help.
 [file]
     folder_name= ; name of the folder with test reports
     file_name= ; name that will be added to date and time
+    ; csv_generator= allure (default) - csv report is generated by allure command line tool,
+    ;                python - csv report is built straight from allure results, allure is not needed
 [page]
     url= ; general link to the Confluence (e.g. http://confluence.diehlako.local:8090/)
     page_id= ; id of the Confluence page
     page_title= ; title of the Confluence page
     page_space_key= ; space key of the Confluence page
+; More pages can be added as [page.NAME] sections with the same keys as [page] section,
+; then the report is loaded to all of them at once with one login
+; (example) [page.power_supply]
+[publish]
+    ; This section is optional
+    workers= ; number of pages loaded at the same time (default 4)
+[history]
+    ; This section is optional
+    previous_results= ; number of newest results kept in "Previous Results" column (default - all results)
+    database= ; path to SQLite file in which all loaded results are saved (default - results are not saved),
+    ;           results removed from "Previous Results" column are also saved there
+[shards]
+    ; This section is optional, without it all tests are loaded to one table on the page
+    by= ; suite - tests of every suite are loaded to child page titled "<page title> - <suite>",
+    ;     rows - tests are loaded to child pages titled "<page title> - Part N" with at most rows tests
+    rows= ; number of tests on one child page with by= rows (default 1000)
+    ; The page gets summary table with link and number of passed and failed tests of every child page
+[watch]
+    ; This section is optional, it is used only with -w or --watch parameter
+    interval= ; number of seconds between loading batches of new results (default 60)
+[headless]
+    ; This section is optional, it is used only with --headless parameter
+    login= ; Confluence user name, CONFLUENCE_LOGIN environment variable is used if this is not set
+    password= ; Confluence password, CONFLUENCE_PASSWORD environment variable is used if this is not set
+    load= ; y - generated report is loaded to Confluence (default), n - report is only generated
 [test]
+    ; workers= number of processes running tests at the same time, tests are split between them by test files
+    ; (optional, default 1 - all tests run in one process)
     ; If there are no test conditions all tests will run
     ; (example) test_condition1= path\to\test.py
     ; (example) test_condition2= path\to\test.py::test_method
@@ -73,82 +147,339 @@ To check what parameters are available type -h or --help.
 
 
 import os
-import msvcrt
-from configparser import ConfigParser
 from argparse import ArgumentParser
 
-from .CSVReport import CreateReport
-from .ConfluenceDataloader import Dataloader
-
 
 # In this parameter should be specified path to the directory with configuration files
-CONFIG_DIR = "setup\\test_config"
-
-# ArgumentParser for parsing parameters given in terminal
-parser = ArgumentParser()
-parser.add_argument(
-    "-c", 
-    "--config", 
-    type=str, 
-    help="Instead of CONFIG, enter the name of the ini file which contains the configuration of test report directory, page and test conditions"
-    )
-parser.add_argument(
-    "-l", 
-    "--load", 
-    help="Skip creating report and load last created report to Confluence", 
-    action="store_true"
-    )
-parser.add_argument(
-    "-d", 
-    "--description", 
-    help="Load only description of tests and do not load results", 
-    action="store_true"
-    )
-args = parser.parse_args()
-CONFIG = os.path.join(CONFIG_DIR, args.config+".ini")
-LOAD = args.load
-DESCRIPTION_ONLY = args.description
-
-# ConfigParser for parsing ini file with test configuration
-test_config = ConfigParser()
-test_config.read(CONFIG)
-TEST_FOLDER_NAME = test_config['file']['folder_name']
-TEST_FILE_NAME = test_config['file']['file_name']
-URL = test_config['page']['url']
-PAGE_ID = test_config['page']['page_id']
-PAGE_TITLE = test_config['page']['page_title']
-PAGE_SPACE_KEY = test_config['page']['page_space_key']
-TEST_CONDITIONS = []
-test_cond_items = test_config.items('test')
-for name, condition in test_cond_items:
-    TEST_CONDITIONS.append(condition)
-
-# Generating the report
-if not LOAD:
-    results = CreateReport(
-        folder_name=TEST_FOLDER_NAME,
-        file_name=TEST_FILE_NAME,
-        test_conditions=TEST_CONDITIONS
-    )
-    results.generate_report()
-
-    print("\nDo you want to load generated report to Confluence? [y/n] ", end="")
-    choice = msvcrt.getch().decode("utf-8")
-    print()
-else:
-    choice = 'y'
-
-# Loading report to the Confluence site
-if choice == 'y':
-    d = Dataloader(
-        url=URL,
-        page_id=PAGE_ID,
-        page_title=PAGE_TITLE,
-        page_space_key=PAGE_SPACE_KEY,
-        csv_folder_name=TEST_FOLDER_NAME,
-        csv_file_name=TEST_FILE_NAME,
-        description_only=DESCRIPTION_ONLY
-    )
-
-    d.load_data_to_confluence()
-    
+CONFIG_DIR = os.path.join("setup", "test_config")
+
+
+def create_parser():
+    """
+    Returns ArgumentParser for parsing parameters given in terminal
+    """
+    parser = ArgumentParser(prog="report_generation")
+    parser.add_argument(
+        "-c", 
+        "--config", 
+        type=str, 
+        help="Instead of CONFIG, enter the name of the ini file which contains the configuration of test report directory, page and test conditions"
+        )
+    parser.add_argument(
+        "-l", 
+        "--load", 
+        help="Skip creating report and load last created report to Confluence", 
+        action="store_true"
+        )
+    parser.add_argument(
+        "-d", 
+        "--description", 
+        help="Load only description of tests and do not load results", 
+        action="store_true"
+        )
+    parser.add_argument(
+        "-i",
+        "--ingest",
+        help="Load all reports from the report directory to the local warehouse and exit",
+        action="store_true"
+        )
+    parser.add_argument(
+        "--history",
+        type=str,
+        help="Instead of HISTORY, enter the test name to print its results from the local warehouse and exit"
+        )
+    parser.add_argument(
+        "--flaky",
+        help="Print the flakiest tests from the local warehouse and exit",
+        action="store_true"
+        )
+    parser.add_argument(
+        "--since",
+        type=str,
+        help="Instead of SINCE, enter the date YYYY-MM-DD to use only results since that date with --history and --flaky"
+        )
+    parser.add_argument(
+        "--rebuild-manifest",
+        help="Create manifest of the report directory again from all reports in it and exit",
+        action="store_true"
+        )
+    parser.add_argument(
+        "-w",
+        "--watch",
+        help="Load results to Confluence in batches while tests are running",
+        action="store_true"
+        )
+    parser.add_argument(
+        "--headless",
+        help="Do not ask for anything in the terminal, credentials and confirmation are taken from environment or [headless] section",
+        action="store_true"
+        )
+    parser.add_argument(
+        "--metrics",
+        help="Print and save time, memory and rows of every stage and traffic of every Confluence call",
+        action="store_true"
+        )
+    parser.add_argument(
+        "--profile",
+        type=str,
+        help="Instead of PROFILE, enter the path of the file to save cProfile statistics of the run to"
+        )
+    parser.add_argument(
+        "--benchmark",
+        nargs="*",
+        metavar="CASE",
+        help="Run benchmark cases (100 rows, 1k rows, 10k rows, 20k rows, long cells, 50k rows, startup), all of them if none is given, and exit"
+        )
+    parser.add_argument(
+        "--daemon",
+        help="Run sync daemon which loads reports for jobs queued by --submit until Ctrl+C is pressed",
+        action="store_true"
+        )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        help="Instead of JOBS, enter the number of jobs run at once by --daemon (default 2)"
+        )
+    parser.add_argument(
+        "--submit",
+        nargs="?",
+        const="",
+        metavar="CSV",
+        help="Queue job loading the report of the configuration for --daemon and exit, with CSV the given csv report is loaded instead of the last created one"
+        )
+    parser.add_argument(
+        "--save-baseline",
+        help="Save results of --benchmark as the baseline which next runs are compared with",
+        action="store_true"
+        )
+    return parser
+
+
+def main(argv: list[str] = None):
+    """
+    Runs the program with given parameters (parameters from terminal by default) and returns exit code.
+    Modules are imported only in the mode which needs them, e.g. pytest is not imported with -l
+    and nothing but argparse is imported with -h
+    """
+    args = create_parser().parse_args(argv)
+
+    # Benchmarks use generated data, so they do not need the configuration file
+    if args.benchmark is not None:
+        from .Benchmark import run_benchmarks
+        regressions = run_benchmarks(args.benchmark, save_baseline=args.save_baseline)
+        return 1 if regressions else 0
+
+    # Queries of the local warehouse do not need the configuration file
+    if args.history is not None or args.flaky:
+        from .ReportWarehouse import ReportWarehouse, print_test_history, print_flaky_tests
+        warehouse = ReportWarehouse()
+        if args.history is not None:
+            print_test_history(warehouse, args.history, args.since)
+        if args.flaky:
+            print_flaky_tests(warehouse, args.since)
+        return 0
+
+    # Sync daemon takes names of configuration files from queued jobs
+    if args.daemon:
+        from .Instrumentation import metrics
+        if args.metrics:
+            metrics.enable()
+        from .SyncDaemon import SyncDaemon, DEFAULT_DAEMON_JOBS
+        daemon = SyncDaemon(CONFIG_DIR, jobs=args.jobs if args.jobs is not None else DEFAULT_DAEMON_JOBS)
+        daemon.run()
+        return 0
+
+    if args.config is None:
+        raise ValueError("Name of the configuration file has to be given by -c or --config")
+
+    if args.submit is not None:
+        from .SyncQueue import submit_job
+        job_id = submit_job(args.config, args.submit or None, description_only=args.description)
+        print(f"\nJOB {job_id} QUEUED FOR THE SYNC DAEMON")
+        return 0
+
+    # Metrics are enabled before any Confluence client is created, so their requests are counted
+    from .Instrumentation import metrics
+    if args.metrics:
+        metrics.enable()
+    profiler = None
+    if args.profile is not None:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    from configparser import ConfigParser
+    from .HistoryStore import read_history_config
+
+    CONFIG = os.path.join(CONFIG_DIR, args.config+".ini")
+    LOAD = args.load
+    DESCRIPTION_ONLY = args.description
+    HEADLESS = args.headless
+    WATCH = args.watch and not args.load
+
+    # ConfigParser for parsing ini file with test configuration
+    test_config = ConfigParser()
+    if not test_config.read(CONFIG):
+        raise RuntimeError(f"Configuration file {CONFIG} not found, configuration files are read from {os.path.abspath(CONFIG_DIR)}")
+    TEST_FOLDER_NAME = test_config['file']['folder_name']
+    TEST_FILE_NAME = test_config['file']['file_name']
+    CSV_GENERATOR = test_config['file'].get('csv_generator', 'allure')
+    PREVIOUS_RESULTS_LIMIT, HISTORY_STORE = read_history_config(test_config)
+    LOGIN = None
+    PASSWORD = None
+    HEADLESS_LOAD = 'y'
+    if HEADLESS and test_config.has_section('headless'):
+        LOGIN = test_config['headless'].get('login') or None
+        PASSWORD = test_config['headless'].get('password') or None
+        HEADLESS_LOAD = test_config['headless'].get('load', 'y') or 'y'
+    TEST_CONDITIONS = []
+    TEST_WORKERS = 1
+    test_cond_items = test_config.items('test')
+    for name, condition in test_cond_items:
+        if name == 'workers':
+            TEST_WORKERS = int(condition)
+            continue
+        TEST_CONDITIONS.append(condition)
+
+    if args.rebuild_manifest:
+        from .ReportManifest import rebuild_manifest
+        manifest = rebuild_manifest(os.path.join("Test_data", TEST_FOLDER_NAME))
+        print(f"\nMANIFEST CREATED FOR {len(manifest)} REPORT NAMES")
+        for report_name, report in manifest.items():
+            print(f"{report_name}: {report['file']} ({report['rows']} tests)")
+        return 0
+
+    if args.ingest:
+        from .ReportWarehouse import ReportWarehouse
+        loaded_reports = ReportWarehouse().ingest_folder(TEST_FOLDER_NAME)
+        print(f"\nLOADED {loaded_reports} NEW REPORTS TO THE WAREHOUSE")
+        return 0
+
+    # Loading modules import pandas and atlassian, they are needed from here on
+    from .ConfluenceDataloader import Dataloader, get_key
+    from .Publisher import Publisher, read_page_configs, read_publish_workers
+    from .ShardedLoader import ShardedLoader, read_shard_config
+
+    PAGES = read_page_configs(test_config)
+    PUBLISH_WORKERS = read_publish_workers(test_config)
+    SHARD_BY, SHARD_ROWS = read_shard_config(test_config)
+
+    exit_code = 0
+    # Generating the report
+    if not LOAD:
+        from .CSVReport import CreateReport
+        results = CreateReport(
+            folder_name=TEST_FOLDER_NAME,
+            file_name=TEST_FILE_NAME,
+            test_conditions=TEST_CONDITIONS,
+            workers=TEST_WORKERS,
+            csv_generator=CSV_GENERATOR
+        )
+        # In watch mode credentials are asked for before tests start, results are loaded by the watcher
+        watcher = None
+        if WATCH:
+            from .ResultWatcher import ResultWatcher, read_watch_interval
+            watch_publisher = Publisher(
+                pages=PAGES,
+                csv_folder_name=TEST_FOLDER_NAME,
+                csv_file_name=TEST_FILE_NAME,
+                description_only=DESCRIPTION_ONLY,
+                workers=PUBLISH_WORKERS,
+                shard_by=SHARD_BY,
+                shard_rows=SHARD_ROWS,
+                previous_results_limit=PREVIOUS_RESULTS_LIMIT,
+                history_store=HISTORY_STORE,
+                login=LOGIN,
+                password=PASSWORD,
+                headless=HEADLESS
+            )
+            watcher = ResultWatcher(
+                publish=lambda batch: watch_publisher.publish(csv_data_frame=batch),
+                interval=read_watch_interval(test_config)
+            )
+            watcher.start()
+
+        results.generate_report()
+
+        if watcher is not None:
+            # Batches have only results which appeared since the batch before, so at the end the whole report
+            # is loaded by the same publisher. Results loaded by batches are replaced, not moved to "Previous Results",
+            # and results of batches which failed are loaded too
+            watcher.stop(load_remaining=False)
+            try:
+                watch_publisher.publish()
+            except RuntimeError as e:
+                print(f"\n{e}\nTHE WHOLE REPORT WAS NOT LOADED TO CONFLUENCE")
+                exit_code = 1
+            choice = 'n'
+        elif HEADLESS:
+            choice = HEADLESS_LOAD
+        else:
+            print("\nDo you want to load generated report to Confluence? [y/n] ", end="")
+            choice = get_key()
+    else:
+        choice = 'y'
+
+    # Loading report to the Confluence site
+    if choice == 'y' and len(PAGES) == 1 and SHARD_BY is not None:
+        s = ShardedLoader(
+            url=PAGES[0]['url'],
+            page_id=PAGES[0]['page_id'],
+            page_title=PAGES[0]['page_title'],
+            page_space_key=PAGES[0]['page_space_key'],
+            csv_folder_name=TEST_FOLDER_NAME,
+            csv_file_name=TEST_FILE_NAME,
+            description_only=DESCRIPTION_ONLY,
+            shard_by=SHARD_BY,
+            shard_rows=SHARD_ROWS,
+            login=LOGIN,
+            password=PASSWORD,
+            headless=HEADLESS,
+            previous_results_limit=PREVIOUS_RESULTS_LIMIT,
+            history_store=HISTORY_STORE
+        )
+
+        s.load_data_to_confluence()
+    elif choice == 'y' and len(PAGES) == 1:
+        d = Dataloader(
+            url=PAGES[0]['url'],
+            page_id=PAGES[0]['page_id'],
+            page_title=PAGES[0]['page_title'],
+            page_space_key=PAGES[0]['page_space_key'],
+            csv_folder_name=TEST_FOLDER_NAME,
+            csv_file_name=TEST_FILE_NAME,
+            description_only=DESCRIPTION_ONLY,
+            previous_results_limit=PREVIOUS_RESULTS_LIMIT,
+            history_store=HISTORY_STORE,
+            login=LOGIN,
+            password=PASSWORD,
+            headless=HEADLESS
+        )
+
+        d.load_data_to_confluence()
+    elif choice == 'y':
+        p = Publisher(
+            pages=PAGES,
+            csv_folder_name=TEST_FOLDER_NAME,
+            csv_file_name=TEST_FILE_NAME,
+            description_only=DESCRIPTION_ONLY,
+            workers=PUBLISH_WORKERS,
+            shard_by=SHARD_BY,
+            shard_rows=SHARD_ROWS,
+            previous_results_limit=PREVIOUS_RESULTS_LIMIT,
+            history_store=HISTORY_STORE,
+            login=LOGIN,
+            password=PASSWORD,
+            headless=HEADLESS
+        )
+
+        p.publish()
+
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(args.profile)
+        print(f"\nPROFILE SAVED TO {args.profile}")
+    if args.metrics:
+        metrics.print_summary()
+        print(f"\nMETRICS SAVED TO {metrics.write_report()}")
+    return exit_code
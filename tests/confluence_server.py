@@ -0,0 +1,135 @@
+import json
+import time
+import socket
+import struct
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# Answer of the fake server which closes the connection with TCP reset instead of sending a response
+CONNECTION_RESET = None
+# Answer of the fake server which handles the request and then closes the connection with TCP reset,
+# so the client does not know that the request was done
+LOST_RESPONSE = "lost response"
+# Display name returned for every user
+TESTER_NAME = "Jane Tester"
+
+
+class FakeConfluenceServer:
+    """
+    Confluence REST API on localhost with pages kept in memory as {page id: {"title", "version", "body"}},
+    created pages have also "parent" with id of their parent page. Requests are answered with statuses
+    from responses in order, after them requests are handled as Confluence does: unknown pages give 404,
+    update with other than the next version gives 409 and creating page with a taken title gives 400.
+    Every answer can be delayed by delay seconds. Method and path of every request are kept in requests,
+    ports of client connections in connections and the highest number of requests handled at once
+    in max_parallel_requests
+    """
+    def __init__(self, responses: list = (), pages: dict = None, delay: float = 0.0):
+        self.responses = list(responses)
+        self.pages = pages if pages is not None else {"1": {"title": "Page", "version": 3, "body": ""}}
+        self.delay = delay
+        self.requests = []
+        self.connections = set()
+        self.max_parallel_requests = 0
+        self.__parallel_requests = 0
+        self.__lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Connections are kept open, so reusing of pooled connections can be checked
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                server.handle(self, None)
+
+            def do_PUT(self):
+                server.handle(self, json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+
+            def do_POST(self):
+                server.handle(self, json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+
+        self.http_server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.http_server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.http_server.server_port}"
+        self.thread = threading.Thread(target=self.http_server.serve_forever, args=(0.05,), daemon=True)
+        self.thread.start()
+
+    def handle(self, handler: BaseHTTPRequestHandler, data: dict):
+        url = urlparse(handler.path)
+        with self.__lock:
+            self.requests.append((handler.command, url.path))
+            self.connections.add(handler.client_address[1])
+            self.__parallel_requests += 1
+            self.max_parallel_requests = max(self.max_parallel_requests, self.__parallel_requests)
+            status = self.responses.pop(0) if self.responses else 200
+        try:
+            time.sleep(self.delay)
+            if status == LOST_RESPONSE:
+                self.answer(handler.command, url.path, parse_qs(url.query), data)
+            if status in (CONNECTION_RESET, LOST_RESPONSE):
+                handler.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+                handler.close_connection = True
+                handler.connection.close()
+                return
+            if status == 200:
+                status, answer = self.answer(handler.command, url.path, parse_qs(url.query), data)
+            else:
+                answer = {"statusCode": status, "message": "Injected error"}
+            body = json.dumps(answer).encode()
+            handler.send_response(status)
+            handler.send_header("Content-Type", "application/json")
+            handler.send_header("Content-Length", str(len(body)))
+            handler.end_headers()
+            handler.wfile.write(body)
+        finally:
+            with self.__lock:
+                self.__parallel_requests -= 1
+
+    def answer(self, method: str, path: str, query: dict, data: dict):
+        """
+        Returns status and JSON answer of the request
+        """
+        if path == "/rest/api/user":
+            return 200, {"username": query.get("username", [""])[0], "displayName": TESTER_NAME}
+        if method == "POST" and path.rstrip("/") == "/rest/api/content":
+            return self.create(data)
+        if path.endswith("/child/page"):
+            parent_id = path[len("/rest/api/content/"):-len("/child/page")]
+            with self.__lock:
+                children = [{"id": page_id, "title": page["title"]} for page_id, page in self.pages.items() if page.get("parent") == parent_id]
+            start = int(query.get("start", ["0"])[0])
+            return 200, {"results": children[start:], "_links": {}}
+        page_id = path[len("/rest/api/content/"):] if path.startswith("/rest/api/content/") else None
+        with self.__lock:
+            page = self.pages.get(page_id)
+            if page is None:
+                return 404, {"statusCode": 404, "message": f"No content found with id {page_id}"}
+            if method == "PUT":
+                if data["version"]["number"] != page["version"] + 1:
+                    return 409, {"statusCode": 409, "message": "Version must be incremented on update"}
+                page.update(title=data["title"], version=data["version"]["number"], body=data["body"]["storage"]["value"])
+            answer = {"id": page_id, "title": page["title"], "version": {"number": page["version"]}}
+            if "body" in query.get("expand", [""])[0]:
+                answer["body"] = {"storage": {"value": page["body"], "representation": "storage"}}
+        return 200, answer
+
+    def create(self, data: dict):
+        """
+        Creates page with title, body and parent page given in data, returns status and JSON answer
+        """
+        with self.__lock:
+            if any(page["title"] == data["title"] for page in self.pages.values()):
+                return 400, {"statusCode": 400, "message": "A page with this title already exists"}
+            page_id = str(max(int(page_id) for page_id in self.pages) + 1)
+            self.pages[page_id] = {"title": data["title"], "version": 1, "body": data["body"]["storage"]["value"],
+                                   "parent": data["ancestors"][0]["id"]}
+        return 200, {"id": page_id, "title": data["title"], "version": {"number": 1}}
+
+    def stop(self):
+        self.http_server.shutdown()
+        self.http_server.server_close()
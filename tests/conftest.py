@@ -0,0 +1,34 @@
+import os
+import sys
+import importlib.util
+
+import pandas as pd
+
+
+# Root of the repository is the report_generation package, tests import it by that name
+# the same way as python -m report_generation does
+PACKAGE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Recorded allure results and reports used by the tests
+DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+if "report_generation" not in sys.modules:
+    spec = importlib.util.spec_from_file_location(
+        "report_generation",
+        os.path.join(PACKAGE_PATH, "__init__.py"),
+        submodule_search_locations=[PACKAGE_PATH]
+    )
+    package = importlib.util.module_from_spec(spec)
+    sys.modules["report_generation"] = package
+    spec.loader.exec_module(package)
+
+
+def create_report(tests: list[tuple]):
+    """
+    Returns csv report dataframe with given (name, status) tests
+    """
+    rows = []
+    for name, status in tests:
+        description = "///n///".join(["[TEST NAME]", "Test " + name, "[TEST DESCRIPTION]", "Checks " + name,
+                                      "[EXPECTED RESULT]", "Works", "[ACTUAL RESULT]", "Works", "[TEST SETUP]", "Bench A"]) + "///n///"
+        rows.append({"Status": status, "Name": name, "Description": description})
+    return pd.DataFrame(rows)
@@ -0,0 +1,122 @@
+import asyncio
+
+import pytest
+import requests
+
+from report_generation.AsyncConfluence import AsyncConfluence, PageVersionConflict, DEFAULT_RETRIES
+
+from confluence_server import FakeConfluenceServer, CONNECTION_RESET, LOST_RESPONSE
+
+
+class RestClient:
+    """
+    Methods of atlassian Confluence client used by AsyncConfluence. Error statuses are raised
+    as requests.HTTPError with the response as atlassian client does
+    """
+    def __init__(self, url: str):
+        self.url = url
+        self.session = requests.Session()
+
+    def __request(self, method: str, path: str, **kwargs):
+        response = self.session.request(method, self.url + "/" + path, timeout=5, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    def get(self, path: str, params: dict = None):
+        return self.__request("GET", path, params=params)
+
+    def put(self, path: str, data: dict = None):
+        return self.__request("PUT", path, json=data)
+
+    def post(self, path: str, data: dict = None):
+        return self.__request("POST", path, json=data)
+
+    def get_page_by_id(self, page_id: str, expand: str = None):
+        return self.get(f"rest/api/content/{page_id}", params={"expand": expand} if expand else None)
+
+    def create_page(self, space: str, title: str, body: str, parent_id: str = None):
+        data = {"type": "page", "title": title, "space": {"key": space}, "body": {"storage": {"value": body, "representation": "storage"}}}
+        if parent_id:
+            data["ancestors"] = [{"type": "page", "id": parent_id}]
+        return self.post("rest/api/content/", data=data)
+
+
+@pytest.fixture
+def start_server():
+    servers = []
+
+    def start(responses: list):
+        server = FakeConfluenceServer(responses)
+        servers.append(server)
+        return server, AsyncConfluence(RestClient(server.url), backoff=0.0)
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+@pytest.mark.parametrize("responses", [
+    [429],
+    [500, 502, 503, 504],
+    [CONNECTION_RESET],
+    [CONNECTION_RESET, 429, 503],
+], ids=["rate limit", "server errors", "connection reset", "mixed"])
+def test_transient_errors_are_retried(start_server, responses):
+    server, client = start_server(responses)
+    page = asyncio.run(client.get_page_by_id("1", expand="version"))
+    assert page["version"]["number"] == 3
+    assert len(server.requests) == len(responses) + 1
+
+
+def test_retries_are_limited(start_server):
+    server, client = start_server([503] * (DEFAULT_RETRIES + 1))
+    with pytest.raises(requests.exceptions.HTTPError) as error:
+        asyncio.run(client.get_page_by_id("1"))
+    assert error.value.response.status_code == 503
+    assert len(server.requests) == DEFAULT_RETRIES + 1
+
+
+def test_client_errors_are_not_retried(start_server):
+    server, client = start_server([404])
+    with pytest.raises(requests.exceptions.HTTPError):
+        asyncio.run(client.get_page_by_id("1"))
+    assert len(server.requests) == 1
+
+
+def test_version_conflict_is_not_retried(start_server):
+    server, client = start_server([409])
+    with pytest.raises(PageVersionConflict):
+        asyncio.run(client.update_page("1", "Page", "<p>body</p>", 3))
+    assert server.requests == [("PUT", "/rest/api/content/1")]
+
+
+def test_update_after_transient_errors_saves_the_next_version(start_server):
+    server, client = start_server([CONNECTION_RESET, 502])
+    version = asyncio.run(client.update_page("1", "Page", "<p>body</p>", 3))
+    assert version == 4
+    assert server.requests == [("PUT", "/rest/api/content/1")] * 3
+
+
+def test_page_created_before_lost_response_is_not_created_again(start_server):
+    server, client = start_server([LOST_RESPONSE])
+    page_id = asyncio.run(client.create_page("QA", "Page - Part 1", "<p>body</p>", "1"))
+
+    assert page_id == "2"
+    assert [page["title"] for page in server.pages.values()] == ["Page", "Page - Part 1"]
+    assert server.requests == [("POST", "/rest/api/content/"), ("GET", "/rest/api/content/1/child/page")]
+
+
+def test_page_not_created_by_failed_request_is_created_by_retry(start_server):
+    server, client = start_server([503])
+    page_id = asyncio.run(client.create_page("QA", "Page - Part 1", "<p>body</p>", "1"))
+
+    assert server.pages[page_id] == {"title": "Page - Part 1", "version": 1, "body": "<p>body</p>", "parent": "1"}
+    assert server.requests == [("POST", "/rest/api/content/"), ("GET", "/rest/api/content/1/child/page"), ("POST", "/rest/api/content/")]
+
+
+def test_taken_title_is_not_retried(start_server):
+    server, client = start_server([])
+    with pytest.raises(requests.exceptions.HTTPError) as error:
+        asyncio.run(client.create_page("QA", "Page", "<p>body</p>", "1"))
+    assert error.value.response.status_code == 400
+    assert len(server.requests) == 1
@@ -0,0 +1,78 @@
+from report_generation.ConfluenceDataloader import Dataloader
+
+from conftest import create_report
+
+
+# Body of a page which has no test cases table yet
+NEW_PAGE_BODY = "<p>Results of the nightly tests</p>"
+
+
+class StubConfluence:
+    """
+    Confluence client which keeps one page in memory and records every HTTP call made through it
+    """
+    def __init__(self, body: str, version: int = 1):
+        self.body = body
+        self.version = version
+        self.calls = []
+
+    def get_page_by_id(self, page_id: str, expand: str = None):
+        self.calls.append(("GET", "page " + expand))
+        page = {"id": page_id, "title": "Nightly", "version": {"number": self.version}}
+        if "body" in expand:
+            page["body"] = {"storage": {"value": self.body}}
+        return page
+
+    def get_user_details_by_username(self, username: str, expand: str = None):
+        self.calls.append(("GET", "user"))
+        return {"displayName": "Jane Tester"}
+
+    def put(self, path: str, data: dict = None):
+        self.calls.append(("PUT", path))
+        self.body = data["body"]["storage"]["value"]
+        self.version = data["version"]["number"]
+        return {"id": data["id"]}
+
+
+def test_new_page_is_loaded_with_four_calls(tmp_path, monkeypatch):
+    """
+    Page without table costs version GET, user GET, body GET and one PUT, the empty table is not saved separately
+    """
+    monkeypatch.chdir(tmp_path)
+    confluence = StubConfluence(NEW_PAGE_BODY)
+    loader = Dataloader(url="https://confluence.example.com", page_id="1", page_title="Nightly", page_space_key="QA",
+                        csv_folder_name="nightly", csv_file_name="report", confluence=confluence, login="jtester",
+                        csv_data_frame=create_report([("test_login", "passed"), ("test_logout", "failed")]))
+    loader.load_data_to_confluence()
+
+    # Page version and user details are requested at the same time, so their order is not fixed
+    assert sorted(confluence.calls[:2]) == [("GET", "page version"), ("GET", "user")]
+    assert confluence.calls[2:] == [("GET", "page body.storage,version"), ("PUT", "rest/api/content/1")]
+    assert confluence.version == 2
+    assert confluence.body.startswith(NEW_PAGE_BODY)
+    assert "test_login" in confluence.body and "test_logout" in confluence.body
+
+
+def test_unchanged_page_is_not_downloaded_again(tmp_path, monkeypatch):
+    """
+    Body saved by the loader is cached under the version returned by the update, so the next load
+    of the unchanged page asks only for the page version. The body is downloaded again when somebody
+    else changes the page
+    """
+    monkeypatch.chdir(tmp_path)
+    confluence = StubConfluence(NEW_PAGE_BODY)
+    report = create_report([("test_login", "passed"), ("test_logout", "failed")])
+
+    def load():
+        confluence.calls = []
+        Dataloader(url="https://confluence.example.com", page_id="1", page_title="Nightly", page_space_key="QA",
+                   csv_folder_name="nightly", csv_file_name="report", description_only=True, confluence=confluence,
+                   login="jtester", csv_data_frame=report).load_data_to_confluence()
+        return confluence.calls
+
+    load()
+    assert load() == [("GET", "page version")]
+
+    confluence.body = confluence.body.replace(NEW_PAGE_BODY, "<p>Results of the weekly tests</p>")
+    confluence.version += 1
+    assert load() == [("GET", "page version"), ("GET", "page body.storage,version")]
@@ -0,0 +1,95 @@
+import os
+import csv
+import time
+
+import pytest
+
+from report_generation.AllureResults import ALLURE_CSV_HEADER, format_allure_time, normalize_report_text, read_allure_results, write_sorted_report
+from report_generation.CSVReport import collect_node_ids, find_failed_shards, split_into_shards
+
+from conftest import DATA_PATH
+
+
+@pytest.fixture
+def time_zone(monkeypatch):
+    """
+    Sets local time zone of the process, the default one is the time zone of tests/data/allure_results
+    """
+    def set_time_zone(name: str = "Europe/Berlin"):
+        monkeypatch.setenv("TZ", name)
+        time.tzset()
+
+    yield set_time_zone
+    monkeypatch.undo()
+    time.tzset()
+
+
+@pytest.mark.skipif(not hasattr(time, "tzset"), reason="Time zone of the process cannot be changed")
+def test_python_generator_matches_allure_csv(tmp_path, time_zone):
+    """
+    Report built from allure_results by the python generator is the same as report copied from suites.csv
+    written by allure for the same results. The results have a failed, a skipped, a parametrized test
+    and a test run twice, only its last result is in suites.csv
+    """
+    time_zone()
+    allure_csv = str(tmp_path / "allure.csv")
+    with open(os.path.join(DATA_PATH, "suites.csv"), "r", newline="") as f:
+        reader = csv.reader(f)
+        header = [normalize_report_text(value) for value in next(reader)]
+        allure_rows = write_sorted_report(header, reader, allure_csv)
+
+    python_csv = str(tmp_path / "python.csv")
+    python_rows = write_sorted_report(ALLURE_CSV_HEADER, read_allure_results(os.path.join(DATA_PATH, "allure_results")), python_csv)
+
+    assert allure_rows == python_rows == 5
+    with open(allure_csv, "r", newline="") as allure_file, open(python_csv, "r", newline="") as python_file:
+        assert python_file.read() == allure_file.read()
+
+
+# Times written by java.util.Date.toString() for 2026-01-01 00:00 UTC and 2026-07-01 10:00 UTC
+@pytest.mark.skipif(not hasattr(time, "tzset"), reason="Time zone of the process cannot be changed")
+@pytest.mark.parametrize("zone, winter, summer", [
+    ("Europe/Berlin", "Thu Jan 01 01:00:00 CET 2026", "Wed Jul 01 12:00:00 CEST 2026"),
+    ("America/New_York", "Wed Dec 31 19:00:00 EST 2025", "Wed Jul 01 06:00:00 EDT 2026"),
+    ("UTC", "Thu Jan 01 00:00:00 UTC 2026", "Wed Jul 01 10:00:00 UTC 2026"),
+    ("Asia/Dubai", "Thu Jan 01 04:00:00 GMT+04:00 2026", "Wed Jul 01 14:00:00 GMT+04:00 2026"),
+    ("America/Sao_Paulo", "Wed Dec 31 21:00:00 GMT-03:00 2025", "Wed Jul 01 07:00:00 GMT-03:00 2026"),
+])
+def test_time_is_written_as_java_writes_it(time_zone, zone, winter, summer):
+    time_zone(zone)
+    assert format_allure_time(1767225600000) == winter
+    assert format_allure_time(1782900000000) == summer
+    assert format_allure_time(None) == ""
+
+
+def test_tests_of_one_file_are_kept_in_one_shard():
+    node_ids = [f"/tests/test_big.py::test_{i}" for i in range(4)] + ["/tests/test_a.py::test_1", "/tests/test_a.py::test_2",
+                                                                     "/tests/test_b.py::test_1", "/tests/test_c.py"]
+    shards = split_into_shards(node_ids, 3)
+
+    assert sorted(node_id for shard in shards for node_id in shard) == sorted(node_ids)
+    assert [len(shard) for shard in shards] == [4, 2, 2]
+    assert shards[0] == [f"/tests/test_big.py::test_{i}" for i in range(4)]
+    assert split_into_shards(["/tests/test_a.py::test_1"], 3) == [["/tests/test_a.py::test_1"]]
+
+
+def test_shards_which_did_not_run_all_tests_are_failed():
+    # 0 - all passed, 1 - some tests failed, 2 - interrupted, 4 - usage error, -9 - killed
+    assert find_failed_shards([0, 1, 0]) == []
+    assert find_failed_shards([0, 2, 1, 4, -9]) == [1, 3, 4]
+
+
+def test_collected_node_ids_have_absolute_paths(tmp_path):
+    (tmp_path / "test_one.py").write_text("import pytest\n\n@pytest.mark.parametrize('x', [1, 2])\ndef test_a(x):\n    pass\n")
+    node_ids = collect_node_ids(["-p", "no:cacheprovider", str(tmp_path)])
+
+    path = str(tmp_path / "test_one.py")
+    assert node_ids == [path + "::test_a[1]", path + "::test_a[2]"]
+    assert collect_node_ids(["-p", "no:cacheprovider", str(tmp_path), "-k", "nothing"]) == []
+
+
+def test_tests_are_not_run_when_collection_fails(tmp_path):
+    (tmp_path / "test_one.py").write_text("def test_a():\n    pass\n")
+    (tmp_path / "test_two.py").write_text("import module_which_does_not_exist\n")
+    with pytest.raises(RuntimeError, match="exit code 2"):
+        collect_node_ids(["-p", "no:cacheprovider", str(tmp_path)])
@@ -0,0 +1,143 @@
+import os
+import sys
+
+import pytest
+
+from report_generation import main
+from report_generation.AllureResults import ALLURE_CSV_HEADER, read_allure_results, write_sorted_report
+
+from conftest import DATA_PATH
+from confluence_server import FakeConfluenceServer
+
+
+CONFIG = """
+[file]
+    folder_name= nightly
+    file_name= report
+[page]
+    url= {url}
+    page_id= 1
+    page_title= Nightly
+    page_space_key= QA
+[test]
+"""
+
+# Tests run by the report generation, their docstrings are written as in the docstring template
+SAMPLE_TESTS = """
+import time
+
+import allure
+
+
+def describe(name):
+    allure.dynamic.description(
+        f\"\"\"[TEST NAME];
+        {name};
+        [TEST DESCRIPTION];
+        Check {name};
+        [EXPECTED RESULT];
+        It works;
+        [ACTUAL RESULT];
+        It works;
+        [TEST SETUP];
+        Setup A;
+        \"\"\")
+
+
+def test_login():
+    describe("Login")
+
+
+def test_logout():
+    # The first result is loaded by the watcher before this test finishes
+    time.sleep(0.3)
+    describe("Logout")
+    assert False
+"""
+
+
+@pytest.fixture
+def server():
+    server = FakeConfluenceServer(pages={"1": {"title": "Nightly", "version": 1, "body": "<p>Results of the nightly tests</p>"}})
+    yield server
+    server.stop()
+
+
+def test_report_is_loaded_without_terminal(server, tmp_path, monkeypatch):
+    """
+    Configuration and reports are found with paths built for the current system, credentials are taken
+    from environment variables
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("CONFLUENCE_LOGIN", "jtester")
+    monkeypatch.setenv("CONFLUENCE_PASSWORD", "secret")
+    os.makedirs(os.path.join("setup", "test_config"))
+    with open(os.path.join("setup", "test_config", "nightly.ini"), "w") as f:
+        f.write(CONFIG.format(url=server.url))
+    os.makedirs(os.path.join("Test_data", "nightly"))
+    write_sorted_report(ALLURE_CSV_HEADER, read_allure_results(os.path.join(DATA_PATH, "allure_results")),
+                        os.path.join("Test_data", "nightly", "2022-01-01 10-00-00 report.csv"))
+
+    assert main(["-c", "nightly", "-l", "--headless"]) == 0
+
+    page = server.pages["1"]
+    assert page["version"] == 2
+    assert page["body"].startswith("<p>Results of the nightly tests</p>")
+    assert "test_login" in page["body"] and "test_upload[10]" in page["body"]
+    # Nothing is written to files with Windows separators in their names
+    assert not [name for _, dirs, files in os.walk(tmp_path) for name in dirs + files if "\\" in name]
+
+
+@pytest.fixture
+def sample_project(server, tmp_path, monkeypatch):
+    """
+    Creates configuration running SAMPLE_TESTS with report built by the python generator in tmp_path
+    """
+    monkeypatch.chdir(tmp_path)
+    # Tests are run by pytest in this process, sample module of the previous test must not be reused
+    monkeypatch.delitem(sys.modules, "test_sample", raising=False)
+    test_data_path = os.path.join(str(tmp_path), "Test_data")
+    monkeypatch.setattr("report_generation.CSVReport.CURRENT_PATH", test_data_path)
+    monkeypatch.setattr("report_generation.ResultWatcher.CURRENT_PATH", test_data_path)
+    # Interval in the configuration is at least one second, batches are loaded more often to keep the tests short
+    monkeypatch.setattr("report_generation.ResultWatcher.read_watch_interval", lambda test_config: 0.05)
+    monkeypatch.setenv("CONFLUENCE_LOGIN", "jtester")
+    monkeypatch.setenv("CONFLUENCE_PASSWORD", "secret")
+    os.makedirs(os.path.join("setup", "test_config"))
+    with open(os.path.join("setup", "test_config", "nightly.ini"), "w") as f:
+        f.write(CONFIG.format(url=server.url).replace("file_name= report", "file_name= report\n    csv_generator= python"))
+        f.write(f"    test_condition1= {os.path.join('sample', 'test_sample.py')}\n    test_condition2= -p no:cacheprovider\n")
+    os.makedirs("sample")
+    with open(os.path.join("sample", "test_sample.py"), "w") as f:
+        f.write(SAMPLE_TESTS)
+
+
+def test_report_is_generated_and_loaded_without_terminal(server, sample_project, tmp_path):
+    assert main(["-c", "nightly", "--headless"]) == 0
+
+    reports = os.listdir(os.path.join("Test_data", "nightly"))
+    assert len([report for report in reports if report.endswith(" report.csv")]) == 1
+    assert "test_login" in server.pages["1"]["body"] and "test_logout" in server.pages["1"]["body"]
+    assert not [name for _, dirs, files in os.walk(tmp_path) for name in dirs + files if "\\" in name]
+
+
+def test_missing_configuration_is_reported(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with pytest.raises(RuntimeError, match="Configuration file .*nightly.ini not found"):
+        main(["-c", "nightly", "-l", "--headless"])
+
+
+def test_whole_report_is_loaded_after_watched_batches(server, sample_project, capsys):
+    """
+    Results loaded by batches while tests run are replaced by the whole report at the end,
+    they are not moved to "Previous Results"
+    """
+    assert main(["-c", "nightly", "-w", "--headless"]) == 0
+
+    output = capsys.readouterr().out
+    assert "LOADING 1 NEW RESULTS TO CONFLUENCE (BATCH 1)" in output
+    assert output.rfind("UPLOADING THE FILE") > output.rfind("(BATCH ")
+    body = server.pages["1"]["body"]
+    assert "test_login" in body and "test_logout" in body
+    assert body.count("Setup A") == 2
+    assert server.pages["1"]["version"] > 2
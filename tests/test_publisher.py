@@ -0,0 +1,58 @@
+import pytest
+
+from report_generation.Publisher import Publisher
+from report_generation.AsyncConfluence import DEFAULT_CONCURRENCY
+
+from conftest import create_report
+from confluence_server import FakeConfluenceServer
+
+
+PAGE_IDS = ["1", "2", "3"]
+WORKERS = 3
+
+
+@pytest.fixture
+def server():
+    server = FakeConfluenceServer(
+        pages={page_id: {"title": "Page " + page_id, "version": 1, "body": f"<p>Report {page_id}</p>"} for page_id in PAGE_IDS},
+        delay=0.05
+    )
+    yield server
+    server.stop()
+
+
+def create_publisher(server: FakeConfluenceServer, page_ids: list[str]):
+    pages = [{"url": server.url, "page_id": page_id, "page_title": "Page " + page_id, "page_space_key": "QA"} for page_id in page_ids]
+    return Publisher(pages=pages, csv_folder_name="nightly", csv_file_name="report", workers=WORKERS,
+                     login="jtester", password="secret", headless=True)
+
+
+def test_pages_are_published_at_once_through_one_session(server, tmp_path, monkeypatch, caplog):
+    monkeypatch.chdir(tmp_path)
+    publisher = create_publisher(server, PAGE_IDS)
+    timings = publisher.publish(create_report([("test_login", "passed"), ("test_logout", "failed")]))
+
+    assert sorted(timings) == ["Page 1", "Page 2", "Page 3"]
+    for page_id in PAGE_IDS:
+        page = server.pages[page_id]
+        assert page["version"] == 2
+        assert page["body"].startswith(f"<p>Report {page_id}</p>")
+        assert "test_login" in page["body"] and "test_logout" in page["body"]
+    assert server.max_parallel_requests > 1
+    # Pages are loaded through pooled connections of one session, which are not closed when the pool is full
+    assert len(server.connections) <= WORKERS * DEFAULT_CONCURRENCY
+    assert len(server.connections) < len(server.requests)
+    assert "Connection pool is full" not in caplog.text
+    # Clients of other sites get the same session
+    assert publisher.get_client(server.url.replace("127.0.0.1", "localhost"))._session is publisher.get_client(server.url)._session
+
+
+def test_failed_page_does_not_stop_other_pages(server, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    publisher = create_publisher(server, ["1", "404", "3"])
+    with pytest.raises(RuntimeError, match="Page 404"):
+        publisher.publish(create_report([("test_login", "passed")]))
+
+    assert server.pages["1"]["version"] == 2 and server.pages["3"]["version"] == 2
+    assert server.pages["2"]["version"] == 1
+    assert "test_login" in server.pages["1"]["body"] and "test_login" in server.pages["3"]["body"]
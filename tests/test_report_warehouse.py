@@ -0,0 +1,67 @@
+import os
+import csv
+import sqlite3
+
+import pytest
+
+from report_generation.ReportWarehouse import ReportWarehouse
+from report_generation.HistoryStore import HistoryStore
+
+
+@pytest.fixture
+def reports_folder(tmp_path, monkeypatch):
+    """
+    Returns function writing csv report with given (test name, status) results to Test_data/nightly
+    """
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(os.path.join("Test_data", "nightly"))
+
+    def write_report(report_datetime: str, report_name: str, results: list[tuple]):
+        with open(os.path.join("Test_data", "nightly", f"{report_datetime} {report_name}.csv"), "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["Status", "Duration in ms", "Name"])
+            writer.writerows([status, "10", name] for name, status in results)
+
+    return write_report
+
+
+def test_warehouse_and_history_share_one_file(reports_folder):
+    reports_folder("2022-01-01 10-00-00", "smoke", [("test_login", "passed")])
+    path = os.path.join("Test_data", "reports.db")
+    history = HistoryStore(path)
+    warehouse = ReportWarehouse(path)
+    # Opening the stores again does not change tables of the other store
+    history = HistoryStore(path)
+
+    assert warehouse.ingest_folder("nightly") == 1
+    history.add_results([("test_login", "1", "2022-01-01", "passed", "Setup", "Jane Tester")])
+    assert warehouse.get_test_history("test_login") == [("2022-01-01", "10:00:00", "smoke", "passed", 10)]
+    assert history.get_test_history("test_login") == [("2022-01-01", "passed", "Setup", "Jane Tester", "1")]
+
+
+def test_flaky_tests_are_counted_in_one_report(reports_folder):
+    for day, (smoke_status, regression_status) in enumerate([("passed", "failed"), ("failed", "failed"), ("passed", "failed")]):
+        reports_folder(f"2022-01-0{day + 1} 10-00-00", "smoke", [("test_login", smoke_status), ("test_logout", "passed")])
+        reports_folder(f"2022-01-0{day + 1} 12-00-00", "regression", [("test_login", regression_status), ("test_logout", "failed")])
+    warehouse = ReportWarehouse()
+    warehouse.ingest_folder("nightly")
+
+    # test_logout always passes in smoke and always fails in regression, so it is not flaky
+    assert warehouse.get_flaky_tests() == [("smoke", "test_login", 3, 1, 2)]
+    assert warehouse.get_flaky_tests(report_name="regression") == []
+
+
+def test_results_tables_of_old_files_are_renamed(tmp_path):
+    warehouse_path = str(tmp_path / "reports.db")
+    history_path = str(tmp_path / "history.db")
+    with sqlite3.connect(warehouse_path) as connection:
+        connection.execute("CREATE TABLE results (report_id INTEGER, report_name TEXT, report_date TEXT, report_time TEXT, test_name TEXT, status TEXT, duration_ms INTEGER)")
+        connection.execute("INSERT INTO results VALUES (1, 'smoke', '2022-01-01', '10:00:00', 'test_login', 'passed', 10)")
+        connection.execute("CREATE INDEX results_test_date ON results (test_name, report_date)")
+    with sqlite3.connect(history_path) as connection:
+        connection.execute("CREATE TABLE results (id INTEGER PRIMARY KEY, test_name TEXT, page_id TEXT, run_date TEXT, status TEXT, test_setup TEXT, tester TEXT)")
+        connection.execute("INSERT INTO results VALUES (1, 'test_login', '1', '2022-01-01', 'failed', 'Setup', 'Jane Tester')")
+        connection.execute("CREATE INDEX results_test_date ON results (test_name, run_date)")
+
+    assert ReportWarehouse(warehouse_path).get_test_history("test_login") == [("2022-01-01", "10:00:00", "smoke", "passed", 10)]
+    assert HistoryStore(history_path).get_test_history("test_login") == [("2022-01-01", "failed", "Setup", "Jane Tester", "1")]
@@ -0,0 +1,123 @@
+import json
+import time
+import uuid
+
+import pytest
+
+from report_generation.Publisher import Publisher
+from report_generation.ResultWatcher import ResultWatcher
+
+from confluence_server import FakeConfluenceServer
+
+
+# Seconds for which a test waits for the background thread of the watcher
+WAIT_TIMEOUT = 5.0
+
+
+def write_result(results_path, name: str, status: str, stop: int = None):
+    """
+    Writes allure result file of the test as allure-pytest does, reruns of the test have the same history id
+    """
+    stop = stop if stop is not None else int(time.time() * 1000)
+    description = ";\n    ".join(["[TEST NAME]", "Test " + name, "[TEST DESCRIPTION]", "Checks " + name, "[EXPECTED RESULT]", "Works",
+                                   "[ACTUAL RESULT]", "Works", "[TEST SETUP]", "Bench A"]) + ";\n"
+    result = {"name": name, "status": status, "start": stop - 10, "stop": stop, "historyId": "history-" + name,
+              "description": description, "labels": [{"name": "suite", "value": "test_sample"}]}
+    (results_path / f"{uuid.uuid4()}-result.json").write_text(json.dumps(result))
+
+
+def wait_for(condition):
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while not condition():
+        assert time.monotonic() < deadline, "Watcher did not load the batch in time"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def results_path(tmp_path):
+    path = tmp_path / "allure_results"
+    path.mkdir()
+    return path
+
+
+def test_new_results_are_loaded_in_batches(results_path):
+    batches = []
+    watcher = ResultWatcher(publish=lambda batch: batches.append(list(batch["Name"])), interval=3600, results_paths=[str(results_path)])
+    write_result(results_path, "test_old", "passed")
+    watcher.start()
+
+    write_result(results_path, "test_logout", "passed")
+    write_result(results_path, "test_login", "failed")
+    assert watcher.load_batch() == 2
+    assert watcher.load_batch() == 0
+    write_result(results_path, "test_upload", "passed")
+    watcher.stop()
+
+    # Results from before start() belong to the previous run, batches are sorted by test name
+    assert batches == [["test_login", "test_logout"], ["test_upload"]]
+    assert watcher.batches == 2 and watcher.pending_tests() == []
+
+
+def test_failed_batch_is_loaded_with_the_next_tick(results_path):
+    batches = []
+
+    def publish(batch):
+        batches.append(list(batch["Name"]))
+        if len(batches) == 1:
+            raise RuntimeError("Confluence is not available")
+
+    watcher = ResultWatcher(publish=publish, interval=0.05, results_paths=[str(results_path)])
+    watcher.start()
+    write_result(results_path, "test_login", "passed")
+    wait_for(lambda: len(batches) == 1)
+    write_result(results_path, "test_logout", "failed")
+    wait_for(lambda: len(batches) == 2)
+    watcher.stop()
+
+    assert batches == [["test_login"], ["test_login", "test_logout"]]
+    assert watcher.pending_tests() == []
+
+
+def test_failed_last_batch_is_kept_at_stop(results_path):
+    def publish(batch):
+        raise RuntimeError("Confluence is not available")
+
+    watcher = ResultWatcher(publish=publish, interval=3600, results_paths=[str(results_path)])
+    watcher.start()
+    write_result(results_path, "test_login", "passed")
+    write_result(results_path, "test_logout", "failed")
+
+    with pytest.raises(RuntimeError, match="Loading batch 1 with 2 results failed"):
+        watcher.stop()
+    assert watcher.pending_tests() == ["test_login", "test_logout"]
+
+
+def test_remaining_results_are_not_loaded_when_not_asked(results_path):
+    batches = []
+    watcher = ResultWatcher(publish=batches.append, interval=3600, results_paths=[str(results_path)])
+    watcher.start()
+    write_result(results_path, "test_login", "passed")
+    watcher.stop(load_remaining=False)
+    assert batches == []
+
+
+def test_rerun_replaces_result_loaded_by_earlier_batch(results_path, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    server = FakeConfluenceServer(pages={"1": {"title": "Nightly", "version": 1, "body": "<p>Results of the nightly tests</p>"}})
+    try:
+        publisher = Publisher(pages=[{"url": server.url, "page_id": "1", "page_title": "Nightly", "page_space_key": "QA"}],
+                              csv_folder_name="nightly", csv_file_name="report", login="jtester", password="secret", headless=True)
+        watcher = ResultWatcher(publish=lambda batch: publisher.publish(csv_data_frame=batch), interval=3600, results_paths=[str(results_path)])
+        watcher.start()
+        write_result(results_path, "test_login", "failed", stop=1000)
+        assert watcher.load_batch() == 1
+        write_result(results_path, "test_login", "passed", stop=2000)
+        watcher.stop()
+    finally:
+        server.stop()
+
+    body = server.pages["1"]["body"]
+    assert server.pages["1"]["version"] == 3
+    assert "(/) Success" in body and "(x) Fail" not in body
+    # Failed result of this run is replaced, it is not moved to "Previous Results" with its test setup
+    assert body.count("Bench A") == 1
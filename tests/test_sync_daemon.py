@@ -0,0 +1,108 @@
+import os
+import sys
+import json
+import time
+import threading
+import subprocess
+
+import pytest
+
+from report_generation.SyncDaemon import SyncDaemon, get_owner_name, is_process_running
+from report_generation.SyncQueue import submit_job, RUNNING_DIR, FAILED_DIR
+
+
+# Seconds for which a test waits for jobs of the daemon
+WAIT_TIMEOUT = 5.0
+
+
+@pytest.fixture
+def spool_dir(tmp_path):
+    return str(tmp_path / "spool")
+
+
+@pytest.fixture
+def live_process():
+    """
+    Process which runs during the test, as another daemon would
+    """
+    process = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+    yield process
+    process.kill()
+    process.wait()
+
+
+def get_dead_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def put_running_job(spool_dir: str, owner_name: str, job_id: str):
+    """
+    Writes job as if it was claimed by daemon with given owner directory name
+    """
+    owner_dir = os.path.join(spool_dir, RUNNING_DIR, owner_name)
+    os.makedirs(owner_dir, exist_ok=True)
+    with open(os.path.join(owner_dir, job_id + ".json"), "w") as f:
+        json.dump({"id": job_id, "config": "missing"}, f)
+
+
+def run_daemon_until(daemon: SyncDaemon, failed_jobs: int):
+    """
+    Runs the daemon in a thread until given number of jobs failed. Jobs of the tests have no configuration
+    file, so every job which is run fails
+    """
+    thread = threading.Thread(target=daemon.run)
+    thread.start()
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    try:
+        while daemon.failed_jobs < failed_jobs and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        daemon.stop()
+        thread.join()
+    assert daemon.failed_jobs == failed_jobs
+
+
+def test_processes_are_checked_without_stopping_them(live_process):
+    assert is_process_running(os.getpid())
+    assert is_process_running(live_process.pid)
+    assert live_process.poll() is None
+    assert not is_process_running(get_dead_pid())
+
+
+def test_jobs_of_stopped_daemon_are_run_again(spool_dir, tmp_path):
+    put_running_job(spool_dir, get_owner_name(pid=get_dead_pid()), "20220101-100000-000000-dead")
+    os.makedirs(os.path.join(spool_dir, RUNNING_DIR), exist_ok=True)
+    with open(os.path.join(spool_dir, RUNNING_DIR, "20220101-100000-000001-old.json"), "w") as f:
+        json.dump({"id": "20220101-100000-000001-old", "config": "missing"}, f)
+
+    run_daemon_until(SyncDaemon(str(tmp_path), spool_dir=spool_dir, poll_interval=0.01), failed_jobs=2)
+
+    assert sorted(os.listdir(os.path.join(spool_dir, FAILED_DIR))) == ["20220101-100000-000000-dead.json", "20220101-100000-000001-old.json"]
+    # Directory of the stopped daemon and of this daemon are removed
+    assert os.listdir(os.path.join(spool_dir, RUNNING_DIR)) == []
+
+
+def test_jobs_of_running_daemon_are_left_to_it(spool_dir, tmp_path, live_process):
+    other_owners = [get_owner_name(pid=live_process.pid), get_owner_name(host="other-host", pid=get_dead_pid())]
+    for owner_name in other_owners:
+        put_running_job(spool_dir, owner_name, "20220101-100000-000000-" + owner_name)
+    submit_job("missing", spool_dir=spool_dir)
+
+    daemon = SyncDaemon(str(tmp_path), spool_dir=spool_dir, poll_interval=0.01)
+    running_jobs = []
+    run_job = daemon.run_job
+
+    def record_running_jobs(job: dict):
+        running_jobs.extend(os.listdir(os.path.join(spool_dir, RUNNING_DIR, get_owner_name())))
+        run_job(job)
+
+    daemon.run_job = record_running_jobs
+    run_daemon_until(daemon, failed_jobs=1)
+
+    # Only the new job is run, it is kept in the directory of this daemon while it is running
+    assert len(os.listdir(os.path.join(spool_dir, FAILED_DIR))) == 1
+    assert len(running_jobs) == 1
+    for owner_name in other_owners:
+        assert os.listdir(os.path.join(spool_dir, RUNNING_DIR, owner_name)) == ["20220101-100000-000000-" + owner_name + ".json"]